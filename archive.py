@@ -0,0 +1,159 @@
+"""Tar shard archive of the generated images (Blender is not required).
+
+The images are packed into tar files of a fixed number of images (archive/000000.tar, archive/000001.tar, ...),
+in the WebDataset layout: each image is stored as <name>.png together with its index entry as <name>.json.
+A shard is written under a temporary name and only renamed once it's complete, so the finalized shards are never
+partial. Appending to an archive always opens a new shard, the finalized shards are never modified.
+"""
+
+import os
+import io
+import json
+import time
+import tarfile
+
+
+def archivePath(output_path : str) -> str:
+    """Returns the archive directory of the output directory."""
+
+    return os.path.join(output_path, "archive")
+
+
+def shardIndexes(output_path : str) -> list:
+    """Returns the indexes of the finalized shards of the output directory (in order)."""
+
+    path = archivePath(output_path)
+    if not os.path.isdir(path):
+        return []
+
+    return sorted(int(filename[:-4]) for filename in os.listdir(path) if filename.endswith(".tar") and filename[:-4].isdigit())
+
+
+def shardPath(output_path : str, shard_idx : int) -> str:
+    """Returns the path of a shard of the output directory."""
+
+    return os.path.join(archivePath(output_path), "{:06d}.tar".format(shard_idx))
+
+
+def readArchive(output_path : str):
+    """Yields the filename, PNG file contents and index entry of every image in the finalized shards (in order)."""
+
+    for shard_idx in shardIndexes(output_path):
+        with tarfile.open(shardPath(output_path, shard_idx), "r") as shard:
+            members = {}
+            for member in shard:
+                key, extension = os.path.splitext(member.name)
+                members.setdefault(key, {})[extension] = shard.extractfile(member).read()
+                if len(members[key]) == 2:
+                    files = members.pop(key)
+                    yield key + ".png", files[".png"], json.loads(files[".json"])
+
+
+def archivedNames(output_path : str) -> set:
+    """Returns the filenames of the images in the finalized shards of the output directory."""
+
+    names = set()
+    for shard_idx in shardIndexes(output_path):
+        with tarfile.open(shardPath(output_path, shard_idx), "r") as shard:
+            names.update(name for name in shard.getnames() if name.endswith(".png"))
+
+    return names
+
+
+class TarShardWriter:
+
+    def __init__(self, output_path : str, shard_size : int = 1000, append : bool = True):
+        """
+        Params:
+            output_path: The output directory (the shards are written to its archive subdirectory).
+            shard_size: The number of images in each shard.
+            append: Add new shards to the existing archive if True, otherwise remove the existing shards first.
+        """
+
+        if shard_size < 1:
+            raise ValueError("Invalid archive shard size: " + str(shard_size))
+
+        self.output_path = output_path
+        self.shard_size = shard_size
+
+        os.makedirs(archivePath(output_path), exist_ok = True)
+
+        # The shards which weren't finalized (e.g. after a crash) are dropped, their images are still in the staging files
+        # (the finalized shards are also removed if not appending)
+        for filename in os.listdir(archivePath(output_path)):
+            if filename.endswith(".tmp") or not append:
+                os.remove(os.path.join(archivePath(output_path), filename))
+
+        shards = shardIndexes(output_path)
+        self.__next_shard = shards[-1] + 1 if shards else 0
+        self.__file = None
+        self.__tar = None
+        self.__count = 0
+        self.__staged = []
+
+
+    def __addMember(self, name : str, data : bytes) -> None:
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self.__tar.addfile(info, io.BytesIO(data))
+
+
+    def add(self, filename : str, data : bytes, entry : dict, staged_path : str = None) -> None:
+        """Adds an image to the current shard (the shard is finalized once it's full).
+
+        Params:
+            filename: The filename of the image (e.g. 1.png).
+            data: The contents of the PNG file.
+            entry: The index entry of the image.
+            staged_path: The file the image was read from, it's removed once the shard is finalized.
+        """
+
+        if self.__tar is None:
+            self.__file = open(shardPath(self.output_path, self.__next_shard) + "." + str(os.getpid()) + ".tmp", "wb")
+            self.__tar = tarfile.open(fileobj = self.__file, mode = "w")
+
+        key = os.path.splitext(filename)[0]
+        self.__addMember(key + ".png", data)
+        self.__addMember(key + ".json", json.dumps(entry).encode("utf-8"))
+        if staged_path is not None:
+            self.__staged.append(staged_path)
+
+        self.__count += 1
+        if self.__count >= self.shard_size:
+            self.finalize()
+
+
+    def addFile(self, filepath : str, entry : dict) -> None:
+        """Adds an image file to the current shard, and removes the file once the shard is finalized."""
+
+        with open(filepath, "rb") as image_file:
+            self.add(os.path.basename(filepath), image_file.read(), entry, staged_path = filepath)
+
+
+    def finalize(self) -> None:
+        """Completes the current shard (even if it isn't full) and removes the staging files of its images."""
+
+        if self.__tar is None:
+            return
+
+        self.__tar.close()
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+        self.__file.close()
+        os.replace(self.__file.name, shardPath(self.output_path, self.__next_shard))
+
+        for staged_path in self.__staged:
+            os.remove(staged_path)
+
+        self.__next_shard += 1
+        self.__file = None
+        self.__tar = None
+        self.__count = 0
+        self.__staged = []
+
+
+    def close(self) -> None:
+        """Finalizes the current shard."""
+
+        self.finalize()
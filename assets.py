@@ -0,0 +1,109 @@
+"""Blender 2.91
+
+Texture manager for the image files used in the scene (textures and HDRIs).
+The images are kept loaded up to a memory budget, evicting the least recently used ones.
+"""
+
+import bpy
+
+import os
+from collections import OrderedDict
+
+
+class TextureManager:
+
+    def __init__(self, memory_budget : float = 2048.0):
+        """
+        Params:
+            memory_budget: The maximum amount of memory the loaded images may use (in MB).
+        """
+
+        self.memory_budget = int(memory_budget*1024**2)
+        self.__images = OrderedDict()   # Filepath -> image, from the least to the most recently used
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    @staticmethod
+    def imageSize(image : bpy.types.Image) -> int:
+        """Returns the memory used by the pixels of a loaded image (in bytes)."""
+
+        width, height = image.size
+        return width*height*image.channels*(4 if image.is_float else 1)
+
+
+    def memoryUsage(self) -> int:
+        """Returns the memory used by the loaded images of the manager (in bytes)."""
+
+        return sum(self.imageSize(image) for image in self.__images.values() if image.has_data)
+
+
+    def load(self, filepath : str) -> bpy.types.Image:
+        """Returns the image of the file, loading it if it isn't loaded already.
+
+        Params:
+            filepath: The path of the image file.
+        """
+
+        filepath = os.path.abspath(filepath)
+        image = self.__images.get(filepath)
+
+        if image is not None and image.has_data:
+            self.hits += 1
+        else:
+            self.misses += 1
+            if image is None:
+                image = bpy.data.images.load(filepath, check_existing = True)
+                image.use_fake_user = True  # Keep the image while it's managed, even if nothing uses it
+                self.__images[filepath] = image
+            image.size[:]   # Accessing the size loads the image buffer
+
+        self.__images.move_to_end(filepath)
+        self.__evict()
+
+        return image
+
+
+    def touchMaterial(self, mat : bpy.types.Material) -> None:
+        """Marks the images used by the image texture nodes of the material as used (loading them if needed)."""
+
+        for node in mat.node_tree.nodes:
+            if node.type == "TEX_IMAGE" and node.image is not None:
+                self.load(bpy.path.abspath(node.image.filepath))
+
+
+    def preload(self, filepaths : list) -> None:
+        """Loads the image files up to the memory budget (see shaders.usedImageFiles).
+
+        Params:
+            filepaths: The paths of the image files to load.
+        """
+
+        for filepath in filepaths:
+            self.load(filepath)
+
+
+    def __evict(self) -> None:
+        """Frees the pixels of the least recently used images until the memory usage is within the budget.
+
+        The images themselves are kept (so the materials using them stay valid), and they are reloaded when used again.
+        The most recently used image is never evicted.
+        """
+
+        memory_usage = self.memoryUsage()
+        for image in list(self.__images.values())[:-1]:
+            if memory_usage <= self.memory_budget:
+                break
+            if image.has_data:
+                memory_usage -= self.imageSize(image)
+                image.buffers_free()
+                self.evictions += 1
+
+
+    def stats(self) -> str:
+        """Returns the statistics of the manager as a printable string."""
+
+        return ("Textures: " + str(self.hits) + " hits, " + str(self.misses) + " misses, " + str(self.evictions) + " evictions, " +
+                "{:.1f}".format(self.memoryUsage()/1024**2) + " MB loaded.")
@@ -0,0 +1,175 @@
+"""Blender 2.91 required
+
+Benchmarks of the image generation.
+Each scenario generates a fixed set of images (the same seed and defects every time) in a background Blender process,
+rendered with Cycles on the CPU (except for the eevee scenario, Eevee can only render on the GPU), so the results are
+comparable between machines. The throughput, stage times and memory usage are saved to a JSON file. The results of two
+runs (e.g. of two commits) can be compared with --compare.
+"""
+
+import os
+import json
+import time
+import argparse
+import subprocess
+import configparser
+
+import plan
+import profiler
+from main import blenderCommand
+
+
+# The settings shared by every scenario (the rest of the settings are taken from the project config).
+base_settings = {"Output": {"imgs_per_object": "2", "overwrite": "True", "index_format": "jsonl"},
+                 "Render": {"engine": "cycles", "cpu_only": "True"},
+                 "Image": {"resolution_x": "640", "resolution_y": "480", "crop_to_object": "False"},
+                 "Performance": {"profile": "True", "mesh_cache_path": "", "geometry_library": ""}}
+
+# The scenarios of the benchmark: the defect states of the objects, and the settings changed from the base settings.
+# (The clean scenario is the Cycles baseline. Eevee can't render on the CPU, so the eevee scenario is rendered on the GPU.
+#  The teeth scenarios compare merging the teeth of the haircombs one by one and in a batch, see teethMergingSpeedup.)
+scenarios = {"clean": {"defects": {}, "settings": {}},
+             "missing_teeth": {"defects": {"missing_teeth": True}, "settings": {}},
+             "bent_teeth": {"defects": {"bent_teeth": True}, "settings": {}},
+             "warping": {"defects": {"warping": True}, "settings": {}},
+             "ejector_marks": {"defects": {"ejector_marks": 2}, "settings": {}},
+             "contamination": {"defects": {"tex_defect": "contamination"}, "settings": {}},
+             "cloudy": {"defects": {"tex_defect": "cloudy"}, "settings": {}},
+             "splay": {"defects": {"tex_defect": "splay"}, "settings": {}},
+             "eevee": {"defects": {}, "settings": {"Render": {"engine": "eevee"}}},
+             "resolution_320x240": {"defects": {}, "settings": {"Image": {"resolution_x": "320", "resolution_y": "240"}}},
+             "resolution_1280x960": {"defects": {}, "settings": {"Image": {"resolution_x": "1280", "resolution_y": "960"}}},
+             "resolution_1920x1440": {"defects": {}, "settings": {"Image": {"resolution_x": "1920", "resolution_y": "1440"}}},
+             "crop_to_object": {"defects": {}, "settings": {"Image": {"crop_to_object": "True"}}},
+             "teeth_per_tooth": {"defects": {"missing_teeth": True, "bent_teeth": True}, "settings": {"Performance": {"batch_teeth": "False"}}},
+             "teeth_batched": {"defects": {"missing_teeth": True, "bent_teeth": True}, "settings": {"Performance": {"batch_teeth": "True"}}}}
+
+
+def scenarioConfig(project_path : str, name : str) -> configparser.ConfigParser:
+    """Returns the config of the scenario (the project config with the base and scenario settings applied)."""
+
+    config = configparser.ConfigParser()
+    config.read(os.path.join(project_path, "config.ini"))
+    for settings in (base_settings, scenarios[name]["settings"]):
+        for section, values in settings.items():
+            for key, value in values.items():
+                config[section][key] = value
+
+    return config
+
+
+def runScenario(project_path : str, bench_path : str, name : str, num_imgs : int, seed : int) -> dict:
+    """Generates the images of a scenario in a background Blender process.
+
+    Params:
+        project_path: The directory containing the scripts and the config file.
+        bench_path: The directory to generate the images of the scenarios in.
+        name: The name of the scenario.
+        num_imgs: The number of images to generate.
+        seed: The seed of the images.
+    Returns:
+        The results of the scenario (see profiler.readTrace), with the images/sec and the time of the whole process.
+    """
+
+    if name not in scenarios:
+        raise ValueError("Invalid benchmark scenario: " + str(name))
+
+    output_path = os.path.abspath(os.path.join(bench_path, name))
+    os.makedirs(output_path, exist_ok = True)
+
+    # The settings of the scenario are passed to the generate script as an extra config file
+    config = scenarioConfig(project_path, name)
+    config_path = os.path.join(output_path, "config.ini")
+    with open(config_path, "w") as config_file:
+        config.write(config_file)
+
+    # The images are planned here, so the defects of the objects can be fixed
+    manifest_path = os.path.join(output_path, "manifest.jsonl")
+    records = plan.planImages(config, num_imgs, seed, defect_states = scenarios[name]["defects"])
+    plan.writeManifest(manifest_path, records)
+
+    trace_path = os.path.join(output_path, "trace.jsonl")
+    if os.path.isfile(trace_path):
+        os.remove(trace_path)
+
+    start_time = time.perf_counter()
+    subprocess.run(blenderCommand(project_path, ["--config", config_path, "--output-path", output_path, "--num-imgs", str(num_imgs),
+                                                 "--overwrite", "--manifest", manifest_path, "--start-index", "0"]), check = True)
+    process_time = time.perf_counter() - start_time
+
+    results = profiler.readTrace(trace_path)
+    results["images_per_sec"] = results["images"]/results["wall_time"] if results["wall_time"] > 0 else 0.0
+    results["process_time"] = process_time
+
+    return results
+
+
+def compareResults(old : dict, new : dict) -> str:
+    """Returns the change of the throughput of the scenarios between two benchmark results as a printable table."""
+
+    lines = ["{:<24}{:>12}{:>12}{:>10}".format("Scenario", "Old [img/s]", "New [img/s]", "Change")]
+    for name in new["scenarios"]:
+        if name in old["scenarios"]:
+            old_ips, new_ips = old["scenarios"][name]["images_per_sec"], new["scenarios"][name]["images_per_sec"]
+            change = "{:+.1f}%".format(100*(new_ips/old_ips - 1)) if old_ips > 0 else "-"
+            lines.append("{:<24}{:>12.3f}{:>12.3f}{:>10}".format(name, old_ips, new_ips, change))
+
+    return "\n".join(lines)
+
+
+def teethMergingSpeedup(results : dict) -> float:
+    """Returns the speedup of building the meshes with the teeth merged in a batch instead of one by one.
+
+    Params:
+        results: The results of the benchmark, with both of the teeth scenarios.
+    Returns:
+        The ratio of the median build_mesh times of the teeth_per_tooth and teeth_batched scenarios.
+    """
+
+    per_tooth = results["scenarios"]["teeth_per_tooth"]["stages"]["build_mesh"]["p50"]
+    batched = results["scenarios"]["teeth_batched"]["stages"]["build_mesh"]["p50"]
+
+    return per_tooth/batched if batched > 0 else 0.0
+
+
+def gitCommit(project_path : str) -> str:
+    """Returns the current commit of the project (or None if it isn't a git repository)."""
+
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd = project_path, capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+
+    project_path = os.path.abspath(os.path.dirname(__file__))
+
+    parser = argparse.ArgumentParser(description = "Benchmark the image generation with fixed scenarios.")
+    parser.add_argument("--scenarios", nargs = "+", default = list(scenarios), choices = list(scenarios), help = "The scenarios to run (default: all).")
+    parser.add_argument("--num-imgs", type = int, default = 10, help = "The number of images generated in each scenario.")
+    parser.add_argument("--seed", type = int, default = 0, help = "The seed of the images.")
+    parser.add_argument("--bench-path", default = os.path.join(project_path, "benchmark"), help = "The directory to generate the images in.")
+    parser.add_argument("--output", default = "benchmark.json", help = "The JSON file to save the results to.")
+    parser.add_argument("--compare", default = None, help = "The results of a previous benchmark to compare the results to.")
+    args = parser.parse_args()
+
+    results = {"commit": gitCommit(project_path), "num_imgs": args.num_imgs, "seed": args.seed, "scenarios": {}}
+    for name in args.scenarios:
+        results["scenarios"][name] = runScenario(project_path, args.bench_path, name, args.num_imgs, args.seed)
+        print(name + ": " + "{:.3f}".format(results["scenarios"][name]["images_per_sec"]) + " images/s")
+
+    if "teeth_per_tooth" in results["scenarios"] and "teeth_batched" in results["scenarios"]:
+        results["teeth_merging_speedup"] = teethMergingSpeedup(results)
+        print("Speedup of the batched teeth merging: " + "{:.2f}".format(results["teeth_merging_speedup"]) + "x")
+
+    with open(args.output, "w") as results_file:
+        json.dump(results, results_file, indent = 2, sort_keys = True)
+
+    if args.compare is not None:
+        with open(args.compare, "r") as old_file:
+            print(compareResults(json.load(old_file), results))
+
+
+if __name__ == "__main__":
+    main()
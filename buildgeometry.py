@@ -0,0 +1,54 @@
+"""Blender 2.91
+
+This script builds the haircomb meshes of the variants of a job into the mesh cache of the geometry library (see library.py).
+"""
+
+import bpy
+
+import sys
+project_path = sys.argv[sys.argv.index("--") + 1]
+sys.path.append(project_path)
+
+import os
+import json
+import configparser
+import haircomb, utils, cache
+
+
+config = configparser.ConfigParser()
+config.read(os.path.join(project_path, "config.ini"))
+
+library_path, job_path = sys.argv[sys.argv.index("--") + 2:]
+with open(job_path, "r") as job_file:
+    variants = json.load(job_file)
+
+# Clear everything in the scene
+bpy.ops.object.select_all(action = "SELECT")
+bpy.ops.object.delete()
+utils.removeMeshes()
+utils.removeMaterials()
+
+mesh_cache = cache.MeshCache(library_path)
+material = bpy.data.materials.new(name = "HaircombMaterial")
+material.use_fake_user = True
+
+for variant_idx, variant in enumerate(variants):
+    hc = haircomb.Haircomb(missing_teeth = variant["defects"]["missing_teeth"],
+                           bent_teeth = variant["defects"]["bent_teeth"],
+                           warping = variant["defects"]["warping"],
+                           ejector_marks = variant["defects"]["ejector_marks"],
+                           mesh_cache = mesh_cache,
+                           batch_teeth = config["Performance"]["batch_teeth"] == "True",
+                           backend = config["Object"]["backend"],
+                           material = material,
+                           seed = variant["geometry_seed"])
+
+    # The variants without random geometry defects share their meshes, these are only built once
+    if not mesh_cache.contains(cache.cacheKey(hc.getGeometryParams())):
+        hc.createHaircomb()     # Stores the mesh in the cache
+        mesh = hc.getObject().data
+        bpy.data.objects.remove(hc.getObject())
+        bpy.data.meshes.remove(mesh)
+        utils.purgeOrphans()
+
+    print("Variant " + str(variant_idx + 1) + "/" + str(len(variants)) + " done.\n")
@@ -0,0 +1,111 @@
+"""Blender 2.91
+
+On-disk cache for generated meshes.
+The meshes are stored as numpy arrays, keyed by a hash of the parameters they were generated from.
+"""
+
+import bpy, mathutils
+
+import os
+import json
+import hashlib
+import numpy as np
+import geometry as geo
+
+
+def cacheKey(params : dict) -> str:
+    """Returns the cache key of the mesh generated from the given parameters.
+
+    Params:
+        params: Every parameter the generated mesh depends on (must be JSON serializable).
+    """
+
+    return hashlib.sha256(json.dumps(params, sort_keys = True).encode("utf-8")).hexdigest()
+
+
+class MeshCache:
+
+    def __init__(self, cache_path : str):
+        """
+        Params:
+            cache_path: The directory to store the cached meshes in.
+        """
+
+        self.cache_path = cache_path
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.cache_path, exist_ok = True)
+
+
+    def __filepath(self, key : str) -> str:
+        return os.path.join(self.cache_path, key + ".npz")
+
+
+    def contains(self, key : str) -> bool:
+        """Returns True if the mesh of the key is in the cache."""
+
+        return os.path.isfile(self.__filepath(key))
+
+
+    def load(self, key : str, name : str = "cached") -> bpy.types.Object:
+        """Creates an object in the scene from the cached mesh.
+
+        Params:
+            key: The cache key of the mesh.
+            name: The name of the created object and mesh.
+        Returns:
+            The created object, or None if the mesh is not in the cache.
+        """
+
+        filepath = self.__filepath(key)
+        if not os.path.isfile(filepath):
+            self.misses += 1
+            return None
+
+        with np.load(filepath) as data:
+            mesh = geo.meshFromArrays(name, data["vertices"], data["loop_vertices"], data["loop_starts"], data["loop_totals"], data["use_smooth"])
+
+            obj = bpy.data.objects.new(name, mesh)
+            obj.matrix_world = mathutils.Matrix(data["matrix_world"].tolist())
+            bpy.context.collection.objects.link(obj)
+
+        self.hits += 1
+
+        return obj
+
+
+    def store(self, key : str, obj : bpy.types.Object) -> None:
+        """Adds the mesh of the object to the cache.
+
+        The file is written under a temporary name first, so concurrent processes sharing the cache
+        never load a partially written mesh.
+
+        Params:
+            key: The cache key of the mesh.
+            obj: The object to store the mesh of (with its modifiers already applied).
+        """
+
+        mesh = obj.data
+
+        loop_vertices = np.empty(len(mesh.loops), dtype = np.int32)
+        mesh.loops.foreach_get("vertex_index", loop_vertices)
+
+        loop_starts = np.empty(len(mesh.polygons), dtype = np.int32)
+        loop_totals = np.empty(len(mesh.polygons), dtype = np.int32)
+        use_smooth = np.empty(len(mesh.polygons), dtype = bool)
+        mesh.polygons.foreach_get("loop_start", loop_starts)
+        mesh.polygons.foreach_get("loop_total", loop_totals)
+        mesh.polygons.foreach_get("use_smooth", use_smooth)
+
+        filepath = self.__filepath(key)
+        tmp_filepath = filepath + "." + str(os.getpid()) + ".tmp"
+        with open(tmp_filepath, "wb") as cache_file:
+            np.savez(cache_file,
+                     vertices = geo.getVertexCoords(mesh),
+                     loop_vertices = loop_vertices,
+                     loop_starts = loop_starts,
+                     loop_totals = loop_totals,
+                     use_smooth = use_smooth,
+                     matrix_world = np.array(obj.matrix_world, dtype = np.float64))
+        os.replace(tmp_filepath, filepath)
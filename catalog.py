@@ -0,0 +1,208 @@
+"""Queries of the SQLite catalog of the generated images (Blender is not required).
+
+The catalog is the index of an output directory written with the sqlite index format (index.sqlite).
+Examples:
+    python catalog.py output count --with bent_teeth cloudy
+    python catalog.py output count --with bent_teeth --where hdri_name=lebombo.hdr num_ejector_marks=3
+    python catalog.py output export subset --per-class 500 --copy-images
+"""
+
+import os
+import random
+import shutil
+import argparse
+
+import sinks
+import archive
+
+
+# The defect labels of the images (the indexed columns of the catalog).
+defect_labels = sinks.label_columns[1:]
+
+# The render params the images can be filtered by, with the types of their values (the indexed param columns of the catalog).
+filter_columns = {column: int if sql_type == "INTEGER" else str for _, column, sql_type, indexed in sinks.param_columns if indexed}
+
+
+def openCatalog(path : str):
+    """Opens the catalog of an output directory, or the catalog file at the path."""
+
+    filepath = os.path.join(path, "index.sqlite") if os.path.isdir(path) else path
+    if not os.path.isfile(filepath):
+        raise ValueError("There is no catalog at " + str(path))
+
+    return sinks.connectCatalog(filepath)
+
+
+def labelCondition(present : tuple, absent : tuple) -> str:
+    """Returns the SQL condition of the images with every one of the present and none of the absent defects."""
+
+    for label in present + absent:
+        if label not in defect_labels:
+            raise ValueError("Invalid defect label: " + str(label))
+
+    conditions = [label + " != 0" for label in present] + [label + " = 0" for label in absent]
+
+    return " AND ".join(conditions) if conditions else "1"
+
+
+def filterCondition(filters : dict) -> tuple:
+    """Returns the SQL condition of the images with the given render params, and the values of its placeholders.
+
+    Params:
+        filters: Dict with the names of the filter columns as keys and the values the images must have as values
+                 (None for the images without the param, e.g. without a texture defect).
+    """
+
+    for column in filters:
+        if column not in filter_columns:
+            raise ValueError("Invalid filter column: " + str(column))
+
+    conditions = [column + (" IS NULL" if value is None else " = ?") for column, value in filters.items()]
+    values = [value for value in filters.values() if value is not None]
+
+    return (" AND ".join(conditions) if conditions else "1"), values
+
+
+def parseFilters(filters : list) -> dict:
+    """Parses the column=value filters of the command line (a value of none matches the images without the param)."""
+
+    parsed = {}
+    for item in filters:
+        column, sep, value = item.partition("=")
+        if not sep or column not in filter_columns:
+            raise ValueError("Invalid filter: " + str(item) + " (must be column=value, with one of the columns " + ", ".join(filter_columns) + ")")
+        parsed[column] = None if value == "none" else filter_columns[column](value)
+
+    return parsed
+
+
+def countImages(connection, present : tuple = (), absent : tuple = (), filters : dict = None) -> int:
+    """Returns the number of images in the catalog with every one of the present and none of the absent defects.
+
+    Params:
+        connection: The connection to the catalog.
+        present: The defect labels the images must have.
+        absent: The defect labels the images must not have.
+        filters: The render params the images must have (see filterCondition).
+    """
+
+    condition, values = filterCondition(filters or {})
+    condition = labelCondition(tuple(present), tuple(absent)) + " AND " + condition
+
+    return connection.execute("SELECT COUNT(*) FROM images WHERE " + condition, values).fetchone()[0]
+
+
+def balancedSubset(connection, per_class : int, seed : int = 0, filters : dict = None) -> list:
+    """Returns a class balanced subset of the images in the catalog.
+
+    Each defect class (and the images without defects) contributes up to per_class images. The rarest classes are
+    sampled first, and an image is only selected once, even if it belongs to several classes.
+
+    Params:
+        connection: The connection to the catalog.
+        per_class: The number of images to select from each class.
+        seed: The seed of the sampling.
+        filters: Only select the images with these render params (see filterCondition).
+    Returns:
+        The index entries of the selected images.
+    """
+
+    rng = random.Random(seed)
+    classes = [((label,), ()) for label in defect_labels] + [((), tuple(defect_labels))]
+    classes.sort(key = lambda cls: countImages(connection, *cls, filters))
+
+    filter_condition, values = filterCondition(filters or {})
+
+    selected = set()
+    for present, absent in classes:
+        condition = labelCondition(present, absent) + " AND " + filter_condition
+        filenames = [row[0] for row in connection.execute("SELECT Filenames FROM images WHERE " + condition + " ORDER BY Filenames", values)]
+        filenames = [filename for filename in filenames if filename not in selected]
+        selected.update(rng.sample(filenames, min(per_class, len(filenames))))
+
+    rows = connection.execute("SELECT * FROM images ORDER BY rowid")
+
+    return [sinks.catalogEntry(row) for row in rows if row["Filenames"] in selected]
+
+
+def exportSubset(entries : list, output_path : str, source_path : str = None, index_format : str = "csv") -> None:
+    """Writes the index of a subset of the images, and optionally copies its images.
+
+    The images are copied from the imgs directory of the source, or extracted from its archive if they were archived
+    (see archive.py).
+
+    Params:
+        entries: The index entries of the images.
+        output_path: The directory to export the subset to.
+        source_path: The output directory containing the images to copy, or None to only write the index.
+        index_format: The format of the exported index (see sinks.openSink).
+    """
+
+    index_sink = sinks.openSink(index_format, output_path, append = False)
+    for entry in entries:
+        index_sink.write(entry)
+    index_sink.close()
+
+    if source_path is None:
+        return
+
+    os.makedirs(os.path.join(output_path, "imgs"), exist_ok = True)
+
+    remaining = set()
+    for entry in entries:
+        filepath = os.path.join(source_path, "imgs", entry["Filenames"])
+        if os.path.isfile(filepath):
+            shutil.copy2(filepath, os.path.join(output_path, "imgs", entry["Filenames"]))
+        else:
+            remaining.add(entry["Filenames"])
+
+    # The archived images are extracted from the shards (reading each shard once)
+    if remaining:
+        for filename, data, _ in archive.readArchive(source_path):
+            if filename in remaining:
+                with open(os.path.join(output_path, "imgs", filename), "wb") as image_file:
+                    image_file.write(data)
+                remaining.remove(filename)
+
+    if remaining:
+        raise ValueError("The images of " + str(len(remaining)) + " entries aren't in the imgs directory or the archive of " +
+                         str(source_path) + " (e.g. " + sorted(remaining)[0] + ")")
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description = "Query the SQLite catalog of the generated images.")
+    parser.add_argument("catalog_path", help = "The output directory (or the catalog file) to query.")
+    commands = parser.add_subparsers(dest = "command", required = True)
+
+    count_parser = commands.add_parser("count", help = "Count the images with the given defects.")
+    count_parser.add_argument("--with", dest = "present", nargs = "+", default = [], choices = defect_labels, help = "The defects the images must have.")
+    count_parser.add_argument("--without", dest = "absent", nargs = "+", default = [], choices = defect_labels, help = "The defects the images must not have.")
+    count_parser.add_argument("--where", dest = "filters", nargs = "+", default = [], metavar = "COLUMN=VALUE",
+                              help = "The render params the images must have (columns: " + ", ".join(filter_columns) + ").")
+
+    export_parser = commands.add_parser("export", help = "Export a class balanced subset of the images.")
+    export_parser.add_argument("export_path", help = "The directory to export the subset to.")
+    export_parser.add_argument("--per-class", type = int, required = True, help = "The number of images from each defect class (and without defects).")
+    export_parser.add_argument("--seed", type = int, default = 0, help = "The seed of the sampling.")
+    export_parser.add_argument("--format", default = "csv", choices = list(sinks.sink_types), help = "The format of the exported index.")
+    export_parser.add_argument("--copy-images", action = "store_true", help = "Copy the images of the subset too.")
+    export_parser.add_argument("--where", dest = "filters", nargs = "+", default = [], metavar = "COLUMN=VALUE",
+                               help = "Only export the images with these render params (columns: " + ", ".join(filter_columns) + ").")
+    args = parser.parse_args()
+
+    connection = openCatalog(args.catalog_path)
+
+    if args.command == "count":
+        print(countImages(connection, args.present, args.absent, parseFilters(args.filters)))
+    elif args.command == "export":
+        entries = balancedSubset(connection, args.per_class, args.seed, parseFilters(args.filters))
+        source_path = os.path.dirname(os.path.abspath(args.catalog_path)) if os.path.isfile(args.catalog_path) else args.catalog_path
+        exportSubset(entries, args.export_path, source_path if args.copy_images else None, args.format)
+        print("Exported " + str(len(entries)) + " images to " + str(args.export_path) + ".")
+
+    connection.close()
+
+
+if __name__ == "__main__":
+    main()
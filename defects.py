@@ -2,8 +2,6 @@
 on the types of defects enabled.
 """
 
-import math
-import random
 import numpy as np
 
 
@@ -55,7 +53,21 @@ class Defects:
         else:
             raise ValueError("Invalid number of ejector marks.")
 
-        self.updateDefectCombination()
+
+    @classmethod
+    def fromConfig(cls, config) -> "Defects":
+        """Returns a defect generator with the defects enabled in the Object section of the config."""
+
+        return cls(config["Object"]["enable_missing_teeth"] == "True",
+                   config["Object"]["enable_bent_teeth"] == "True",
+                   config["Object"]["enable_warping"] == "True",
+                   config["Object"]["enable_ejector_marks"] == "True",
+                   config["Object"]["enable_gloss"] == "True",
+                   config["Object"]["enable_discoloration"] == "True",
+                   config["Object"]["enable_contamination"] == "True",
+                   config["Object"]["enable_cloudy"] == "True",
+                   config["Object"]["enable_splay"] == "True",
+                   int(config["Object"]["num_ejector_marks"]))
 
 
     def __meanDefects(self) -> float:
@@ -66,37 +78,43 @@ class Defects:
         return mean_num_defects
 
 
-    def __calcNumDefects(self) -> int:
-        """Returns the number of defects the next object should have, chosen randomly from a Poisson distribution."""
-
-        rand = np.random.poisson(self.__meanDefects())
-        rand = min(len(self.__defects_enabled), rand)
-
-        return rand
+    def sampleDefectCombinations(self, num : int, np_rng : np.random.Generator) -> dict:
+        """Returns num random defect combinations depending on the enabled defects.
 
+        The number of defects of each combination is drawn from a Poisson distribution, the defects themselves are
+        chosen from the enabled ones uniformly (the texture defects are mutually exclusive).
 
-    def updateDefectCombination(self):
-        """Update the state of the defects to a new random state depending on the enabled defects."""
+        Params:
+            num: The number of defect combinations to draw.
+            np_rng: The numpy random number generator to use.
+        Returns:
+            Dict with the names of the defect states as keys and arrays of the states as values.
+        """
 
-        num_defects = self.__calcNumDefects()
+        num_enabled = len(self.__defects_enabled)
+        num_defects = np.minimum(np_rng.poisson(self.__meanDefects(), num), num_enabled)
 
-        defects = random.sample(self.__defects_enabled, num_defects)
+        # Random subsets of the enabled defects (the defects with the num_defects lowest random ranks are chosen)
+        ranks = np.argsort(np.argsort(np_rng.random((num, num_enabled)), axis = 1), axis = 1)
+        chosen = ranks < num_defects[:, np.newaxis]
 
-        # Update states
-        self.missing_teeth = defects.count("missing_teeth") > 0
-        self.bent_teeth = defects.count("bent_teeth") > 0
-        self.warping = defects.count("warping") > 0
-        self.ejector_marks = self.__num_ejector_marks if defects.count("ejector_marks") > 0 else 0
-        self.gloss = defects.count("gloss") > 0
-        self.discoloration = defects.count("discoloration") > 0
+        def isChosen(defect : str) -> np.ndarray:
+            if defect not in self.__defects_enabled:
+                return np.zeros(num, dtype = bool)
+            return chosen[:, self.__defects_enabled.index(defect)]
 
         # The texture defects are mutually exclusive
-        self.tex_defect = None
-        if defects.count("texture") != 0:
-            defects.remove("texture")
-            self.tex_defect = random.sample(self.__tex_defects_enabled, 1)[0]
-            defects.append(self.tex_defect)
-
-        self.contamination = defects.count("contamination") > 0
-        self.cloudy = defects.count("cloudy") > 0
-        self.splay = defects.count("splay") > 0
\ No newline at end of file
+        tex_defects = np.array(self.__tex_defects_enabled + [None], dtype = object)
+        tex_choice = np_rng.integers(0, max(len(self.__tex_defects_enabled), 1), num)
+        tex_defect = np.where(isChosen("texture"), tex_defects[tex_choice], None)
+
+        return {"missing_teeth": isChosen("missing_teeth"),
+                "bent_teeth": isChosen("bent_teeth"),
+                "warping": isChosen("warping"),
+                "ejector_marks": np.where(isChosen("ejector_marks"), self.__num_ejector_marks, 0),
+                "gloss": isChosen("gloss"),
+                "discoloration": isChosen("discoloration"),
+                "tex_defect": tex_defect,
+                "contamination": tex_defect == "contamination",
+                "cloudy": tex_defect == "cloudy",
+                "splay": tex_defect == "splay"}
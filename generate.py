@@ -13,14 +13,40 @@ import os
 import math
 import random
 import time
+import argparse
 import configparser
-import csv
+import json
+import glob
+import itertools
+import contextlib
 import numpy as np
-import haircomb, scene, shaders, render, utils, defects
+import haircomb, scene, shaders, render, utils, cache, assets, plan, resume, sinks, profiler, output, archive
 
 
+script_args = sys.argv[sys.argv.index("--") + 2:]
+
+# Extra config files can override the settings of the project config (used by the benchmarks)
+config_parser = argparse.ArgumentParser(add_help = False)
+config_parser.add_argument("--config", action = "append", default = [])
 config = configparser.ConfigParser()
-config.read(os.path.join(project_path, "config.ini"))
+config.read([os.path.join(project_path, "config.ini")] + config_parser.parse_known_args(script_args)[0].config)
+
+# Command line overrides of the output settings (used when the images are split between several Blender processes)
+parser = argparse.ArgumentParser(parents = [config_parser])
+parser.add_argument("--output-path", default = config["Output"]["output_path"])
+parser.add_argument("--num-imgs", type = int, default = int(config["Output"]["num_imgs"]))
+parser.add_argument("--overwrite", action = "store_true", default = config["Output"]["overwrite"] == "True")
+parser.add_argument("--seed", type = int, default = int(config["Output"]["seed"]) if config["Output"]["seed"] else None)
+parser.add_argument("--start-index", type = int, default = None,
+                    help = "The index of the first generated image in the whole run (its record is planned from the run seed and this index, "
+                           "or read from this index of the manifest).")
+parser.add_argument("--manifest", default = None,
+                    help = "Generate the images of this manifest instead of planning them (see plan.py).")
+parser.add_argument("--resume", action = "store_true",
+                    help = "Resume the interrupted run of the output directory (only the missing images are generated).")
+parser.add_argument("--serve", metavar = "SPOOL_PATH", default = None,
+                    help = "Keep running after the setup and generate the jobs submitted to the spool directory.")
+args = parser.parse_args(script_args)
 
 
 # Clear everything in the scene
@@ -36,7 +62,9 @@ if config["Render"]["engine"] == "cycles":
     render.setupCycles(samples = int(config["Render"]["samples"]),
                        bounces = int(config["Render"]["bounces"]),
                        tile_size = int(config["Render"]["tile_size"]),
-                       denoising = config["Render"]["denoise"] == "True")
+                       denoising = config["Render"]["denoise"] == "True",
+                       persistent_data = config["Render"]["persistent_data"] == "True",
+                       cpu_only = config["Render"]["cpu_only"] == "True")
 elif config["Render"]["engine"] == "eevee":
     render.setupEevee(samples = int(config["Render"]["samples"]))
 else:
@@ -46,15 +74,45 @@ else:
 # Set the output image settings based on the config
 render.setImageSettings(res_x = int(config["Image"]["resolution_x"]),
                         res_y = int(config["Image"]["resolution_y"]),
-                        color = config["Image"]["color"] == "True")
+                        color = config["Image"]["color"] == "True",
+                        compression = int(config["Image"]["compression"]),
+                        view_transform = config["Image"]["view_transform"])
+
+# Encode and write the images in background threads while the next images are rendered
+image_writer = None
+if config["Performance"]["async_output"] == "True":
+    if config["Performance"]["batch_views"] == "True":
+        raise ValueError("async_output can't be used with batch_views.")
+    if config["Image"]["view_transform"] != "Standard":
+        # The images would look different from the ones saved by Blender
+        raise ValueError("async_output requires the Standard view_transform.")
+    render.setupViewerOutput()
+    image_writer = output.AsyncImageWriter(threads = int(config["Performance"]["output_threads"]),
+                                           max_pending = int(config["Performance"]["max_pending_images"]),
+                                           compression = round(int(config["Image"]["compression"])*9/100))
 
 
 # Setup the environment (the parts which won't change between images)
-# Ground (only the shaders change between images, the object doesn't)
-ground_mat = bpy.data.materials.new(name = "ground")
+tex_path = os.path.join(project_path, "textures")
+hdri_path = os.path.join(project_path, "hdris")
+
+# Texture and HDRI images (kept loaded between the images up to the memory budget)
+texture_manager = assets.TextureManager(memory_budget = float(config["Performance"]["texture_memory_budget"]))
+if config["Performance"]["preload_textures"] == "True":
+    # Only the images the materials actually use are preloaded (not every file in the textures directory)
+    texture_manager.preload(shaders.usedImageFiles(tex_path, hdri_path if config["Lights"]["use_hdris"] == "True" else None))
+
+# Haircomb material (shared by all of the haircombs, only the values of its shader nodes change between images)
+plastic_mat = bpy.data.materials.new(name = "HaircombMaterial")
+plastic_mat.use_fake_user = True    # Kept by the orphan purges even between the haircombs
+shaders.buildPlastic(plastic_mat, tex_path, texture_manager)
+
+# Ground (only the material changes between images, the object doesn't)
+# One material is built for each of the ground textures, these are only swapped between the images
+ground_mats = shaders.buildTextureMaterials(tex_path, texture_manager)
 bpy.ops.mesh.primitive_plane_add(size = scene.ground_plane_size)
 ground = bpy.context.object
-ground.data.materials.append(ground_mat)
+ground.data.materials.append(next(iter(ground_mats.values())))
 
 # World/environment
 world = bpy.context.scene.world
@@ -62,123 +120,383 @@ if config["Lights"]["use_hdris"] == "True":
     node_env = world.node_tree.nodes.new(type = "ShaderNodeTexEnvironment")
     world.node_tree.links.new(node_env.outputs["Color"], world.node_tree.nodes["Background"].inputs["Color"])
 
-# Setup for the defect combination generator
-defect_gen = defects.Defects(config["Object"]["enable_missing_teeth"] == "True",
-                              config["Object"]["enable_bent_teeth"] == "True",
-                              config["Object"]["enable_warping"] == "True",
-                              config["Object"]["enable_ejector_marks"] == "True",
-                              config["Object"]["enable_gloss"] == "True",
-                              config["Object"]["enable_discoloration"] == "True",
-                              config["Object"]["enable_contamination"] == "True",
-                              config["Object"]["enable_cloudy"] == "True",
-                              config["Object"]["enable_splay"] == "True",
-                              int(config["Object"]["num_ejector_marks"]))
-
-
-# Index file
-# Either create a new index or if it already exists, append new images
-img_name, img_cntr = 1, 0
-index_filepath = os.path.join(config["Output"]["output_path"], "index.csv")
-
-append_index = os.path.isfile(index_filepath) and config["Output"]["overwrite"] != "True"
-if append_index:
-    index_file = open(index_filepath, "r")
-    img_name = sum(1 for line in index_file)
-    index_file.close()
-
-if append_index:
-    index_file = open(index_filepath, "a+", newline = "")
-    index_writer = csv.writer(index_file)
-else:
-    index_file = open(index_filepath, "w", newline = "")
-    index_writer = csv.writer(index_file)
-    index_writer.writerow(["Filenames", "missing_teeth", "bent_teeth", "warped", "ejector_marks", "low_gloss", "discoloration", "contamination", "cloudy", "splay"])
+# Cache of the generated haircomb meshes
+# (the meshes of the geometry library are loaded from its cache, see library.py)
+mesh_cache = None
+if config["Performance"]["geometry_library"]:
+    mesh_cache = cache.MeshCache(config["Performance"]["geometry_library"])
+elif config["Performance"]["mesh_cache_path"]:
+    mesh_cache = cache.MeshCache(config["Performance"]["mesh_cache_path"])
 
-# The overall number of images to generate, and the number of images to generate of 1 object before creating a new object model.
-num_imgs = int(config["Output"]["num_imgs"])
-imgs_per_object = int(config["Output"]["imgs_per_object"])
 
-for _ in range(int(num_imgs/imgs_per_object)):
-    
-    # Delete the haircomb if it already exists
-    if "hc" in locals():
-        bpy.data.objects.remove(hc.getObject())
-
-    # Generate a new defect combination
-    defect_gen.updateDefectCombination()
-    
-    # Create the haircomb with defects if needed
-    hc = haircomb.Haircomb(missing_teeth = defect_gen.missing_teeth,
-                           bent_teeth = defect_gen.bent_teeth,
-                           warping = defect_gen.warping,
-                           ejector_marks = defect_gen.ejector_marks)
-    hc.createHaircomb()
-
-    # Generate images of the haircomb
-    for _ in range(imgs_per_object):
-
-        # Add random materials to the objects in the scene.
-        tex_path = os.path.join(project_path, "textures")
-        # Apply the plastic texture to the object.
-        shaders.applyPlastic(mat = hc.getMaterial(),
-                             color = (0.0, 0.0, 0.0, 1.0),
-                             surface = config["Object"]["surface"],
-                             randomize = config["Object"]["randomize"] == "True",
-                             textures_path = tex_path,
-                             tex_defect = defect_gen.tex_defect,
-                             gloss_defect = defect_gen.gloss,
-                             discoloration = defect_gen.discoloration)
-
-        # Apply a random material texture to the ground plane.
-        ground_texture = shaders.applyRandomTextures(ground_mat, tex_path)
-    
-
-        # Camera setup (so that the object is always in the frame).
-        scene.removeCameras()
-
-        coords = hc.getBoundingBox()
-        coords = utils.randomExtendBoundingBox(bounding_box = coords,
-                                               max_x = hc.width*float(config["Camera"]["extend_x"]),
-                                               max_y = hc.width*float(config["Camera"]["extend_y"]))
-
-        camera = scene.placeCamera(coords,
-                                   max_view_angle_x = float(config["Camera"]["max_view_angle_x"]),
-                                   max_view_angle_y = float(config["Camera"]["max_view_angle_y"]),
-                                   max_roll_angle = float(config["Camera"]["max_roll_angle"]))
-
-
-        # Lighting setup
-        if config["Lights"]["use_hdris"] == "True":
-            hdri = random.choice(scene.hdris)
-            hdri_path = os.path.join(project_path, "hdris", hdri["name"])
-
-            node_env.image = bpy.data.images.load(hdri_path, check_existing = True)
-            world.node_tree.nodes["Background"].inputs["Strength"].default_value = random.uniform(hdri["light_min"], hdri["light_max"])
-            # Adjust HDRI light strength based on the ground textures
-            world.node_tree.nodes["Background"].inputs["Strength"].default_value += ground_texture["light_correction"]
+# The number of images to generate of 1 object before creating a new object model.
+imgs_per_object = int(config["Output"]["imgs_per_object"])
+# Reuse the same camera and lights for every image instead of recreating them.
+pool_objects = config["Performance"]["pool_objects"] == "True"
+# Render all of the images of an object with one animation render (the views are keyframed onto consecutive frames).
+batch_views = config["Performance"]["batch_views"] == "True"
+if batch_views and not pool_objects:
+    raise ValueError("batch_views requires pool_objects.")
+
+# Only render the region of the frame containing the (extended) bounding box of the object, the images are cropped to it.
+crop_to_object = config["Image"]["crop_to_object"] == "True"
+
+# The properties which change between the views of an object (keyframed in batch_views mode).
+batch_properties = []
+if batch_views:
+    camera = scene.pooledCamera()
+    batch_properties += [(camera, "location"), (camera, "rotation_euler")]
+    if crop_to_object:
+        batch_properties += [(bpy.context.scene, "render." + border) for border in ("border_min_x", "border_min_y", "border_max_x", "border_max_y")]
+    if config["Lights"]["use_hdris"] == "True":
+        batch_properties.append((world.node_tree, 'nodes["Background"].inputs["Strength"].default_value'))
+    else:
+        for light in scene.pooledLights(int(config["Lights"]["num_lights"])):
+            batch_properties += [(light, "location"), (light.data, "energy")]
+    for node in plastic_mat.node_tree.nodes:
+        for idx, node_input in enumerate(node.inputs):
+            if hasattr(node_input, "default_value"):
+                batch_properties.append((plastic_mat.node_tree, 'nodes["' + node.name + '"].inputs[' + str(idx) + '].default_value'))
+
+# The format of the index, and the number of index entries written at once (the progress is checkpointed after each batch).
+index_format = config["Output"]["index_format"]
+index_batch_size = int(config["Performance"]["index_batch_size"])
+# The number of images in each tar shard of the archive (0 to keep the images as separate files).
+archive_shard_size = int(config["Output"]["archive_shard_size"])
+# The number of images between the purges of the orphan datablocks (0 to disable the purges).
+gc_interval = int(config["Performance"]["gc_interval"])
+
+# The current haircomb object in the scene.
+hc = None
+# The lighting of the scene (the HDRI or the lights of the last image).
+applied_lighting = None
+
+
+def removeHaircomb() -> None:
+    """Removes the current haircomb from the scene, together with the leftover objects of a partially built haircomb
+    (every mesh object except the ground) and the datablocks which aren't used anymore."""
+
+    global hc
+
+    for obj in [obj for obj in bpy.data.objects if obj.type == "MESH" and obj != ground]:
+        bpy.data.objects.remove(obj)
+    utils.purgeOrphans()
+    hc = None
+
+
+def generateImages(output_path : str,
+                   num_imgs : int,
+                   overwrite : bool,
+                   seed : int = None,
+                   start_index : int = None,
+                   manifest_path : str = None,
+                   resume_run : bool = False) -> None:
+    """Generates images into the output directory using the scene set up above.
+
+    Every random parameter of the images is planned before the rendering starts (see plan.py),
+    this function only executes the records of the images.
+
+    Params:
+        output_path: The directory to save the images and the index to.
+        num_imgs: The overall number of images to generate (should be a multiple of imgs_per_object).
+        overwrite: Overwrite the existing index in the output directory if True, otherwise append to it.
+        seed: The seed of the run (a random one is used if None).
+        start_index: The index of the first image in the run (continues the numbering of the index if None).
+        manifest_path: Generate the images of this manifest (starting from start_index) instead of planning them.
+        resume_run: Resume the interrupted run of the output directory instead of starting a new one
+                    (the other params except the output_path are ignored).
+    """
+
+    global hc, applied_lighting
+
+    img_cntr = 0
+    os.makedirs(output_path, exist_ok = True)
+
+    # The images are rendered into the imgs directory, and moved into the archive after they were added to the index
+    image_archive = None
+    index_sink = None
+    unarchived = []     # The index entries of the images which weren't moved into the archive yet
+
+    try:
+        if resume_run:
+            # Only the incomplete images of the interrupted run are generated (the index is reconciled with the images)
+            checkpoint = resume.readCheckpoint(output_path)
+            archived = set()
+            if archive_shard_size > 0:
+                image_archive = archive.TarShardWriter(output_path, archive_shard_size, append = True)
+                archived = archive.archivedNames(output_path)
+            records, names = resume.reconcile(output_path, index_format, whole_objects = batch_views,
+                                              rebuild_entries = not crop_to_object, archived = archived)
+            checkpoint["completed"] = checkpoint["num_imgs"] - len(records)
+            index_sink = sinks.openSink(index_format, output_path, append = True)
+            if image_archive is not None:
+                # The complete images of the shard which wasn't finalized before the interruption
+                unarchived = [entry for entry in index_sink.read() if os.path.isfile(os.path.join(output_path, "imgs", entry["Filenames"]))]
         else:
-            scene.removeLights()
-            scene.placeLights(num_lights = int(config["Lights"]["num_lights"]),
-                              height_min = float(config["Lights"]["height_min"]),
-                              height_max = float(config["Lights"]["height_max"]),
-                              hdistance_min = float(config["Lights"]["distance_min"]),
-                              hdistance_max = float(config["Lights"]["distance_max"]),
-                              strength_min = float(config["Lights"]["strength_min"]),
-                              strength_max = float(config["Lights"]["strength_max"]))
-
-
-        # Render and save the image
-        img_path = os.path.join(config["Output"]["output_path"], "imgs", str(img_name) + ".png")
-        render.render(img_path)
-
-        # Add the generated image to the index
-        index_writer.writerow([str(img_name) + ".png", str(int(defect_gen.missing_teeth)), str(int(defect_gen.bent_teeth)), str(int(defect_gen.warping)),
-                               str(int(defect_gen.ejector_marks != 0)), str(int(defect_gen.gloss)), str(int(defect_gen.discoloration)),
-                               str(int(defect_gen.contamination)), str(int(defect_gen.cloudy)), str(int(defect_gen.splay))])
-
-        print("Image " + str(img_cntr + 1) + "/" + str(num_imgs) + " done.\n")
-        img_name += 1
-        img_cntr += 1
+            # Index
+            # Either create a new index or if it already exists, append new images
+            index_sink = sinks.openSink(index_format, output_path, append = not overwrite)
+            if archive_shard_size > 0:
+                image_archive = archive.TarShardWriter(output_path, archive_shard_size, append = not overwrite)
+            append_index = index_sink.count() > 0
+            img_name = index_sink.count() + 1
+
+            # The records of the images, either from the given manifest or planned here (and saved to the output directory)
+            if start_index is None:
+                start_index = img_name - 1
+            if manifest_path is not None:
+                records = plan.readManifest(manifest_path, start_index, num_imgs)
+            else:
+                run_seed = seed if seed is not None else random.getrandbits(32)
+                print("Run seed: " + str(run_seed) + ", start index: " + str(start_index) + "\n")
+                manifest_path = os.path.join(output_path, "manifest.jsonl")
+                records = plan.planImages(config, num_imgs, run_seed, start_index, batch_views)
+                plan.writeManifest(manifest_path, records, append = append_index)
+            names = list(range(img_name, img_name + len(records)))
+
+            # The checkpoint defines the run, so it can be resumed if it's interrupted
+            checkpoint = {"manifest_path": os.path.abspath(manifest_path), "start_index": start_index,
+                          "num_imgs": len(records), "first_name": img_name, "completed": 0}
+            resume.writeCheckpoint(output_path, checkpoint)
+
+        def saveProgress() -> None:
+            # The images and then the index entries are written to the disk before the checkpoint is updated
+            with profiler.span("index"):
+                if image_writer is not None:
+                    image_writer.wait()
+                checkpoint["completed"] += index_sink.buffered()
+                index_sink.sync()
+                if image_archive is not None:
+                    for index_entry in unarchived:
+                        image_archive.addFile(os.path.join(output_path, "imgs", index_entry["Filenames"]), index_entry)
+                    unarchived.clear()
+                resume.writeCheckpoint(output_path, checkpoint)
+
+        def addEntry(index_entry : dict) -> None:
+            # The entries are written in batches (see index_batch_size)
+            index_sink.write(index_entry)
+            if image_archive is not None:
+                unarchived.append(index_entry)
+            if index_sink.buffered() >= index_batch_size:
+                saveProgress()
+
+        if config["Performance"]["profile"] == "True":
+            profiler.start(os.path.join(output_path, "trace.jsonl"))
+
+        next_gc = gc_interval
+
+        def meshSize() -> dict:
+            mesh = hc.getObject().data
+            return {"vertices": len(mesh.vertices), "faces": len(mesh.polygons)}
+
+        for _, object_records in itertools.groupby(zip(records, names), key = lambda record_name: record_name[0]["object"]):
+            object_records = list(object_records)
+            defect_state = object_records[0][0]["defects"]
+
+            # Delete the haircomb (and its mesh) if it already exists
+            if hc is not None:
+                mesh = hc.getObject().data
+                bpy.data.objects.remove(hc.getObject())
+                if mesh.users == 0:
+                    bpy.data.meshes.remove(mesh)
+
+            # Create the haircomb with defects if needed
+            hc = haircomb.Haircomb(missing_teeth = defect_state["missing_teeth"],
+                                   bent_teeth = defect_state["bent_teeth"],
+                                   warping = defect_state["warping"],
+                                   ejector_marks = defect_state["ejector_marks"],
+                                   mesh_cache = mesh_cache,
+                                   batch_teeth = config["Performance"]["batch_teeth"] == "True",
+                                   backend = config["Object"]["backend"],
+                                   material = plastic_mat,
+                                   seed = object_records[0][0]["geometry_seed"])
+            with profiler.span("create_haircomb"):
+                hc.createHaircomb()
+            render.markDirty("geometry")
+
+            # Generate images of the haircomb
+            # In batch_views mode the images, HDRI and ground material can't be keyframed, these are planned per object.
+            # The views are keyframed onto the frames from 1, the light cache is baked again at the frames where the lighting changed.
+            batch_snapshots, batch_names, batch_entries, batch_bake_frames = [], [], [], []
+            for record, img_name in object_records:
+
+                with profiler.span("shaders"):
+                    # Set the plastic shader params of the haircomb.
+                    shaders.setPlasticParams(hc.getMaterial(), record["plastic"], tex_path, texture_manager)
+
+                    # Apply the ground material texture to the ground plane.
+                    ground_mat = ground.material_slots[0].material
+                    shaders.assignTextureMaterial(ground, ground_mats, record["ground"])
+                    if ground.material_slots[0].material != ground_mat:
+                        render.markDirty("ground")
+                    texture_manager.touchMaterial(ground.material_slots[0].material)
+
+
+                # Camera setup (so that the object is always in the frame).
+                with profiler.span("camera"):
+                    if not pool_objects:
+                        scene.removeCameras()
+
+                    coords = utils.extendBoundingBox(hc.getBoundingBox(), *[hc.width*extend for extend in record["camera"]["extend"]])
+                    camera = scene.setCamera(coords,
+                                             view_x = record["camera"]["view"][0],
+                                             view_y = record["camera"]["view"][1],
+                                             roll = record["camera"]["roll"],
+                                             pooled = pool_objects)
+
+                    # The crop is recorded in the index (in the pixels of the whole frame)
+                    crop = render.setBorder(scene.projectCoords(camera, coords) if crop_to_object else None)
+
+
+                # Lighting setup
+                with profiler.span("lights"):
+                    if config["Lights"]["use_hdris"] == "True":
+                        node_env.image = texture_manager.load(os.path.join(hdri_path, record["hdri"]["name"]))
+                        # The HDRI light strength is already adjusted based on the ground texture
+                        world.node_tree.nodes["Background"].inputs["Strength"].default_value = record["hdri"]["strength"]
+                        lighting = record["hdri"]
+                    else:
+                        if not pool_objects:
+                            scene.removeLights()
+                        scene.setLights(record["lights"]["locations"], record["lights"]["energies"], pooled = pool_objects)
+                        lighting = record["lights"]
+
+                    # The light cache is only baked again if the lighting changed (not if e.g. only the camera moved),
+                    # the lights which aren't pooled are new objects for every image
+                    lighting_changed = lighting != applied_lighting or (config["Lights"]["use_hdris"] != "True" and not pool_objects)
+                    if lighting_changed:
+                        render.markDirty("world" if config["Lights"]["use_hdris"] == "True" else "lights")
+                        applied_lighting = lighting
+
+
+                index_entry = plan.indexEntry(img_name, record)
+                if crop is not None:
+                    index_entry.update(sinks.flatten({"crop": crop}))
+
+                if batch_views:
+                    # Only record the view, it's rendered together with the other views of the object
+                    if lighting_changed and batch_snapshots:
+                        batch_bake_frames.append(len(batch_snapshots) + 1)
+                    batch_snapshots.append(render.snapshotProperties(batch_properties))
+                    batch_names.append(img_name)
+                    batch_entries.append(index_entry)
+                else:
+                    # Render and save the image
+                    img_path = os.path.join(output_path, "imgs", str(img_name) + ".png")
+                    render.render(img_path, image_writer)
+
+                    # Add the generated image to the index
+                    addEntry(index_entry)
+                    profiler.endRecord([img_name], **meshSize())
+
+                    print("Image " + str(img_cntr + 1) + "/" + str(len(records)) + " done.\n")
+                img_cntr += 1
+
+            if batch_views:
+                # Render every view of the object with one render call for each light cache (only one with Cycles)
+                render.keyframeSnapshots(batch_snapshots, range(1, len(batch_snapshots) + 1))
+                render.renderAnimation([os.path.join(output_path, "imgs", str(img_name) + ".png") for img_name in batch_names], batch_bake_frames)
+                render.clearKeyframes(set(id_data for id_data, _ in batch_properties))
+
+                for index_entry in batch_entries:
+                    addEntry(index_entry)
+                profiler.endRecord(batch_names, **meshSize())
+                print("Image " + str(img_cntr) + "/" + str(len(records)) + " done.\n")
+
+            # Remove the leftover datablocks of the previous objects periodically, so the memory usage doesn't grow during long runs
+            if gc_interval > 0 and img_cntr >= next_gc:
+                with profiler.span("gc"):
+                    removed = utils.purgeOrphans()
+                next_gc = img_cntr + gc_interval
+                resident = profiler.residentMemory()
+                print("Purged " + str(removed) + " orphan datablocks. Memory: " +
+                      ("{:.1f} MB".format(resident/1024**2) if resident is not None else "unknown") + ", datablocks: " +
+                      ", ".join(name + " " + str(count) for name, count in utils.datablockCounts().items()) + "\n")
+
+        saveProgress()
+    except BaseException:
+        # Nothing of the failed run is carried over to the next job of the worker (see serve):
+        # the entries of the images which might not be complete aren't written, and the scene is reset
+        if index_sink is not None:
+            index_sink.discard()
+        if image_writer is not None:
+            with contextlib.suppress(Exception):
+                image_writer.wait()
+        if batch_views:
+            render.clearKeyframes(set(id_data for id_data, _ in batch_properties))
+        removeHaircomb()
+        raise
+    finally:
+        if index_sink is not None:
+            index_sink.close()
+        if image_archive is not None:
+            image_archive.close()
+        if profiler.enabled:
+            profiler.stop()
+
+    print(texture_manager.stats() + "\n")
+    if not batch_views:
+        print(render.renderTimeReport() + "\n")
+    if mesh_cache is not None:
+        print("Mesh cache: " + str(mesh_cache.hits) + " hits, " + str(mesh_cache.misses) + " misses.\n")
+    if config["Performance"]["profile"] == "True":
+        print(profiler.summary() + "\n")
+
+
+def serve(spool_path : str, poll_interval : float = 1.0) -> None:
+    """Generates the jobs submitted to the spool directory until a stop job is received.
+
+    The jobs are JSON files in the pending subdirectory of the spool. A job is claimed by moving it into the
+    active subdirectory (so several workers can share a spool), and it is moved to the done or failed
+    subdirectory after it was processed.
+
+    Params:
+        spool_path: The spool directory.
+        poll_interval: The time to wait between checking for new jobs when the queue is empty (s).
+    """
+
+    for subdir in ("pending", "active", "done", "failed"):
+        os.makedirs(os.path.join(spool_path, subdir), exist_ok = True)
+
+    while True:
+        # Claim the oldest pending job
+        job_path = None
+        for pending_path in sorted(glob.glob(os.path.join(spool_path, "pending", "*.json"))):
+            active_path = os.path.join(spool_path, "active", os.path.basename(pending_path))
+            try:
+                os.rename(pending_path, active_path)
+            except OSError:
+                continue    # Claimed by another worker
+            job_path = active_path
+            break
+
+        if job_path is None:
+            time.sleep(poll_interval)
+            continue
+
+        with open(job_path, "r") as job_file:
+            job = json.load(job_file)
+
+        if job.get("stop", False):
+            os.replace(job_path, os.path.join(spool_path, "done", os.path.basename(job_path)))
+            break
+
+        try:
+            generateImages(output_path = job.get("output_path", config["Output"]["output_path"]),
+                           num_imgs = int(job.get("num_imgs", config["Output"]["num_imgs"])),
+                           overwrite = job.get("overwrite", args.overwrite),
+                           seed = job.get("seed", args.seed),
+                           start_index = job.get("start_index"),
+                           manifest_path = job.get("manifest_path"),
+                           resume_run = job.get("resume", False))
+        except Exception as e:
+            print("Job " + os.path.basename(job_path) + " failed: " + str(e) + "\n")
+            os.replace(job_path, os.path.join(spool_path, "failed", os.path.basename(job_path)))
+        else:
+            os.replace(job_path, os.path.join(spool_path, "done", os.path.basename(job_path)))
 
 
-index_file.close()
\ No newline at end of file
+if args.serve is not None:
+    serve(args.serve)
+else:
+    generateImages(args.output_path, args.num_imgs, args.overwrite, args.seed, args.start_index, args.manifest, args.resume)
\ No newline at end of file
@@ -0,0 +1,388 @@
+"""Blender 2.91
+
+Functions for building meshes directly from numpy arrays (without using bpy.ops),
+and for reading and modifying the data of existing meshes in bulk (foreach_get/foreach_set).
+Used by the numpy backend of the haircomb generator.
+
+A mesh part is a (vertices, faces) tuple, where vertices is an (n, 3) array and
+faces is a list of vertex index arrays (one for each polygon).
+"""
+
+import bpy
+
+import math
+from typing import List, Tuple
+
+import numpy as np
+
+
+#region MESH_PARTS
+
+def arc(center : Tuple[float, float],
+        radius_x : float,
+        radius_y : float,
+        start_angle : float,
+        end_angle : float,
+        segments : int = 10) -> np.ndarray:
+    """Returns the points of an elliptical arc (including both endpoints).
+
+    Params:
+        center: The center of the ellipse.
+        radius_x, radius_y: The semi-axes of the ellipse.
+        start_angle, end_angle: The angles of the endpoints (radians).
+        segments: The number of segments of the arc.
+    Returns:
+        An (segments + 1, 2) array of the points.
+    """
+
+    angles = np.linspace(start_angle, end_angle, segments + 1)
+
+    return np.column_stack((center[0] + radius_x*np.cos(angles), center[1] + radius_y*np.sin(angles)))
+
+
+def outlineNormals(outline : np.ndarray) -> np.ndarray:
+    """Returns the outward miter vectors of the points of a counter-clockwise outline.
+
+    Offsetting the points by d times these vectors offsets every edge of the outline by d.
+    """
+
+    edges = np.roll(outline, -1, axis = 0) - outline
+    edges /= np.maximum(np.linalg.norm(edges, axis = 1), 1E-9)[:, None]
+    edge_normals = np.column_stack((edges[:, 1], -edges[:, 0]))
+
+    # The normals of the edges before and after each point
+    prev_normals = np.roll(edge_normals, 1, axis = 0)
+    miters = prev_normals + edge_normals
+    miters /= np.maximum(np.linalg.norm(miters, axis = 1), 1E-9)[:, None]
+
+    # Scale so that the offset of the edges is 1 (limited at very sharp corners)
+    cos_half = np.maximum(np.einsum("ij,ij->i", miters, edge_normals), 0.25)
+
+    return miters/cos_half[:, None]
+
+
+def prism(outline : np.ndarray,
+          z_min : float,
+          z_max : float,
+          radius : float = 0.0,
+          segments : int = 5) -> tuple:
+    """Extrudes a 2D outline along the z axis, optionally with rounded top and bottom edges.
+
+    Params:
+        outline: The (n, 2) points of the outline in the xy plane (any orientation).
+        z_min, z_max: The extent of the prism along the z axis.
+        radius: The radius of the rounding of the top and bottom edges (0 for sharp edges).
+        segments: The number of segments of the rounding.
+    Returns:
+        The mesh part.
+    """
+
+    outline = np.asarray(outline, dtype = np.float64)
+    # Make the outline counter-clockwise (shoelace formula)
+    x, y = outline[:, 0], outline[:, 1]
+    if np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y) < 0.0:
+        outline = outline[::-1]
+
+    # The rings of the prism from the bottom to the top as (inset, z) pairs
+    if radius > 0.0:
+        angles = np.linspace(0.0, math.pi/2, segments + 1)
+        bottom = [(radius*(1.0 - math.sin(a)), z_min + radius*(1.0 - math.cos(a))) for a in angles]
+        top = [(inset, z_max - (z - z_min)) for inset, z in reversed(bottom)]
+        rings = bottom + top
+    else:
+        rings = [(0.0, z_min), (0.0, z_max)]
+
+    normals = outlineNormals(outline)
+    n = len(outline)
+    vertices = np.concatenate([np.column_stack((outline - inset*normals, np.full(n, z))) for inset, z in rings])
+
+    return vertices, ringFaces(len(rings), n)
+
+
+def ringFaces(num_rings : int, ring_size : int, close_ends : bool = True) -> List[np.ndarray]:
+    """Returns the faces connecting consecutive rings of vertices.
+
+    The rings are expected to be stored one after the other, each of them counter-clockwise
+    when looking at them from the end of the last ring.
+
+    Params:
+        num_rings: The number of rings.
+        ring_size: The number of vertices in each ring.
+        close_ends: Add an n-gon to both the first and the last ring if True.
+    """
+
+    idx = np.arange(ring_size)
+    quads = [np.column_stack((r*ring_size + idx,
+                              r*ring_size + (idx + 1) % ring_size,
+                              (r + 1)*ring_size + (idx + 1) % ring_size,
+                              (r + 1)*ring_size + idx)) for r in range(num_rings - 1)]
+
+    faces = list(np.concatenate(quads)) if quads else []
+    if close_ends:
+        faces.append(idx[::-1].copy())
+        faces.append((num_rings - 1)*ring_size + idx)
+
+    return faces
+
+
+def taperedRod(length : float,
+               root_axes : Tuple[float, float],
+               tip_axes : Tuple[float, float],
+               tip_radius : float = 0.0,
+               cut_at : float = None,
+               cut_offsets : np.ndarray = None,
+               vertices : int = 20,
+               segments : int = 5,
+               stations : int = 1) -> tuple:
+    """Creates a rod along the x axis with an elliptical cross section that changes linearly along its length.
+
+    Params:
+        length: The length of the rod (it starts at x = 0).
+        root_axes: The (y, z) semi-axes of the cross section at the root.
+        tip_axes: The (y, z) semi-axes of the cross section at the tip.
+        tip_radius: The radius of the rounding of the edge of the tip.
+        cut_at: Cut the rod off at this distance from the root (the tip is not rounded then).
+        cut_offsets: The x offsets of the (-y -z, -y +z, +y -z, +y +z) corners of the cutting plane,
+                     used to tilt the plane of the cut.
+        vertices: The number of vertices of the cross sections.
+        segments: The number of segments of the rounding of the tip.
+        stations: The number of segments along the straight part of the rod (more are needed for bending it).
+    Returns:
+        The mesh part.
+    """
+
+    root_axes, tip_axes = np.asarray(root_axes), np.asarray(tip_axes)
+
+    # The x positions of the rings and how much each of them is shrunk
+    if cut_at is not None:
+        xs = np.linspace(0.0, cut_at, stations + 1)
+        shrink = np.zeros(stations + 1)
+    else:
+        angles = np.linspace(0.0, math.pi/2, segments + 1)
+        xs = np.concatenate((np.linspace(0.0, length - tip_radius, stations + 1)[:-1], length - tip_radius + tip_radius*np.sin(angles)))
+        shrink = np.concatenate((np.zeros(stations), tip_radius*(1.0 - np.cos(angles))))
+
+    t = (xs/length)[:, None]
+    axes = (1.0 - t)*root_axes + t*tip_axes
+    axes = np.maximum(axes - shrink[:, None], 0.1*tip_axes)
+
+    angles = np.linspace(0.0, 2*math.pi, vertices, endpoint = False)
+    cos, sin = np.cos(angles), np.sin(angles)
+    rings = [np.column_stack((np.full(vertices, x), ay*cos, az*sin)) for x, (ay, az) in zip(xs, axes)]
+
+    # Tilt the cut by interpolating the offsets of the corners bilinearly
+    if cut_at is not None and cut_offsets is not None:
+        u, v = (cos + 1.0)/2, (sin + 1.0)/2
+        rings[-1][:, 0] += ((1 - u)*(1 - v)*cut_offsets[0] + (1 - u)*v*cut_offsets[1] +
+                            u*(1 - v)*cut_offsets[2] + u*v*cut_offsets[3])
+
+    return np.concatenate(rings), ringFaces(len(rings), vertices)
+
+
+def transform(part : tuple, matrix : np.ndarray) -> tuple:
+    """Returns the mesh part transformed by a 4x4 matrix."""
+
+    vertices, faces = part
+    vertices = vertices @ matrix[:3, :3].T + matrix[:3, 3]
+
+    # Mirroring transforms turn the faces inside out
+    if np.linalg.det(matrix[:3, :3]) < 0.0:
+        faces = [face[::-1].copy() for face in faces]
+
+    return vertices, faces
+
+
+def translation(offset : Tuple[float, float, float]) -> np.ndarray:
+    """Returns a 4x4 translation matrix."""
+
+    matrix = np.identity(4)
+    matrix[:3, 3] = offset
+
+    return matrix
+
+
+def rotation(angle : float, axis : str) -> np.ndarray:
+    """Returns a 4x4 matrix rotating around the given axis ("X", "Y", or "Z") by angle (radians)."""
+
+    i, j = {"X": (1, 2), "Y": (2, 0), "Z": (0, 1)}[axis]
+    matrix = np.identity(4)
+    matrix[i, i] = matrix[j, j] = math.cos(angle)
+    matrix[i, j], matrix[j, i] = -math.sin(angle), math.sin(angle)
+
+    return matrix
+
+
+def combine(parts : List[tuple]) -> tuple:
+    """Combines several mesh parts into one (without merging any of the vertices)."""
+
+    vertices, faces, offset = [], [], 0
+    for part_vertices, part_faces in parts:
+        vertices.append(part_vertices)
+        faces.extend(face + offset for face in part_faces)
+        offset += len(part_vertices)
+
+    return np.concatenate(vertices), faces
+
+#endregion MESH_PARTS
+
+
+#region DEFORM
+
+def bend(vertices : np.ndarray,
+         angle : float,
+         l_limit : float = 0.0,
+         u_limit : float = 1.0,
+         axis : str = "Z",
+         matrix : np.ndarray = None) -> np.ndarray:
+    """Bends the vertices the same way as Blender's simple deform modifier (in bend mode) does.
+
+    Params:
+        vertices: The (n, 3) array of vertex coordinates.
+        angle: The bending angle in radians.
+        l_limit: The part of the vertices to start the bending from (0.0-1.0)
+        u_limit: The part of the vertices to stop the bending at (0.0-1.0)
+        axis: Axis to bend around ("X", "Y", or "Z")
+        matrix: Transforms the vertices into the space of the bending origin (4x4).
+    Returns:
+        The bent vertex coordinates.
+    """
+
+    co = np.array(vertices, dtype = np.float64)
+    if matrix is not None:
+        co = co @ matrix[:3, :3].T + matrix[:3, 3]
+
+    # The bending is limited along the limit axis, and the vertices are bent in the plane of the limit and bend axes
+    deform_axis = "XYZ".index(axis)
+    limit_axis = 0 if deform_axis == 2 else 2
+    bend_axis = 3 - deform_axis - limit_axis
+
+    lo, hi = co[:, limit_axis].min(), co[:, limit_axis].max()
+    lower, upper = lo + (hi - lo)*l_limit, lo + (hi - lo)*u_limit
+    factor = angle/max(upper - lower, 1E-7)
+
+    if abs(factor) > 1E-7:
+        limited = np.clip(co[:, limit_axis], lower, upper)
+        dcut = co[:, limit_axis] - limited
+        sin, cos = np.sin(limited*factor), np.cos(limited*factor)
+
+        r = co[:, bend_axis] - 1.0/factor
+        co[:, limit_axis] = -r*sin + cos*dcut
+        co[:, bend_axis] = r*cos + 1.0/factor + sin*dcut
+
+    if matrix is not None:
+        inverse = np.linalg.inv(matrix)
+        co = co @ inverse[:3, :3].T + inverse[:3, 3]
+
+    return co
+
+#endregion DEFORM
+
+
+#region BLENDER_DATA
+
+def getVertexCoords(mesh : bpy.types.Mesh) -> np.ndarray:
+    """Returns the (n, 3) array of the vertex coordinates of the mesh."""
+
+    coords = np.empty(3*len(mesh.vertices), dtype = np.float32)
+    mesh.vertices.foreach_get("co", coords)
+
+    return coords.reshape(-1, 3)
+
+
+def setVertexCoords(mesh : bpy.types.Mesh, coords : np.ndarray) -> None:
+    """Sets the coordinates of every vertex of the mesh from an (n, 3) array."""
+
+    mesh.vertices.foreach_set("co", np.asarray(coords, dtype = np.float32).ravel())
+    mesh.update()
+
+
+def addVertexGroup(obj : bpy.types.Object, name : str, mask : np.ndarray) -> bpy.types.VertexGroup:
+    """Creates a vertex group containing the vertices selected by the mask (with a single add call).
+
+    Params:
+        obj: The object to add the vertex group to.
+        name: The name of the vertex group.
+        mask: Boolean array with an element for each vertex of the mesh of the object.
+    """
+
+    group = obj.vertex_groups.new(name = name)
+    group.add(index = np.flatnonzero(mask).tolist(), weight = 1, type = "REPLACE")
+
+    return group
+
+
+def setSmoothShading(mesh : bpy.types.Mesh, smooth : bool = True) -> None:
+    """Enables or disables smooth shading for every polygon of the mesh."""
+
+    mesh.polygons.foreach_set("use_smooth", np.full(len(mesh.polygons), smooth, dtype = bool))
+    mesh.update()
+
+
+def meshFromArrays(name : str,
+                   vertices : np.ndarray,
+                   loop_vertices : np.ndarray,
+                   loop_starts : np.ndarray,
+                   loop_totals : np.ndarray,
+                   use_smooth : np.ndarray = None) -> bpy.types.Mesh:
+    """Creates a mesh from the flat arrays of its vertices, loops, and polygons using foreach_set.
+
+    Params:
+        name: The name of the mesh.
+        vertices: The (n, 3) vertex coordinates.
+        loop_vertices: The vertex index of each loop.
+        loop_starts: The index of the first loop of each polygon.
+        loop_totals: The number of loops of each polygon.
+        use_smooth: The smooth shading flags of the polygons (flat shading if None).
+    """
+
+    mesh = bpy.data.meshes.new(name = name)
+
+    mesh.vertices.add(len(vertices))
+    mesh.vertices.foreach_set("co", np.asarray(vertices, dtype = np.float32).ravel())
+
+    mesh.loops.add(len(loop_vertices))
+    mesh.loops.foreach_set("vertex_index", np.asarray(loop_vertices, dtype = np.int32))
+
+    mesh.polygons.add(len(loop_starts))
+    mesh.polygons.foreach_set("loop_start", np.asarray(loop_starts, dtype = np.int32))
+    mesh.polygons.foreach_set("loop_total", np.asarray(loop_totals, dtype = np.int32))
+    if use_smooth is not None:
+        mesh.polygons.foreach_set("use_smooth", np.asarray(use_smooth, dtype = bool))
+
+    mesh.update(calc_edges = True)
+    mesh.validate()
+
+    return mesh
+
+
+def createObject(name : str, part : tuple) -> bpy.types.Object:
+    """Creates an object in the scene from a mesh part.
+
+    Params:
+        name: The name of the object and its mesh.
+        part: The mesh part.
+    """
+
+    vertices, faces = part
+    loop_totals = np.array([len(face) for face in faces], dtype = np.int32)
+    loop_starts = np.concatenate(([0], np.cumsum(loop_totals)[:-1])).astype(np.int32)
+
+    mesh = meshFromArrays(name, vertices, np.concatenate(faces), loop_starts, loop_totals)
+    obj = bpy.data.objects.new(name, mesh)
+    bpy.context.collection.objects.link(obj)
+
+    return obj
+
+
+def applyModifiers(obj : bpy.types.Object) -> None:
+    """Applies every modifier of the object with a single depsgraph evaluation (without bpy.ops)."""
+
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    mesh = bpy.data.meshes.new_from_object(obj.evaluated_get(depsgraph))
+
+    old_mesh = obj.data
+    obj.modifiers.clear()
+    obj.data = mesh
+    bpy.data.meshes.remove(old_mesh)
+
+#endregion BLENDER_DATA
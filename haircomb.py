@@ -3,10 +3,6 @@
 Haircomb class to create the object in blender.
 """
 
-#project_path = "S:\\source\\image-generator"
-#import sys
-#sys.path.append(project_path)
-
 import bpy, mathutils
 
 import math
@@ -16,16 +12,25 @@ from typing import List
 
 import numpy as np
 import operators as op
+import geometry as geo
 import utils
+import cache
+import profiler
+
+
+# The version of the code building the haircomb meshes. It's part of the cache key of the meshes (see getGeometryParams),
+# so it has to be bumped whenever a change of the build code changes the built meshes.
+geometry_version = 2
 
 
-def calcAngles(count : int, indexes, angle : float) -> dict:
+def calcAngles(count : int, indexes, angle : float, rng : random.Random) -> dict:
     """Calculates the angles for each of the bent teeth of the haircomb.
 
     Params:
         count: The number of bent teeth.
         indexes: The indexes of the bent teeth.
         angle: The max angle to bend the teeth by.
+        rng: The random number generator to use.
     Returns:
         Dict with indexes as keys and the bending angles as values (in radians).
     """
@@ -43,7 +48,7 @@ def calcAngles(count : int, indexes, angle : float) -> dict:
         
         # Randomize slightly.
         if not ((i == 0) or (i == (count - 1))):
-            angles[id_list[i]] += random.uniform(-1*math.pi/180, 1*math.pi/180)
+            angles[id_list[i]] += rng.uniform(-1*math.pi/180, 1*math.pi/180)
 
     return angles
 
@@ -61,7 +66,12 @@ class Haircomb:
                  missing_teeth : bool = False,
                  bent_teeth : bool = False,
                  warping : bool = False,
-                 ejector_marks : int = 0):
+                 ejector_marks : int = 0,
+                 seed : int = None,
+                 mesh_cache : cache.MeshCache = None,
+                 batch_teeth : bool = True,
+                 backend : str = "operators",
+                 material : bpy.types.Material = None):
         # Set parameters (mm)
         self.width = width                  # Overall width of haircomb.
         self.thickness = thickness          # Overall thickness of haircomb.
@@ -74,6 +84,18 @@ class Haircomb:
         self.bent_teeth = bent_teeth
         self.warping = warping
         self.ejector_marks = ejector_marks
+        # Seed of the random geometry defects (the same seed and parameters always give the same mesh)
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        # Cache of the generated meshes (optional)
+        self.mesh_cache = mesh_cache
+        # Merge all of the normal teeth with the base in one boolean operation instead of one by one
+        self.batch_teeth = batch_teeth
+        # How the mesh is built: "operators" (bpy.ops and modifiers) or "numpy" (directly from vertex arrays)
+        if backend not in ("operators", "numpy"):
+            raise ValueError("Invalid haircomb backend: " + str(backend))
+        self.backend = backend
+        # The material of the haircomb (a new one is created if it's not given, it can be shared between haircombs)
+        self.mat = material
         # Derived parameters
         self.__calcDerivedParams()
 
@@ -93,9 +115,62 @@ class Haircomb:
         self.middle_height = self.base_height/3             # Height of the middle part.
 
 
+    def getGeometryParams(self) -> dict:
+        """Returns every parameter the geometry of the haircomb depends on."""
+
+        params = {"width": self.width,
+                  "thickness": self.thickness,
+                  "base_height": self.base_height,
+                  "side_width": self.side_width,
+                  "tooth_height": self.tooth_height,
+                  "tooth_count": self.tooth_count,
+                  "missing_teeth": self.missing_teeth,
+                  "bent_teeth": self.bent_teeth,
+                  "warping": self.warping,
+                  "ejector_marks": self.ejector_marks,
+                  "batch_teeth": self.batch_teeth,
+                  "backend": self.backend,
+                  "version": geometry_version}
+
+        # The seed only matters if one of the random geometry defects is present
+        if self.missing_teeth or self.bent_teeth or self.warping:
+            params["seed"] = self.seed
+
+        return params
+
+
     def createHaircomb(self) -> None:
         self.__calcDerivedParams()
 
+        # Load the mesh from the cache if it was already generated, otherwise build it
+        self.base = None
+        if self.mesh_cache is not None:
+            key = cache.cacheKey(self.getGeometryParams())
+            with profiler.span("mesh_cache"):
+                self.base = self.mesh_cache.load(key, name = "Haircomb")
+
+        if self.base is None:
+            with profiler.span("build_mesh"):
+                if self.backend == "numpy":
+                    self.__buildHaircombNumpy()
+                else:
+                    self.__buildHaircomb()
+            if self.mesh_cache is not None:
+                with profiler.span("mesh_cache"):
+                    self.mesh_cache.store(key, self.base)
+
+        # Add material
+        if self.mat is None:
+            self.mat = bpy.data.materials.new(name = "HaircombMaterial")
+        self.base.data.materials.append(self.mat)
+
+
+    def __buildHaircomb(self) -> None:
+        """Builds the mesh of the haircomb from primitives."""
+
+        rng = random.Random(self.seed)
+        np_rng = np.random.RandomState(rng.getrandbits(32))
+
         #region BASE_PART
 
         # Create the base object
@@ -151,15 +226,11 @@ class Haircomb:
 
         #region EDGES
         # Round horizontal edges
-        top = self.base.vertex_groups.new(name = "top")
-        bottom = self.base.vertex_groups.new(name = "bottom")
-        for vert in self.base.data.vertices:
-            if (vert.co.z - self.__EPSILON <= -self.thickness/2):
-                bottom.add(index = [vert.index], weight = 1, type = "ADD")
-            elif (vert.co.z + self.__EPSILON >= self.thickness/2):
-                top.add(index = [vert.index], weight = 1, type = "ADD")
-            else:
-                continue
+        z = geo.getVertexCoords(self.base.data)[:, 2]
+        bottom = (z - self.__EPSILON <= -self.thickness/2)
+        top = ~bottom & (z + self.__EPSILON >= self.thickness/2)
+        geo.addVertexGroup(self.base, "top", top)
+        geo.addVertexGroup(self.base, "bottom", bottom)
 
         op.roundEdges(object = self.base, edges = "top", radius = self.general_radius, clamp_overlap = False)
         op.roundEdges(object = self.base, edges = "bottom", radius = self.general_radius, clamp_overlap = False)
@@ -180,10 +251,8 @@ class Haircomb:
         tooth = bpy.context.object
 
         # Round the edges on the tip of the teeth
-        verts = tooth.vertex_groups.new(name = "tip")
-        for vert in tooth.data.vertices:
-            if (vert.co.z + self.__EPSILON >= height_scaling_factor*self.tooth_height/2):
-                verts.add(index = [vert.index], weight = 1, type = "ADD")
+        z = geo.getVertexCoords(tooth.data)[:, 2]
+        geo.addVertexGroup(tooth, "tip", z + self.__EPSILON >= height_scaling_factor*self.tooth_height/2)
         op.roundEdges(object = tooth, edges = "tip", radius = self.general_radius)
 
         # Rotate and move the teeth into pos
@@ -198,16 +267,16 @@ class Haircomb:
         # Params for the bent teeth
         bent_idx = []
         if self.bent_teeth:
-            bent_num = random.randrange(1, 21)
-            bent_start = random.randrange(0, self.tooth_count - bent_num + 1)
+            bent_num = rng.randrange(1, 21)
+            bent_start = rng.randrange(0, self.tooth_count - bent_num + 1)
             bent_idx = range(bent_start, bent_start + bent_num)     # Indices of bent teeth
 
-            bend_dir = math.pi/180 * random.uniform(-20.0, 200.0)
+            bend_dir = math.pi/180 * rng.uniform(-20.0, 200.0)
 
-            origin_p = random.uniform(0.2, 0.6)
+            origin_p = rng.uniform(0.2, 0.6)
 
-            angle = random.uniform(6.0, 15.0)*math.pi/180
-            angles = calcAngles(count = bent_num, indexes = bent_idx, angle = angle)
+            angle = rng.uniform(6.0, 15.0)*math.pi/180
+            angles = calcAngles(count = bent_num, indexes = bent_idx, angle = angle, rng = rng)
 
             # Create origin for bending
             bpy.ops.object.empty_add(type = "PLAIN_AXES")
@@ -219,8 +288,8 @@ class Haircomb:
         # Params for the missing teeth
         missing_idx = []
         if self.missing_teeth:
-            missing_num = min(np.random.geometric(0.2), self.tooth_count)       # Number of missing teeth
-            missing_idx = random.sample(range(self.tooth_count), missing_num)   # indexes of missing teeth
+            missing_num = min(np_rng.geometric(0.2), self.tooth_count)       # Number of missing teeth
+            missing_idx = rng.sample(range(self.tooth_count), missing_num)   # indexes of missing teeth
 
             # Ceate cutter for missing teeth
             bpy.ops.mesh.primitive_cube_add(scale = (self.tooth_height, 1.5*self.tooth_width, 1.5*self.thickness))
@@ -232,6 +301,7 @@ class Haircomb:
         #endregion MISSING_TEETH
         
         # Add all of the teeth
+        normal_teeth_locations = []     # The normal teeth are merged together after the loop if batch_teeth is set
         for i in range(self.tooth_count):
             if (i in bent_idx) and not (i in missing_idx): # Bent teeth
                 bpy.context.view_layer.objects.active = tooth
@@ -240,16 +310,16 @@ class Haircomb:
                 bpy.ops.object.duplicate()
                 duplicate_tooth = bpy.context.object
 
-                origin_temp = utils.clamp(origin_p + random.uniform(-0.1, 0.1), 0.2, 0.6)
+                origin_temp = utils.clamp(origin_p + rng.uniform(-0.1, 0.1), 0.2, 0.6)
                 origin_x = (origin_temp - 0.5)*height_scaling_factor*self.tooth_height
                 l_limit = origin_temp
-                u_limit = origin_temp + 0.15 + random.uniform(0.0, 0.1)
+                u_limit = origin_temp + 0.15 + rng.uniform(0.0, 0.1)
 
                 axis.location = tooth.location + mathutils.Vector((origin_x, 0.0, 0.0))
-                axis.rotation_euler[0] = bend_dir + random.uniform(-10*math.pi/180, 10*math.pi/180)
+                axis.rotation_euler[0] = bend_dir + rng.uniform(-10*math.pi/180, 10*math.pi/180)
                 
                 op.remesh(object = duplicate_tooth, voxel_size = 0.25, adaptivity = 0.0)
-                op.bend(object = duplicate_tooth, origin = axis, angle = angles[i], l_limit = l_limit, u_limit = u_limit)
+                op.bendVertices(object = duplicate_tooth, origin = axis, angle = angles[i], l_limit = l_limit, u_limit = u_limit)
                 op.merge(self.base, duplicate_tooth, solver = "EXACT")
 
                 bpy.context.view_layer.objects.active = duplicate_tooth
@@ -263,10 +333,10 @@ class Haircomb:
                 duplicate_tooth = bpy.context.object
 
                 # Cut copied tooth
-                cutter.location[0] += random.uniform(0.0, self.tooth_height/5)
+                cutter.location[0] += rng.uniform(0.0, self.tooth_height/5)
                 vert_base_x = cutter.data.vertices[0].co.x
                 for v_i in range(4):
-                    cutter.data.vertices[v_i].co.x += random.uniform(-self.tooth_height/40, self.tooth_height/40)
+                    cutter.data.vertices[v_i].co.x += rng.uniform(-self.tooth_height/40, self.tooth_height/40)
 
                 op.cut(duplicate_tooth, cutter, solver = "FAST")
 
@@ -279,6 +349,9 @@ class Haircomb:
                 bpy.context.view_layer.objects.active = duplicate_tooth
                 bpy.ops.object.delete()
 
+            elif self.batch_teeth:   # Normal teeth
+                normal_teeth_locations.append(tooth.location.copy())
+
             else:   # Normal teeth
                 op.merge(self.base, tooth, solver = "FAST")
 
@@ -286,6 +359,23 @@ class Haircomb:
             tooth.location[1] += self.tooth_spacing + self.tooth_width
             if self.missing_teeth:
                 cutter.location[1] = tooth.location[1]
+
+        # Join the copies of the normal teeth into one object, so only 1 boolean is needed for them instead of 1 per tooth
+        if normal_teeth_locations:
+            teeth = []
+            for location in normal_teeth_locations:
+                tooth_copy = tooth.copy()
+                tooth_copy.data = tooth.data.copy()
+                tooth_copy.location = location
+                bpy.context.collection.objects.link(tooth_copy)
+                teeth.append(tooth_copy)
+
+            teeth = op.join(teeth)
+            op.merge(self.base, teeth, solver = "FAST")
+
+            teeth_mesh = teeth.data
+            bpy.data.objects.remove(teeth)
+            bpy.data.meshes.remove(teeth_mesh)
         
         bpy.data.objects.remove(tooth)
         if self.missing_teeth:
@@ -358,18 +448,184 @@ class Haircomb:
             bpy.ops.object.empty_add(type = "PLAIN_AXES", location = (0.0, 0.0, 0.0), rotation = (90*math.pi/180, 0.0, 0.0))
             axis = bpy.context.object
 
-            angle = random.uniform(6.0, 14.0)*math.pi/180
-            l_limit = random.uniform(0.0, 0.5)
-            u_limit = random.uniform(max(0.5, l_limit+0.5), 1.0)
+            angle = rng.uniform(6.0, 14.0)*math.pi/180
+            l_limit = rng.uniform(0.0, 0.5)
+            u_limit = rng.uniform(max(0.5, l_limit+0.5), 1.0)
 
-            op.bend(object = self.base, origin = axis, angle = angle, l_limit = l_limit, u_limit = u_limit, axis = "X")
+            op.bendVertices(object = self.base, origin = axis, angle = angle, l_limit = l_limit, u_limit = u_limit, axis = "X")
 
             bpy.data.objects.remove(axis)
         #endregion WARPING
 
-        # Add material
-        self.mat = bpy.data.materials.new(name = "HaircombMaterial")
-        self.base.data.materials.append(self.mat)
+
+    def __buildHaircombNumpy(self) -> None:
+        """Builds the mesh of the haircomb directly from numpy arrays, without bpy.ops or context switching.
+
+        Every part is created as a separate closed shell of a single mesh, and the voxel remesh (which is
+        also done by the operator backend) merges the overlapping shells into one surface, replacing the
+        boolean unions. The random defect parameters are drawn in the same order as in the operator backend.
+        """
+
+        rng = random.Random(self.seed)
+        np_rng = np.random.RandomState(rng.getrandbits(32))
+
+        parts = []
+        half_width = self.width/2
+        side_end = self.base_height + self.side_height
+
+        #region BASE_AND_SIDE_PARTS
+
+        # Outline of the base and the 2 side parts in the xy plane
+        # The side parts are scaled along x after the rounding in the operator backend, so their rounding is elliptical
+        scaling_factor = 2.5
+        outer_rx = min(scaling_factor*self.side_radius, self.side_height/2)
+        outer_ry = min(self.side_radius, self.side_width - 2*self.general_radius)
+        inner_rx, inner_ry = scaling_factor*self.general_radius, self.general_radius
+
+        outline = np.concatenate((
+            geo.arc((self.base_height, -half_width + self.base_radius), self.base_radius, self.base_radius, 3*math.pi/2, math.pi),
+            geo.arc((self.base_height, half_width - self.base_radius), self.base_radius, self.base_radius, math.pi, math.pi/2),
+            geo.arc((side_end - outer_rx, half_width - outer_ry), outer_rx, outer_ry, math.pi/2, 0.0),
+            geo.arc((side_end - inner_rx, half_width - self.side_width + inner_ry), inner_rx, inner_ry, 0.0, -math.pi/2),
+            [(self.base_height, half_width - self.side_width), (self.base_height, -half_width + self.side_width)],
+            geo.arc((side_end - inner_rx, -half_width + self.side_width - inner_ry), inner_rx, inner_ry, math.pi/2, 0.0),
+            geo.arc((side_end - outer_rx, -half_width + outer_ry), outer_rx, outer_ry, 0.0, -math.pi/2)))
+
+        parts.append(geo.prism(outline, 0.0, self.thickness, radius = self.general_radius))
+        #endregion BASE_AND_SIDE_PARTS
+
+
+        #region MIDDLE_PART
+
+        # Outline in the xz plane with the front rounded, extruded along the y axis
+        scaling_factor = 6.0
+        front_rx = min(scaling_factor*self.middle_thickness/2, self.middle_height/2)
+        middle_x = (self.base_height - self.middle_height/2, self.base_height + self.middle_height)
+        middle_z = (self.thickness/2 - self.middle_thickness/2, self.thickness/2 + self.middle_thickness/2)
+
+        outline = np.concatenate((
+            [(middle_x[0], middle_z[0])],
+            geo.arc((middle_x[1] - front_rx, self.thickness/2), front_rx, self.middle_thickness/2, -math.pi/2, math.pi/2),
+            [(middle_x[0], middle_z[1])]))
+
+        swap_yz = np.array([[1, 0, 0, 0], [0, 0, 1, 0], [0, 1, 0, 0], [0, 0, 0, 1]], dtype = np.float64)
+        parts.append(geo.transform(geo.prism(outline, -self.middle_width/2, self.middle_width/2), swap_yz))
+        #endregion MIDDLE_PART
+
+
+        #region TEETH
+
+        height_scaling_factor = 1.1     # > 1.0 so the tooth reaches into the base part
+        tooth_length = height_scaling_factor*self.tooth_height
+        root_x = self.base_height - (height_scaling_factor - 1)*self.tooth_height
+        # (y, z) semi-axes of the elliptical cross section of the teeth
+        root_axes = (self.thickness/3, self.thickness/2)
+        tip_axes = (0.1875*self.thickness, 0.28125*self.thickness)
+
+        def toothPos(i : int) -> tuple:
+            return (root_x,
+                    self.tooth_width/2 - half_width + self.side_width + self.tooth_spacing + i*(self.tooth_spacing + self.tooth_width),
+                    self.thickness/2)
+
+        # Params for the bent teeth
+        bent_idx = []
+        if self.bent_teeth:
+            bent_num = rng.randrange(1, 21)
+            bent_start = rng.randrange(0, self.tooth_count - bent_num + 1)
+            bent_idx = range(bent_start, bent_start + bent_num)
+
+            bend_dir = math.pi/180 * rng.uniform(-20.0, 200.0)
+            origin_p = rng.uniform(0.2, 0.6)
+
+            angle = rng.uniform(6.0, 15.0)*math.pi/180
+            angles = calcAngles(count = bent_num, indexes = bent_idx, angle = angle, rng = rng)
+
+        # Params for the missing teeth
+        missing_idx = []
+        if self.missing_teeth:
+            missing_num = min(np_rng.geometric(0.2), self.tooth_count)
+            missing_idx = rng.sample(range(self.tooth_count), missing_num)
+
+        normal_tooth = geo.taperedRod(tooth_length, root_axes, tip_axes, tip_radius = self.general_radius)
+
+        for i in range(self.tooth_count):
+            pos = geo.translation(toothPos(i))
+
+            if (i in bent_idx) and not (i in missing_idx): # Bent teeth
+                origin_temp = utils.clamp(origin_p + rng.uniform(-0.1, 0.1), 0.2, 0.6)
+                l_limit = origin_temp
+                u_limit = origin_temp + 0.15 + rng.uniform(0.0, 0.1)
+                axis_angle = bend_dir + rng.uniform(-10*math.pi/180, 10*math.pi/180)
+
+                tooth = geo.transform(geo.taperedRod(tooth_length, root_axes, tip_axes, tip_radius = self.general_radius, stations = 20), pos)
+                origin = geo.translation(np.array(toothPos(i)) + (origin_temp*tooth_length, 0.0, 0.0)) @ geo.rotation(axis_angle, "X")
+                vertices = geo.bend(tooth[0], angle = angles[i], l_limit = l_limit, u_limit = u_limit, matrix = np.linalg.inv(origin))
+                parts.append((vertices, tooth[1]))
+
+            elif (i in missing_idx): # Broken teeth
+                cut_x = self.base_height + self.middle_height + self.tooth_height/30 + rng.uniform(0.0, self.tooth_height/5)
+                cut_offsets = [rng.uniform(-self.tooth_height/40, self.tooth_height/40) for _ in range(4)]
+
+                tooth = geo.taperedRod(tooth_length, root_axes, tip_axes, cut_at = cut_x - root_x, cut_offsets = cut_offsets)
+                parts.append(geo.transform(tooth, pos))
+
+            else:   # Normal teeth
+                parts.append(geo.transform(normal_tooth, pos))
+        #endregion TEETH
+
+
+        self.base = geo.createObject("Haircomb", geo.combine(parts))
+
+        # Remesh (this also merges the parts)
+        mod = self.base.modifiers.new("remesh", type = "REMESH")
+        mod.mode = "VOXEL"
+        mod.voxel_size = 0.1
+        mod.adaptivity = 0.05
+        mod.use_smooth_shade = True
+
+        #region EJECTOR_MARKS
+
+        ejector = None
+        if (self.ejector_marks > 0):
+            ejector_radius = 0.3*self.base_height
+            ejector_depth = 0.2
+            ejector_pos_y = 0.37*self.width
+
+            if (self.ejector_marks == 3):
+                positions = [-ejector_pos_y, 0.0, ejector_pos_y]
+            elif (self.ejector_marks == 2):
+                positions = [-ejector_pos_y, ejector_pos_y]
+            else:
+                raise ValueError("Invalid num of ejector marks.")
+
+            # One cutter object containing all of the ejector pins
+            circle = geo.arc((0.0, 0.0), ejector_radius, ejector_radius, 0.0, 2*math.pi, segments = 32)[:-1]
+            pin = geo.prism(circle, self.thickness - ejector_depth, self.thickness + 4*ejector_depth)
+            ejector = geo.createObject("Ejector", geo.combine([geo.transform(pin, geo.translation((self.base_height/2, y, 0.0))) for y in positions]))
+
+            mod = self.base.modifiers.new("cut", type = "BOOLEAN")
+            mod.operation = "DIFFERENCE"
+            mod.solver = "FAST"
+            mod.object = ejector
+        #endregion EJECTOR_MARKS
+
+        geo.applyModifiers(self.base)
+
+        if ejector is not None:
+            ejector_mesh = ejector.data
+            bpy.data.objects.remove(ejector)
+            bpy.data.meshes.remove(ejector_mesh)
+
+        #region WARPING
+        if self.warping:
+            angle = rng.uniform(6.0, 14.0)*math.pi/180
+            l_limit = rng.uniform(0.0, 0.5)
+            u_limit = rng.uniform(max(0.5, l_limit+0.5), 1.0)
+
+            coords = geo.bend(geo.getVertexCoords(self.base.data), angle = angle, l_limit = l_limit, u_limit = u_limit, axis = "X",
+                              matrix = np.linalg.inv(geo.rotation(90*math.pi/180, "X")))
+            geo.setVertexCoords(self.base.data, coords)
+        #endregion WARPING
 
 
     def getObject(self) -> bpy.types.Object:
@@ -397,7 +653,7 @@ class Haircomb:
 
 
 # DEBUG (this never runs while generating the images)
-def main():
+def main(textures_path : str):
     
     bpy.ops.object.select_all(action = "SELECT")
     bpy.ops.object.delete()
@@ -406,29 +662,31 @@ def main():
     # CREATE GROUND OBJECT
     bpy.ops.mesh.primitive_plane_add(size = 20000)
     ground = bpy.context.object
-    ground_mat = bpy.data.materials.new(name = "ground")
-    ground.data.materials.append(ground_mat)
-    shaders.applyRandomTextures(ground_mat, "S:\\source\\image-generator\\textures")
+    ground_mats = shaders.buildTextureMaterials(textures_path)
+    ground.data.materials.append(None)
+    shaders.assignTextureMaterial(ground, ground_mats, random.choice(list(ground_mats)))
 
     # CREATE OBJECT
     hc = Haircomb(missing_teeth = True, bent_teeth = True, warping = True, ejector_marks = 2)
     hc.createHaircomb()
 
-    shaders.applyPlastic(mat = hc.getMaterial(),
-                         color = (0.0, 0.0, 0.0, 1.0),
-                         surface = "matte",
-                         randomize = True,
-                         textures_path = "S:\\source\\image-generator\\textures",
-                         tex_defect = "contamination",
-                         gloss_defect = True,
-                         discoloration = True)
+    # The plastic params are planned the same way as for the generated images (see plan.planPlastic)
+    plastic = plan.planPlastic(np.random.default_rng(),
+                               surface = "matte",
+                               randomize = True,
+                               tex_defect = np.array(["contamination"], dtype = object),
+                               cloudy_choice = np.array([False]),
+                               gloss_defect = np.array([True]),
+                               discoloration = np.array([True]))[0]
+    shaders.setPlasticParams(hc.getMaterial(), plastic, textures_path)
 
 
 if __name__ == "__main__":
     
-    project_path = "S:\\source\\image-generator"
-    import sys
+    # Run with: blender --python haircomb.py -- <project_path>
+    import sys, os
+    project_path = sys.argv[sys.argv.index("--") + 1]
     sys.path.append(project_path)
-    import shaders, utils
+    import shaders, utils, plan
 
-    main()
\ No newline at end of file
+    main(os.path.join(project_path, "textures"))
\ No newline at end of file
@@ -0,0 +1,142 @@
+"""Blender 2.91 required
+
+Offline geometry library of the haircombs.
+The geometry of a haircomb only depends on its geometry defects and seed, so the meshes can be built before the
+rendering, in parallel background Blender processes (see buildgeometry.py). The meshes are stored in a mesh cache
+(see cache.py) in the library directory, and the variants with their defect metadata are listed in library.jsonl.
+When the library is set in the config, the objects of the images are sampled from it (see plan.planImages),
+so the render stage only loads the prebuilt meshes.
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+import configparser
+import numpy as np
+
+import defects
+import plan
+
+
+# The defect states the geometry depends on.
+geometry_defects = ("missing_teeth", "bent_teeth", "warping", "ejector_marks")
+
+
+def libraryFilepath(library_path : str) -> str:
+    """Returns the path of the variant list of the library."""
+
+    return os.path.join(library_path, "library.jsonl")
+
+
+def readLibrary(library_path : str) -> list:
+    """Returns the variants of the library (the defect states and geometry seed of each of the built meshes)."""
+
+    filepath = libraryFilepath(library_path)
+    if not os.path.isfile(filepath):
+        raise ValueError("There is no geometry library in " + str(library_path))
+
+    with open(filepath, "r") as library_file:
+        return [json.loads(line) for line in library_file if line.strip()]
+
+
+def planVariants(config : configparser.ConfigParser, num_variants : int, seed : int, start_index : int = 0) -> list:
+    """Draws the defect states and geometry seeds of the variants (with the same distribution as the objects of the images).
+
+    Params:
+        config: The config of the generator.
+        num_variants: The number of variants to plan.
+        seed: The seed of the library.
+        start_index: The index of the first variant (the variants are appended to a library with this many variants).
+    Returns:
+        The variants (index, defects, geometry_seed).
+    """
+
+    # Each variant has its own random stream, so the variants don't depend on how the library was built up
+    np_rng = plan.StreamGenerator([plan.planRng(seed, "variant", idx) for idx in range(start_index, start_index + num_variants)])
+    object_defects = defects.Defects.fromConfig(config).sampleDefectCombinations(num_variants, np_rng)
+    geometry_seeds = np_rng.integers(0, 2**32, num_variants)
+
+    return [{"index": start_index + i,
+             "defects": {name: object_defects[name][i].item() for name in geometry_defects},
+             "geometry_seed": int(geometry_seeds[i])} for i in range(num_variants)]
+
+
+def sampleGeometry(library : list, object_defects : dict, geometry_seeds : np.ndarray, np_rng : np.random.Generator) -> np.ndarray:
+    """Returns the geometry seeds of the objects sampled from the library variants with the same geometry defects.
+
+    Params:
+        library: The variants of the library (see readLibrary).
+        object_defects: The defect states of the objects (see Defects.sampleDefectCombinations).
+        geometry_seeds: The planned geometry seeds of the objects, these are kept for the objects without a matching variant.
+        np_rng: The random number generator to sample the variants with (one value is drawn for each object).
+    """
+
+    variant_seeds = {}
+    for variant in library:
+        variant_seeds.setdefault(tuple(variant["defects"][name] for name in geometry_defects), []).append(variant["geometry_seed"])
+
+    seeds = np.array(geometry_seeds, dtype = np.int64)
+    choices = np_rng.random(len(seeds))
+    for obj_idx in range(len(seeds)):
+        matching = variant_seeds.get(tuple(object_defects[name][obj_idx].item() for name in geometry_defects))
+        if matching:
+            seeds[obj_idx] = matching[int(choices[obj_idx]*len(matching))]
+
+    return seeds
+
+
+def main():
+
+    project_path = os.path.abspath(os.path.dirname(__file__))
+
+    config = configparser.ConfigParser()
+    config.read(os.path.join(project_path, "config.ini"))
+
+    parser = argparse.ArgumentParser(description = "Build the geometry library of the haircombs in parallel Blender processes.")
+    parser.add_argument("library_path", nargs = "?", default = config["Performance"]["geometry_library"] or None,
+                        help = "The library directory (default: the geometry_library of the config).")
+    parser.add_argument("--num-variants", type = int, required = True, help = "The number of variants to add to the library.")
+    parser.add_argument("--workers", type = int, default = os.cpu_count() or 1, help = "The number of Blender processes building the meshes.")
+    parser.add_argument("--seed", type = int, default = None, help = "The seed of the library (default: a random one).")
+    args = parser.parse_args()
+
+    if args.library_path is None:
+        raise ValueError("No geometry library directory was given.")
+    if args.workers < 1:
+        raise ValueError("Invalid number of workers: " + str(args.workers))
+
+    library_path = os.path.abspath(args.library_path)
+    os.makedirs(library_path, exist_ok = True)
+    library = readLibrary(library_path) if os.path.isfile(libraryFilepath(library_path)) else []
+
+    seed = args.seed if args.seed is not None else int(np.random.SeedSequence().generate_state(1)[0])
+    variants = planVariants(config, args.num_variants, seed, start_index = len(library))
+
+    from main import blenderCommand     # (main imports plan, which imports this module)
+
+    # Each worker builds every workers-th variant (the meshes are stored in the mesh cache of the library)
+    threads = max(1, (os.cpu_count() or 1)//args.workers)
+    processes = []
+    with tempfile.TemporaryDirectory() as jobs_path:
+        for worker in range(min(args.workers, len(variants))):
+            job_path = os.path.join(jobs_path, str(worker) + ".json")
+            with open(job_path, "w") as job_file:
+                json.dump(variants[worker::args.workers], job_file)
+            processes.append(subprocess.Popen(blenderCommand(project_path, [library_path, job_path], threads, script = "buildgeometry.py")))
+
+        failed = [worker for worker, process in enumerate(processes) if process.wait() != 0]
+        if failed:
+            sys.exit("Workers failed: " + ", ".join(str(worker) for worker in failed))
+
+    # The variants are only added to the library once their meshes are built
+    with open(libraryFilepath(library_path), "a") as library_file:
+        library_file.writelines(json.dumps(variant) + "\n" for variant in variants)
+
+    print("Added " + str(len(variants)) + " variants to the library (" + str(len(library) + len(variants)) + " variants, seed " + str(seed) + ").")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,311 @@
 """Blender 2.91 required"""
 
 import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import subprocess
+import configparser
+
+import plan
+import sinks
+import resume
+import archive
+
+
+def blenderCommand(project_path : str, args : tuple = (), threads : int = 0, script : str = "generate.py") -> list:
+    """Returns the command that runs a script (the generate script by default) in a background Blender process.
+
+    Params:
+        project_path: The directory containing the scripts and the config file.
+        args: Extra arguments passed to the script.
+        threads: The number of threads Blender may use (0 for all of them).
+        script: The script to run (in the project directory).
+    """
+
+    script_path = os.path.join(project_path, script)
+
+    return (["blender", "--background", "--verbose", "0", "--log-level", "0", "--threads", str(threads),
+             "--python-exit-code", "1", "--python", script_path, "--", project_path] + list(args))
+
+
+def splitImages(num_imgs : int, imgs_per_object : int, workers : int) -> list:
+    """Splits the images between the workers so that the images of an object are never split up.
+
+    Returns:
+        The number of images each worker should generate (only non-empty shards are included).
+    """
+
+    num_objects = int(num_imgs/imgs_per_object)
+    shards = [num_objects//workers + int(i < num_objects % workers) for i in range(workers)]
+
+    return [n*imgs_per_object for n in shards if n > 0]
+
+
+def mergeShards(output_path : str, shard_paths : list, overwrite : bool, index_format : str = "csv", archive_shard_size : int = 0) -> None:
+    """Merges the images and indexes of the shards into the index of the output directory.
+
+    The images are renamed so that they continue the numbering of the merged index. The progress of the merge is
+    recorded in a merge checkpoint (merge.json) after each shard, so an interrupted merge can be continued by calling
+    this again: the merged shards are skipped, the entries of the interrupted shard are written again, and its images
+    which were already moved (or archived) under their new names aren't merged twice.
+    The checkpoint is marked complete at the end, it should be removed after the shards were deleted.
+
+    Params:
+        output_path: The output directory containing the merged index.
+        shard_paths: The output directories of the shards (in order).
+        overwrite: Overwrite the existing index in the output directory if True, otherwise append to it
+                   (ignored when an interrupted merge is continued).
+        index_format: The format of the indexes (see sinks.openSink).
+        archive_shard_size: The number of images in each tar shard if the images are archived (see archive.py), otherwise 0.
+    """
+
+    imgs_path = os.path.join(output_path, "imgs")
+    os.makedirs(imgs_path, exist_ok = True)
+
+    checkpoint = resume.readCheckpoint(output_path, "merge.json")
+    append = not overwrite or checkpoint is not None
+    index_sink = sinks.openSink(index_format, output_path, append = append)
+    image_archive = archive.TarShardWriter(output_path, archive_shard_size, append = append) if archive_shard_size > 0 else None
+    archived = archive.archivedNames(output_path) if image_archive is not None and checkpoint is not None else set()
+    if checkpoint is None:
+        checkpoint = {"first_name": index_sink.count() + 1, "merged_shards": 0, "complete": False}
+        resume.writeCheckpoint(output_path, checkpoint, "merge.json")
+
+    img_name = checkpoint["first_name"]
+    for shard_idx, shard_path in enumerate(shard_paths):
+        shard_entries = sinks.openSink(index_format, shard_path).read()
+        if shard_idx < checkpoint["merged_shards"]:
+            img_name += len(shard_entries)
+            continue
+
+        # The entries of the shard which was being merged when the merge was interrupted are removed, and written again
+        if index_sink.count() >= img_name:
+            index_sink.rewrite([entry for entry in index_sink.read() if int(os.path.splitext(entry["Filenames"])[0]) < img_name])
+
+        entries = {}
+        for entry in shard_entries:
+            filename = entry["Filenames"]
+            entry["Filenames"] = str(img_name) + ".png"
+            entries[filename] = entry
+            shard_img_path, img_path = os.path.join(shard_path, "imgs", filename), os.path.join(imgs_path, entry["Filenames"])
+            if image_archive is None and (os.path.isfile(shard_img_path) or not os.path.isfile(img_path)):
+                shutil.move(shard_img_path, img_path)
+            index_sink.write(entry)
+            img_name += 1
+
+        # The archived images are repacked into the merged archive with their new names
+        # (the last tar shard is finalized before the checkpoint, so every image of a merged shard is in a finalized tar shard)
+        if image_archive is not None:
+            for filename, data, _ in archive.readArchive(shard_path):
+                if entries[filename]["Filenames"] not in archived:
+                    image_archive.add(entries[filename]["Filenames"], data, entries[filename])
+            image_archive.finalize()
+
+        index_sink.sync()
+        checkpoint["merged_shards"] = shard_idx + 1
+        resume.writeCheckpoint(output_path, checkpoint, "merge.json")
+
+    index_sink.close()
+    if image_archive is not None:
+        image_archive.close()
+
+    checkpoint["complete"] = True
+    resume.writeCheckpoint(output_path, checkpoint, "merge.json")
+
+
+def removeShards(output_path : str) -> None:
+    """Removes the shards of the output directory after they were merged, and then the merge checkpoint."""
+
+    shutil.rmtree(os.path.join(output_path, "shards"), ignore_errors = True)
+    os.remove(os.path.join(output_path, "merge.json"))
+
+
+def submitJob(spool_path : str, job : dict) -> str:
+    """Submits a job to the spool directory of the persistent workers.
+
+    The job file is written to a temporary file first and then moved into the pending directory,
+    so the workers never see a partially written job.
+
+    Params:
+        spool_path: The spool directory the workers were started with.
+        job: The job to submit (output_path, num_imgs, overwrite, seed, start_index, manifest_path, or stop).
+    Returns:
+        The name of the submitted job file.
+    """
+
+    pending_path = os.path.join(spool_path, "pending")
+    os.makedirs(pending_path, exist_ok = True)
+
+    job_name = "{:.6f}-{}.json".format(time.time(), os.getpid())
+    tmp_path = os.path.join(spool_path, job_name + ".tmp")
+    with open(tmp_path, "w") as job_file:
+        json.dump(job, job_file)
+    os.replace(tmp_path, os.path.join(pending_path, job_name))
+
+    return job_name
+
+
+def waitForJob(spool_path : str, job_name : str, poll_interval : float = 1.0) -> bool:
+    """Waits until a submitted job is processed by one of the workers.
+
+    Returns:
+        True if the job was completed successfully, False if it failed.
+    """
+
+    while True:
+        if os.path.isfile(os.path.join(spool_path, "done", job_name)):
+            return True
+        if os.path.isfile(os.path.join(spool_path, "failed", job_name)):
+            return False
+        time.sleep(poll_interval)
 
 
 def main():
 
+    parser = argparse.ArgumentParser(description = "Generate the images based on the config settings.")
+    parser.add_argument("--workers", type = int, default = 1,
+                        help = "The number of Blender processes to render the images with (default: 1).")
+    # Persistent workers
+    parser.add_argument("--serve", action = "store_true",
+                        help = "Start persistent workers which generate the jobs submitted to the spool directory.")
+    parser.add_argument("--submit", action = "store_true",
+                        help = "Submit a job to the persistent workers (the output settings default to the config).")
+    parser.add_argument("--stop", action = "store_true",
+                        help = "Stop one of the persistent workers after the jobs submitted before are done.")
+    parser.add_argument("--spool", default = None,
+                        help = "The spool directory of the persistent workers (default: spool in the project directory).")
+    parser.add_argument("--resume", action = "store_true",
+                        help = "Resume the interrupted run (only the missing images are generated).")
+    parser.add_argument("--wait", action = "store_true", help = "Wait until the submitted job is done.")
+    parser.add_argument("--output-path", default = None, help = "Output directory of the submitted job.")
+    parser.add_argument("--num-imgs", type = int, default = None, help = "The number of images of the submitted job.")
+    parser.add_argument("--overwrite", action = "store_true", help = "Overwrite the index of the submitted job (default: the overwrite setting of the config).")
+    parser.add_argument("--seed", type = int, default = None, help = "The run seed of the submitted job.")
+    parser.add_argument("--start-index", type = int, default = None, help = "The index of the first image of the submitted job.")
+    parser.add_argument("--manifest", default = None, help = "The manifest of the submitted job (see plan.py).")
+    args = parser.parse_args()
+
+    if args.workers < 1:
+        raise ValueError("Invalid number of workers: " + str(args.workers))
+
     project_path = os.path.abspath(os.path.dirname(__file__))
-    generate_path = os.path.join(project_path, "generate.py")
+    spool_path = os.path.abspath(args.spool if args.spool is not None else os.path.join(project_path, "spool"))
+
+    if args.submit or args.stop:
+        if args.stop:
+            job = {"stop": True}
+        else:
+            job = {}
+            if args.overwrite:
+                job["overwrite"] = True
+            if args.output_path is not None:
+                job["output_path"] = os.path.abspath(args.output_path)
+            if args.num_imgs is not None:
+                job["num_imgs"] = args.num_imgs
+            if args.seed is not None:
+                job["seed"] = args.seed
+            if args.start_index is not None:
+                job["start_index"] = args.start_index
+            if args.manifest is not None:
+                job["manifest_path"] = os.path.abspath(args.manifest)
+
+        job_name = submitJob(spool_path, job)
+        print("Submitted job " + job_name)
+        if args.wait and not waitForJob(spool_path, job_name):
+            sys.exit("Job " + job_name + " failed.")
+        return
+
+    if args.serve:
+        # All of the workers share the same spool directory
+        threads = max(1, (os.cpu_count() or 1)//args.workers)
+        processes = [subprocess.Popen(blenderCommand(project_path, ["--serve", spool_path], threads)) for _ in range(args.workers)]
+        for process in processes:
+            process.wait()
+        return
+
+    if args.workers == 1:
+        subprocess.run(blenderCommand(project_path, ["--resume"] if args.resume else []))
+        return
+
+    config = configparser.ConfigParser()
+    config.read(os.path.join(project_path, "config.ini"))
+
+    output_path = config["Output"]["output_path"]
+    overwrite = config["Output"]["overwrite"] == "True"
+    index_format = config["Output"]["index_format"]
+    archive_shard_size = int(config["Output"]["archive_shard_size"])
+
+    if args.resume:
+        shards_path = os.path.join(output_path, "shards")
+        merge_checkpoint = resume.readCheckpoint(output_path, "merge.json")
+        if merge_checkpoint is not None and merge_checkpoint["complete"]:
+            # Only the shards weren't removed after the merge
+            removeShards(output_path)
+            return
+        if not os.path.isdir(shards_path):
+            raise ValueError("There is no sharded run to resume in " + str(output_path))
+
+        # Every shard of the interrupted run resumes from its own checkpoint
+        # (unless the shards were already being merged, then only the merge is continued)
+        shard_paths = [os.path.join(shards_path, name) for name in sorted(os.listdir(shards_path), key = int)]
+        if merge_checkpoint is None:
+            threads = max(1, (os.cpu_count() or 1)//len(shard_paths))
+            processes = [subprocess.Popen(blenderCommand(project_path, ["--output-path", shard_path, "--resume"], threads))
+                         for shard_path in shard_paths]
+            failed = [shard_idx for shard_idx, process in enumerate(processes) if process.wait() != 0]
+            if failed:
+                sys.exit("Shards failed: " + ", ".join(str(shard_idx) for shard_idx in failed))
+
+        mergeShards(output_path, shard_paths, overwrite = overwrite, index_format = index_format, archive_shard_size = archive_shard_size)
+        removeShards(output_path)
+        return
+
+    if resume.readCheckpoint(output_path, "merge.json") is not None:
+        raise ValueError("The merge of the previous run in " + str(output_path) + " was interrupted, continue it with --resume first.")
+
+    shard_sizes = splitImages(num_imgs = int(config["Output"]["num_imgs"]),
+                              imgs_per_object = int(config["Output"]["imgs_per_object"]),
+                              workers = args.workers)
+    if not shard_sizes:
+        return
+
+    # The images of the whole run are planned once, and each shard generates its slice of the manifest
+    # (the indexes of the images continue the merged index)
+    seed = int(config["Output"]["seed"]) if config["Output"]["seed"] else random.getrandbits(32)
+    start_index = 0 if overwrite else sinks.openSink(index_format, output_path).count()
+    append_index = start_index > 0
+    print("Run seed: " + str(seed))
+
+    os.makedirs(output_path, exist_ok = True)
+    manifest_path = os.path.join(output_path, "manifest.jsonl")
+    records = plan.planImages(config, sum(shard_sizes), seed, start_index,
+                              batch_views = config["Performance"]["batch_views"] == "True")
+    plan.writeManifest(manifest_path, records, append = append_index)
+
+    # Start a Blender process for each of the shards, all of them writing to their own directory
+    threads = max(1, (os.cpu_count() or 1)//len(shard_sizes))
+    shard_paths, processes = [], []
+    for shard_idx, shard_size in enumerate(shard_sizes):
+        shard_path = os.path.join(output_path, "shards", str(shard_idx))
+        shard_args = ["--output-path", shard_path, "--num-imgs", str(shard_size), "--overwrite",
+                      "--manifest", manifest_path, "--start-index", str(start_index)]
+        start_index += shard_size
+
+        shard_paths.append(shard_path)
+        processes.append(subprocess.Popen(blenderCommand(project_path, shard_args, threads)))
 
-    cmd = "blender --background --verbose 0 --log-level 0 --python " + generate_path + " -- " + project_path
+    failed = [shard_idx for shard_idx, process in enumerate(processes) if process.wait() != 0]
+    if failed:
+        # Keep the shards so the images which were generated aren't lost
+        sys.exit("Shards failed: " + ", ".join(str(shard_idx) for shard_idx in failed))
 
-    os.system(cmd)
+    mergeShards(output_path, shard_paths, overwrite = overwrite, index_format = index_format, archive_shard_size = archive_shard_size)
+    removeShards(output_path)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
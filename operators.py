@@ -6,6 +6,11 @@ Used for modeling the objects.
 
 import bpy
 import math
+from typing import List
+
+import numpy as np
+import geometry as geo
+import profiler
 
 
 def merge(target : bpy.types.Mesh,
@@ -25,7 +30,8 @@ def merge(target : bpy.types.Mesh,
     mod.object = object
 
     bpy.context.view_layer.objects.active = target
-    bpy.ops.object.modifier_apply(modifier = "merge")
+    with profiler.span("boolean"):
+        bpy.ops.object.modifier_apply(modifier = "merge")
 
 
 def cut(target : bpy.types.Mesh,
@@ -45,7 +51,8 @@ def cut(target : bpy.types.Mesh,
     mod.object = object
 
     bpy.context.view_layer.objects.active = target
-    bpy.ops.object.modifier_apply(modifier = "cut")
+    with profiler.span("boolean"):
+        bpy.ops.object.modifier_apply(modifier = "cut")
 
 
 def intersect(target : bpy.types.Mesh,
@@ -65,7 +72,27 @@ def intersect(target : bpy.types.Mesh,
     mod.object = object
 
     bpy.context.view_layer.objects.active = target
-    bpy.ops.object.modifier_apply(modifier = "and")
+    with profiler.span("boolean"):
+        bpy.ops.object.modifier_apply(modifier = "and")
+
+
+def join(objects : List[bpy.types.Object]) -> bpy.types.Object:
+    """Joins the objects into a single object.
+
+    Params:
+        objects: The objects to join. The first object of the list is kept, the others are removed.
+    Returns:
+        The object containing the joined meshes.
+    """
+
+    bpy.ops.object.select_all(action = "DESELECT")
+    for obj in objects:
+        obj.select_set(True)
+
+    bpy.context.view_layer.objects.active = objects[0]
+    bpy.ops.object.join()
+
+    return objects[0]
 
     
 def roundEdges(object : bpy.types.Mesh,
@@ -167,19 +194,13 @@ def recalcNormals(object : bpy.types.Mesh) -> None:
 def enableSmoothShading(object : bpy.types.Mesh) -> None:
     """Enables smooth shading for the object mesh."""
 
-    bpy.context.view_layer.objects.active = object
-    mesh = bpy.context.object.data
-    for f in mesh.polygons:
-        f.use_smooth = True
+    geo.setSmoothShading(object.data, True)
 
 
 def disableSmoothShading(object : bpy.types.Mesh) -> None:
     """Disables smooth shading for the object mesh."""
 
-    bpy.context.view_layer.objects.active = object
-    mesh = bpy.context.object.data
-    for f in mesh.polygons:
-        f.use_smooth = False
+    geo.setSmoothShading(object.data, False)
 
 
 def remesh(object : bpy.types.Mesh, voxel_size : float = 0.1, adaptivity : float = 0.05) -> None:
@@ -227,4 +248,29 @@ def bend(object : bpy.types.Mesh,
     mod.limits[1] = u_limit
 
     bpy.context.view_layer.objects.active = object
-    bpy.ops.object.modifier_apply(modifier = "bend")
\ No newline at end of file
+    bpy.ops.object.modifier_apply(modifier = "bend")
+
+
+def bendVertices(object : bpy.types.Mesh,
+                 origin : bpy.types.Mesh,
+                 angle : float,
+                 l_limit : float = 0.0,
+                 u_limit : float = 1.0,
+                 axis : str = "Z") -> None:
+    """Bend the object around a point, the same way as bend does, but with numpy instead of a modifier.
+
+    Params:
+        object: The target object to bend.
+        origin: The object to bend the target around.
+        angle:  The bending angle in radians.
+        l_limit: The part of the object to start the bending from (0.0-1.0)
+        u_limit: The part of the object to stop the bending at (0.0-1.0)
+        axis: Axis to bend around ("X", "Y", or "Z")
+    """
+
+    # The basis matrices are always up to date, unlike matrix_world (the objects don't have parents)
+    matrix = np.array(origin.matrix_basis.inverted() @ object.matrix_basis)
+
+    coords = geo.getVertexCoords(object.data)
+    coords = geo.bend(coords, angle = angle, l_limit = l_limit, u_limit = u_limit, axis = axis, matrix = matrix)
+    geo.setVertexCoords(object.data, coords)
\ No newline at end of file
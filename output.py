@@ -0,0 +1,123 @@
+"""Asynchronous writing of the rendered images (Blender is not required).
+
+The pixels of the rendered images are encoded to PNG and written to the disk by a pool of background threads,
+so the next image can be set up and rendered meanwhile. The number of images waiting to be written is bounded,
+which caps the memory used by the pixel buffers.
+"""
+
+import os
+import zlib
+import struct
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+
+def linearToSrgb(pixels : np.ndarray) -> np.ndarray:
+    """Converts linear color values (from 0 to 1) to sRGB encoded values (same as the Standard view transform)."""
+
+    pixels = np.clip(pixels, 0.0, 1.0)
+
+    return np.where(pixels <= 0.0031308, 12.92*pixels, 1.055*np.power(pixels, 1.0/2.4) - 0.055)
+
+
+def encodePng(pixels : np.ndarray, compression : int = 6) -> bytes:
+    """Encodes an 8 bit image as PNG.
+
+    Params:
+        pixels: The pixels of the image (height x width x channels, with 1 (grayscale), 3 (RGB) or 4 (RGBA) channels, top row first).
+        compression: The zlib compression level (0 - 9).
+    Returns:
+        The PNG file contents.
+    """
+
+    height, width, channels = pixels.shape
+    color_type = {1: 0, 3: 2, 4: 6}[channels]
+
+    def chunk(chunk_type : bytes, data : bytes) -> bytes:
+        return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+    # Every row starts with its filter type (0, no filtering)
+    rows = np.empty((height, width*channels + 1), dtype = np.uint8)
+    rows[:, 0] = 0
+    rows[:, 1:] = pixels.reshape(height, width*channels)
+
+    return (b"\x89PNG\r\n\x1a\n" +
+            chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)) +
+            chunk(b"IDAT", zlib.compress(rows.tobytes(), compression)) +
+            chunk(b"IEND", b""))
+
+
+class AsyncImageWriter:
+
+    def __init__(self, threads : int = 2, max_pending : int = 4, compression : int = 6):
+        """
+        Params:
+            threads: The number of threads encoding and writing the images.
+            max_pending: The maximum number of images waiting to be written (submit blocks above it).
+            compression: The zlib compression level of the PNG images (0 - 9).
+        """
+
+        if not 0 <= compression <= 9:
+            raise ValueError("Invalid PNG compression level: " + str(compression))
+
+        self.compression = compression
+        self.__executor = ThreadPoolExecutor(max_workers = threads)
+        self.__slots = threading.BoundedSemaphore(max_pending)
+        self.__futures = []
+
+
+    def __write(self, filepath : str, pixels : np.ndarray, color : bool) -> None:
+        """Converts the linear float pixels of the render (bottom row first) to an 8 bit PNG, and writes it atomically."""
+
+        try:
+            rgb = linearToSrgb(pixels[::-1, :, :3])
+            if not color:
+                rgb = np.dot(rgb, [0.2126, 0.7152, 0.0722])[:, :, np.newaxis]
+            data = encodePng(np.rint(rgb*255.0).astype(np.uint8), self.compression)
+
+            os.makedirs(os.path.dirname(filepath), exist_ok = True)
+            tmp_filepath = filepath + "." + str(os.getpid()) + ".tmp"
+            with open(tmp_filepath, "wb") as image_file:
+                image_file.write(data)
+            os.replace(tmp_filepath, filepath)
+        finally:
+            self.__slots.release()
+
+
+    def submit(self, filepath : str, pixels : np.ndarray, color : bool = True) -> None:
+        """Queues an image to be written, waiting for a free slot if too many images are pending.
+
+        Params:
+            filepath: The path to save the image to.
+            pixels: The linear float pixels of the image (height x width x 4, bottom row first, as read from Blender).
+                    The array must not be modified after it was submitted.
+            color: Save a color image if True, otherwise a grayscale one.
+        """
+
+        self.__slots.acquire()
+        self.__futures = [future for future in self.__futures if not future.done() or future.exception() is not None]
+        self.__futures.append(self.__executor.submit(self.__write, filepath, pixels, color))
+
+
+    def pending(self) -> int:
+        """Returns the number of images which weren't written yet."""
+
+        return sum(1 for future in self.__futures if not future.done())
+
+
+    def wait(self) -> None:
+        """Waits until every submitted image is written (raises the error of the first failed write)."""
+
+        futures, self.__futures = self.__futures, []
+        for future in futures:
+            future.result()
+
+
+    def close(self) -> None:
+        """Waits for the submitted images and stops the threads."""
+
+        try:
+            self.wait()
+        finally:
+            self.__executor.shutdown()
@@ -0,0 +1,426 @@
+"""Planning of the generated images (Blender is not required).
+
+Every random decision about the images (defects, haircomb geometry seed, plastic shader parameters,
+ground texture, camera, lights and HDRI) is drawn here for the whole dataset at once, and written to a
+manifest with one JSON record per image. The generate script only executes these records.
+Each object and image has its own random stream derived from the run seed and its index (see planRng).
+"""
+
+import os
+import json
+import math
+import argparse
+import configparser
+import numpy as np
+
+import presets
+import defects
+import sinks
+import library
+
+
+# The kinds of the random streams of the objects and images, and the variants of the geometry library (see planRng).
+random_streams = ("object", "image", "library", "variant")
+
+
+def planRng(seed : int, stream : str, index : int) -> np.random.Generator:
+    """Returns the random number generator of an object, image, or library variant.
+
+    Params:
+        seed: The seed of the run (or the library).
+        stream: The kind of the stream (one of random_streams).
+        index: The index of the object, image, or variant.
+    """
+
+    return np.random.default_rng([seed, random_streams.index(stream), index])
+
+
+class StreamGenerator:
+    """Vectorized random number generator with an independent random stream for each row (object or image).
+
+    Every draw takes the next numbers of the stream of each row, and returns them with the rows along the first axis.
+    The values of a row only depend on its own stream, not on the other rows drawn together with it.
+    Only the methods of np.random.Generator used for the planning are provided.
+    """
+
+    def __init__(self, rngs : list, block_size : int = 64):
+        """
+        Params:
+            rngs: The random number generators of the rows (see planRng).
+            block_size: The number of values drawn from each of the generators at once.
+        """
+
+        self.__rngs = rngs
+        self.__block_size = block_size
+        self.__uniforms = np.empty((len(rngs), 0))
+
+
+    def __take(self, size) -> np.ndarray:
+        """Returns the next uniform numbers of the streams (the first dimension of the size is the number of rows)."""
+
+        size = (len(self.__rngs),) if size is None else tuple(np.atleast_1d(size))
+        if size[0] != len(self.__rngs):
+            raise ValueError("Invalid size of the random values: " + str(size))
+
+        count = int(np.prod(size[1:]))
+        while self.__uniforms.shape[1] < count:
+            block = np.array([rng.random(self.__block_size) for rng in self.__rngs]).reshape(len(self.__rngs), self.__block_size)
+            self.__uniforms = np.concatenate([self.__uniforms, block], axis = 1)
+
+        values, self.__uniforms = self.__uniforms[:, :count], self.__uniforms[:, count:]
+
+        return values.reshape(size)
+
+
+    def random(self, size = None) -> np.ndarray:
+        return self.__take(size)
+
+
+    def uniform(self, low = 0.0, high = 1.0, size = None) -> np.ndarray:
+        if size is None:
+            size = np.broadcast(np.asarray(low), np.asarray(high)).shape or None
+        return low + (high - low)*self.__take(size)
+
+
+    def integers(self, low : int, high : int = None, size = None) -> np.ndarray:
+        if high is None:
+            low, high = 0, low
+        return low + np.floor(self.__take(size)*(high - low)).astype(np.int64)
+
+
+    def exponential(self, scale : float = 1.0, size = None) -> np.ndarray:
+        return -scale*np.log1p(-self.__take(size))
+
+
+    def poisson(self, lam : float = 1.0, size = None) -> np.ndarray:
+        # Inverse transform sampling (the number of cumulative probabilities not above the uniform values)
+        pmf, k = math.exp(-lam), 0
+        cdf = [pmf]
+        while cdf[-1] < 1.0 - 1E-12:
+            k += 1
+            pmf *= lam/k
+            cdf.append(cdf[-1] + pmf)
+        return np.searchsorted(np.array(cdf), self.__take(size), side = "right")
+
+
+def indexEntry(img_name : int, record : dict) -> dict:
+    """Returns the entry of the image in the index: its filename, labels, and the parameters of its record.
+
+    Params:
+        img_name: The name of the image (without the extension).
+        record: The record of the image.
+    """
+
+    labels = record["defects"]
+    entry = {"Filenames": str(img_name) + ".png",
+             "missing_teeth": int(labels["missing_teeth"]),
+             "bent_teeth": int(labels["bent_teeth"]),
+             "warped": int(labels["warping"]),
+             "ejector_marks": int(labels["ejector_marks"] != 0),
+             "low_gloss": int(labels["gloss"]),
+             "discoloration": int(labels["discoloration"]),
+             "contamination": int(labels["contamination"]),
+             "cloudy": int(labels["cloudy"]),
+             "splay": int(labels["splay"])}
+    entry.update(sinks.flatten(record))
+
+    return entry
+
+
+def planPlastic(np_rng : np.random.Generator,
+                surface : str,
+                randomize : bool,
+                tex_defect : np.ndarray,
+                cloudy_choice : np.ndarray,
+                gloss_defect : np.ndarray,
+                discoloration : np.ndarray) -> list:
+    """Draws the plastic shader parameters of the images (the values of the nodes built by shaders.buildPlastic).
+
+    Params:
+        np_rng: The random number generator to use (with one stream for each image, see StreamGenerator).
+        surface: The type of the plastics surface (must be one of "rough", "matte", or "shiny").
+        randomize: Slightly randomize the shader params if True.
+        tex_defect: The texture defect of each image (one of "contamination", "splay", "cloudy", or None).
+        cloudy_choice: Use the first cloudy texture if True, the second one otherwise (for each image).
+        gloss_defect: The gloss defect of each image.
+        discoloration: The discoloration defect of each image.
+    Returns:
+        The plastic parameters of each image (see shaders.setPlasticParams).
+    """
+
+    num = len(tex_defect)
+    r = float(randomize)
+
+    def uniform(low : float, high : float) -> np.ndarray:
+        return np_rng.uniform(low, high, num)
+
+    def const(value : float) -> np.ndarray:
+        return np.full(num, value)
+
+    # Noise texture, bump and principled shader params
+    if surface == "matte":
+        noise = {"Scale": const(2000.0), "Roughness": const(0.0), "Distortion": const(0.0)}
+        bump = {"Strength": 0.1 + r*uniform(0.0, 0.05), "Distance": 0.1 + r*uniform(0.0, 0.05)}
+        principled = {"Specular": 0.05 + r*uniform(0.0, 0.08), "Roughness": 0.5 + r*uniform(0.0, 0.15), "Anisotropic": const(0.2),
+                      "Clearcoat": 0.1 + r*uniform(0.0, 0.15), "Clearcoat Roughness": 0.05 + r*uniform(0.0, 0.05)}
+    elif surface == "rough":
+        noise = {"Scale": const(350.0), "Roughness": const(1.0), "Distortion": const(0.4)}
+        bump = {"Strength": 1.5 + r*uniform(0.0, 1.0), "Distance": 0.2 + r*uniform(0.0, 0.1)}
+        roughness = 0.5 + r*uniform(0.0, 0.2)
+        principled = {"Specular": const(0.1), "Roughness": roughness, "Anisotropic": const(0.0),
+                      "Clearcoat": 0.05 + r*uniform(0.0, 0.1), "Clearcoat Roughness": roughness + 0.05}
+    elif surface == "shiny":
+        noise = {"Scale": const(1000.0), "Roughness": const(0.0), "Distortion": const(0.0)}
+        bump = {"Strength": 0.05 + r*uniform(0.0, 0.05), "Distance": 0.1 + r*uniform(0.0, 0.05)}
+        roughness = 0.2 + r*uniform(0.0, 0.1)
+        principled = {"Specular": 0.05 + r*uniform(0.0, 0.1), "Roughness": roughness, "Anisotropic": const(0.2),
+                      "Clearcoat": 0.4 + r*uniform(0.0, 0.3), "Clearcoat Roughness": roughness - 0.05}
+    else:
+        raise ValueError("Invalid surface type: " + str(surface))
+    principled["Emission Strength"] = const(0.0)
+
+    # Gloss defect
+    clearcoat_roughness = 0.5 + r*uniform(0.0, 0.25)
+    gloss = {"Specular": 0.025 + r*uniform(0.0, 0.05), "Anisotropic": const(0.0), "Clearcoat": 0.05 + r*uniform(0.0, 0.1),
+             "Clearcoat Roughness": clearcoat_roughness, "Roughness": clearcoat_roughness + 0.05}
+    gloss_noise = {"Scale": 185.0 + r*uniform(0.0, 75.0), "Roughness": const(1.0), "Distortion": const(0.5)}
+    gloss_bump = {"Strength": 1.5 + r*uniform(0.0, 1.0), "Distance": 0.25 + r*uniform(0.0, 0.15)}
+    for params, gloss_params in ((principled, gloss), (noise, gloss_noise), (bump, gloss_bump)):
+        for name, values in gloss_params.items():
+            params[name] = np.where(gloss_defect, values, params[name])
+
+    # Texture defects (the mapping of the texture, drawn for every texture defect and selected per image)
+    contamination = {"Scale": np.stack([0.01 + r*uniform(0.0, 0.005) for _ in range(3)], axis = 1),
+                     "Location": np.stack([r*uniform(-2.0, 2.0), r*uniform(-2.0, 2.0), const(0.0)], axis = 1),
+                     "Rotation": np.stack([const(0.0), const(0.0), r*uniform(0.0, 2*math.pi)], axis = 1)}
+    splay = {"Scale": np.stack([0.04 + r*uniform(0.0, 0.003), 0.08 + r*uniform(0.0, 0.004), const(1.0)], axis = 1),
+             "Location": np.stack([r*uniform(-1.0, 1.0), r*uniform(-1.0, 1.0), const(0.0)], axis = 1),
+             "Rotation": np.stack([const(0.0), const(0.0), const(math.pi/2)], axis = 1)}
+    cloudy_scale = np.where(cloudy_choice[:, np.newaxis],
+                            np.stack([0.03 + r*uniform(0.0, 0.02) for _ in range(3)], axis = 1),
+                            np.stack([0.008 + r*uniform(0.0, 0.017) for _ in range(3)], axis = 1))
+    cloudy = {"Scale": cloudy_scale,
+              "Location": np.stack([r*uniform(0.0, 1.0), r*uniform(0.0, 1.0), const(0.0)], axis = 1),
+              "Rotation": np.stack([const(0.0), const(0.0), r*uniform(0.0, 2*math.pi)], axis = 1)}
+    no_defect = {"Scale": np.ones((num, 3)), "Location": np.zeros((num, 3)), "Rotation": np.zeros((num, 3))}
+
+    mapping = {}
+    for name in ("Scale", "Location", "Rotation"):
+        mapping[name] = np.select([(tex_defect == "contamination")[:, np.newaxis],
+                                   (tex_defect == "splay")[:, np.newaxis],
+                                   (tex_defect == "cloudy")[:, np.newaxis]],
+                                  [contamination[name], splay[name], cloudy[name]], no_defect[name])
+
+    images = np.full(num, None, dtype = object)
+    images[tex_defect == "contamination"] = "Contamination.png"
+    images[tex_defect == "splay"] = "Splay.png"
+    images[(tex_defect == "cloudy") & cloudy_choice] = "cloudy1.png"
+    images[(tex_defect == "cloudy") & ~cloudy_choice] = "cloudy2.png"
+
+    # Discoloration defect (the base color and the brightness of the texture)
+    color = np.where(discoloration, 0.2 + np_rng.exponential(1/250.0, num) % (0.8 - 0.2), 0.0)
+    tex_color = np.where(discoloration & (tex_defect != None), 0.03 + np_rng.exponential(1/250.0, num) % (0.5 - 0.03), 0.0)
+
+    plastic = []
+    for i in range(num):
+        nodes = {"Noise": {name: float(values[i]) for name, values in noise.items()},
+                 "Bump": {name: float(values[i]) for name, values in bump.items()},
+                 "Principled": {name: float(values[i]) for name, values in principled.items()},
+                 "DefectMapping": {name: values[i].tolist() for name, values in mapping.items()},
+                 "DefectAdd": {"1": float(tex_color[i])},
+                 "DefectMix": {"Fac": 0.0 if tex_defect[i] is None else 1.0,
+                               "Color1": [float(color[i]), float(color[i]), float(color[i]), 1.0]}}
+        plastic.append({"nodes": nodes, "image": images[i]})
+
+    return plastic
+
+
+def planImages(config : configparser.ConfigParser,
+               num_imgs : int,
+               seed : int,
+               start_index : int = 0,
+               batch_views : bool = False,
+               defect_states : dict = None) -> list:
+    """Draws the parameters of the images for the whole dataset.
+
+    Every object and image is drawn from its own random stream (see planRng), so the record of an image only depends
+    on the config, the seed and its index: any slice of the run can be planned again on its own with the same records.
+
+    Params:
+        config: The config of the generator.
+        num_imgs: The number of images to plan.
+        seed: The seed of the run.
+        start_index: The index of the first image in the run.
+        batch_views: Use the same HDRI and ground texture for every image of an object (see generate.batch_views).
+        defect_states: Use these defect states for every object instead of random ones (e.g. for the benchmarks).
+                       The keys are the names of the defect states (see Defects.sampleDefectCombinations),
+                       the missing defects are not present.
+    Returns:
+        The records of the images (in order).
+    """
+
+    imgs_per_object = int(config["Output"]["imgs_per_object"])
+    use_hdris = config["Lights"]["use_hdris"] == "True"
+
+    indexes = np.arange(start_index, start_index + num_imgs)
+    objects = indexes//imgs_per_object
+    obj_idx = objects - objects[0] if num_imgs > 0 else objects
+    num_objects = int(obj_idx[-1]) + 1 if num_imgs > 0 else 0
+    object_indexes = np.arange(num_objects) + (objects[0] if num_imgs > 0 else 0)
+
+    # The params of the objects and of the images are drawn from their own streams
+    object_rng = StreamGenerator([planRng(seed, "object", obj) for obj in object_indexes])
+    image_rng = StreamGenerator([planRng(seed, "image", idx) for idx in indexes])
+
+    # Object params (defects and geometry)
+    defect_gen = defects.Defects.fromConfig(config)
+    object_defects = defect_gen.sampleDefectCombinations(num_objects, object_rng)
+    if defect_states is not None:
+        tex_defect = defect_states.get("tex_defect")
+        for name, values in object_defects.items():
+            if name == "tex_defect":
+                state = tex_defect
+            elif name in ("contamination", "cloudy", "splay"):
+                state = tex_defect == name
+            else:
+                state = defect_states.get(name, 0)
+            object_defects[name] = np.full(num_objects, state, dtype = values.dtype)
+    geometry_seeds = object_rng.integers(0, 2**32, num_objects)
+    cloudy_choice = object_rng.random(num_objects) > 0.5
+    if config["Performance"]["geometry_library"]:
+        # The geometry of the objects is sampled from the prebuilt library (with separate streams, so the other params don't change)
+        geometry_seeds = library.sampleGeometry(library.readLibrary(config["Performance"]["geometry_library"]), object_defects, geometry_seeds,
+                                                StreamGenerator([planRng(seed, "library", obj) for obj in object_indexes]))
+
+    img_defects = {name: values[obj_idx] for name, values in object_defects.items()}
+
+    # Plastic shader params
+    plastic = planPlastic(image_rng,
+                          surface = config["Object"]["surface"],
+                          randomize = config["Object"]["randomize"] == "True",
+                          tex_defect = img_defects["tex_defect"],
+                          cloudy_choice = cloudy_choice[obj_idx],
+                          gloss_defect = img_defects["gloss"],
+                          discoloration = img_defects["discoloration"])
+
+    # Environment (the ground texture and HDRI only change between the objects in batch_views mode)
+    env_rng = object_rng if batch_views else image_rng
+    env_idx = obj_idx if batch_views else np.arange(num_imgs)
+    num_env = num_objects if batch_views else num_imgs
+    ground = env_rng.integers(0, len(presets.textures), num_env)[env_idx]
+
+    # Camera
+    max_x = math.tan(float(config["Camera"]["max_view_angle_x"])*math.pi/180)
+    max_y = math.tan(float(config["Camera"]["max_view_angle_y"])*math.pi/180)
+    max_roll = float(config["Camera"]["max_roll_angle"])*math.pi/180
+    extend = np.stack([image_rng.uniform(0.0, float(config["Camera"]["extend_x"]), num_imgs),
+                       image_rng.uniform(0.0, float(config["Camera"]["extend_x"]), num_imgs),
+                       image_rng.uniform(0.0, float(config["Camera"]["extend_y"]), num_imgs),
+                       image_rng.uniform(0.0, float(config["Camera"]["extend_y"]), num_imgs)], axis = 1)
+    view = np.stack([image_rng.uniform(-max_x, max_x, num_imgs), image_rng.uniform(-max_y, max_y, num_imgs)], axis = 1)
+    roll = image_rng.uniform(-max_roll, max_roll, num_imgs)
+
+    # Lighting
+    if use_hdris:
+        hdri = env_rng.integers(0, len(presets.hdris), num_env)[env_idx]
+        light_min = np.array([h["light_min"] for h in presets.hdris])[hdri]
+        light_max = np.array([h["light_max"] for h in presets.hdris])[hdri]
+        light_correction = np.array([t["light_correction"] for t in presets.textures])[ground]
+        strength = image_rng.uniform(light_min, light_max) + light_correction
+    else:
+        num_lights = int(config["Lights"]["num_lights"])
+        angle = image_rng.uniform(0.0, 2.0*math.pi, (num_imgs, num_lights))
+        hdistance = image_rng.uniform(float(config["Lights"]["distance_min"]), float(config["Lights"]["distance_max"]), (num_imgs, num_lights))
+        height = image_rng.uniform(float(config["Lights"]["height_min"]), float(config["Lights"]["height_max"]), (num_imgs, num_lights))
+        locations = np.stack([hdistance*np.cos(angle), hdistance*np.sin(angle), height], axis = 2)
+        energies = image_rng.uniform(float(config["Lights"]["strength_min"]), float(config["Lights"]["strength_max"]), (num_imgs, num_lights))*1E6
+
+    records = []
+    for i in range(num_imgs):
+        record = {"index": int(indexes[i]),
+                  "object": int(objects[i]),
+                  "seed": seed,
+                  "geometry_seed": int(geometry_seeds[obj_idx[i]]),
+                  "defects": {name: (values[i] if name == "tex_defect" else values[i].item()) for name, values in img_defects.items()},
+                  "plastic": plastic[i],
+                  "ground": presets.textures[ground[i]]["name"],
+                  "camera": {"extend": extend[i].tolist(), "view": view[i].tolist(), "roll": float(roll[i])}}
+        if use_hdris:
+            record["hdri"] = {"name": presets.hdris[hdri[i]]["name"], "strength": float(strength[i])}
+        else:
+            record["lights"] = {"locations": locations[i].tolist(), "energies": energies[i].tolist()}
+        records.append(record)
+
+    return records
+
+
+def writeManifest(filepath : str, records : list, append : bool = False) -> None:
+    """Writes the records to a manifest file (JSON lines).
+
+    A new manifest is written to a temporary file first, so an interrupted write never leaves a partial manifest behind.
+
+    Params:
+        filepath: The path of the manifest file.
+        records: The records to write.
+        append: Append the records to the manifest if it exists, otherwise overwrite it.
+    """
+
+    if append:
+        with open(filepath, "a") as manifest_file:
+            for record in records:
+                manifest_file.write(json.dumps(record) + "\n")
+        return
+
+    tmp_filepath = filepath + "." + str(os.getpid()) + ".tmp"
+    with open(tmp_filepath, "w") as manifest_file:
+        for record in records:
+            manifest_file.write(json.dumps(record) + "\n")
+    os.replace(tmp_filepath, filepath)
+
+
+def readManifest(filepath : str, start_index : int = None, num_imgs : int = None) -> list:
+    """Reads the records of a slice of the images from a manifest file.
+
+    Params:
+        filepath: The path of the manifest file.
+        start_index: The index of the first image to read (from the first record if None).
+        num_imgs: The number of images to read (every record after the start if None).
+    Returns:
+        The records of the images in the slice (in order).
+    """
+
+    with open(filepath, "r") as manifest_file:
+        records = [json.loads(line) for line in manifest_file if line.strip()]
+
+    if start_index is not None:
+        records = [record for record in records if record["index"] >= start_index]
+
+    return records if num_imgs is None else records[:num_imgs]
+
+
+def main():
+
+    project_path = os.path.abspath(os.path.dirname(__file__))
+
+    config = configparser.ConfigParser()
+    config.read(os.path.join(project_path, "config.ini"))
+
+    parser = argparse.ArgumentParser(description = "Plan the images based on the config settings and write them to a manifest.")
+    parser.add_argument("manifest_path", help = "The manifest file to write.")
+    parser.add_argument("--num-imgs", type = int, default = int(config["Output"]["num_imgs"]), help = "The number of images to plan.")
+    parser.add_argument("--seed", type = int, default = int(config["Output"]["seed"]) if config["Output"]["seed"] else None,
+                        help = "The seed of the run (default: the config seed, or a random one).")
+    parser.add_argument("--start-index", type = int, default = 0, help = "The index of the first image.")
+    parser.add_argument("--append", action = "store_true", help = "Append the records to the manifest.")
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else int(np.random.SeedSequence().generate_state(1)[0])
+    records = planImages(config, args.num_imgs, seed, args.start_index,
+                         batch_views = config["Performance"]["batch_views"] == "True")
+    writeManifest(args.manifest_path, records, args.append)
+
+    print("Planned " + str(len(records)) + " images (seed " + str(seed) + ").")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+"""The assets available for the generated scenes and their properties.
+
+This module doesn't depend on Blender, so the images can also be planned outside of it (see plan.py).
+"""
+
+
+# The size of the ground plane in the scene.
+ground_plane_size = 20000.0
+
+# Available HDRIs for lighting and some of their properties.
+hdris = [{"name": "peppermint_powerplant.hdr",  "light_min": 0.65,  "light_max": 1.65},
+         {"name": "reinforced_concrete.hdr",    "light_min": 0.75,  "light_max": 1.85},
+         {"name": "lebombo.hdr",                "light_min": 0.65,  "light_max": 1.3},
+         {"name": "killesberg_park.hdr",        "light_min": 0.55,  "light_max": 1.05},
+         {"name": "paul_lobe_haus.hdr",         "light_min": 0.45,  "light_max": 0.95},]
+
+# Properties of the available material textures.
+textures = [ {"name": "Asphalt",    "scale": 0.035*ground_plane_size, "light_correction": 0.0},
+             {"name": "Porcelain",  "scale": 0.025*ground_plane_size, "light_correction": -0.1},
+             {"name": "Metal",      "scale": 0.025*ground_plane_size, "light_correction": 0.2} ]
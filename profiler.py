@@ -0,0 +1,165 @@
+"""Timing of the stages of the image generation (Blender is not required).
+
+The stages are measured with named spans (nested spans are timed separately, so the time of a span includes the
+time of the spans inside it). The spans of each image are written to a JSON Lines trace together with the wall time,
+the size of the mesh and the peak memory usage of the process, and a summary is printed at the end of the run.
+"""
+
+import os
+import sys
+import json
+import time
+import contextlib
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Profiling is only done if enabled (see start), the spans are no-ops otherwise.
+enabled = False
+# The durations of the spans of the current record (name -> seconds), and of every record.
+current_spans = {}
+span_times = {}
+# The wall times of the images.
+image_times = []
+
+trace_file = None
+record_start = 0.0
+
+
+def start(trace_path : str = None) -> None:
+    """Enables profiling, writing the trace to the given file (appending to it if it exists).
+
+    Params:
+        trace_path: The JSON Lines file to write the trace to, or None to only keep the summary.
+    """
+
+    global enabled, trace_file, record_start
+
+    enabled = True
+    current_spans.clear()
+    span_times.clear()
+    image_times.clear()
+    if trace_path is not None:
+        trace_file = open(trace_path, "a")
+    record_start = time.perf_counter()
+
+
+def stop() -> None:
+    """Disables profiling and closes the trace."""
+
+    global enabled, trace_file
+
+    enabled = False
+    if trace_file is not None:
+        trace_file.close()
+        trace_file = None
+
+
+@contextlib.contextmanager
+def span(name : str):
+    """Measures the time of the code inside the with block as a stage of the current record."""
+
+    if not enabled:
+        yield
+        return
+
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        current_spans[name] = current_spans.get(name, 0.0) + time.perf_counter() - start_time
+
+
+def peakMemory() -> int:
+    """Returns the peak memory usage of the process in bytes (or None if it's unavailable on the platform)."""
+
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # The peak is in kilobytes on Linux, and in bytes on macOS
+    return peak if sys.platform == "darwin" else peak*1024
+
+
+def residentMemory() -> int:
+    """Returns the current resident memory of the process in bytes (or None if it's unavailable on the platform)."""
+
+    try:
+        with open("/proc/self/statm", "r") as statm_file:
+            return int(statm_file.read().split()[1])*os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def endRecord(images : list, **info) -> None:
+    """Ends the current record, writing its spans to the trace. The next record starts at this point.
+
+    Params:
+        images: The names of the images generated in the record (the wall time is split between them evenly).
+        info: Extra values of the record (e.g. the vertex and face count of the mesh).
+    """
+
+    global record_start
+
+    if not enabled:
+        return
+
+    end_time = time.perf_counter()
+    wall_time = end_time - record_start
+    record_start = end_time
+
+    for name, duration in current_spans.items():
+        span_times.setdefault(name, []).append(duration)
+    image_times.extend([wall_time/len(images)]*len(images))
+
+    if trace_file is not None:
+        record = {"images": images, "wall_time": wall_time, "spans": dict(current_spans), "peak_memory": peakMemory()}
+        record.update(info)
+        trace_file.write(json.dumps(record) + "\n")
+        trace_file.flush()
+
+    current_spans.clear()
+
+
+def readTrace(trace_path : str) -> dict:
+    """Returns the statistics of a trace written by the profiler.
+
+    Returns:
+        Dict with the number of images, the overall wall time, the peak memory, and the count, p50, p95 and
+        total time of each stage (per record).
+    """
+
+    with open(trace_path, "r") as trace_file:
+        records = [json.loads(line) for line in trace_file if line.strip()]
+
+    stages = {}
+    for record in records:
+        for name, duration in record["spans"].items():
+            stages.setdefault(name, []).append(duration)
+
+    memory = [record["peak_memory"] for record in records if record["peak_memory"] is not None]
+
+    return {"images": sum(len(record["images"]) for record in records),
+            "wall_time": sum(record["wall_time"] for record in records),
+            "peak_memory": max(memory) if memory else None,
+            "stages": {name: {"count": len(times),
+                              "p50": float(np.percentile(times, 50)),
+                              "p95": float(np.percentile(times, 95)),
+                              "total": sum(times)} for name, times in stages.items()}}
+
+
+def summary() -> str:
+    """Returns the p50/p95 times of the stages (per record) and of the images as a printable table."""
+
+    rows = [("image", image_times)] + sorted(span_times.items(), key = lambda item: -sum(item[1]))
+    lines = ["{:<24}{:>8}{:>12}{:>12}{:>12}".format("Stage", "Count", "p50 [s]", "p95 [s]", "Total [s]")]
+    for name, times in rows:
+        if times:
+            p50, p95 = np.percentile(times, [50, 95])
+            lines.append("{:<24}{:>8}{:>12.3f}{:>12.3f}{:>12.1f}".format(name, len(times), p50, p95, sum(times)))
+
+    return "\n".join(lines)
@@ -5,15 +5,55 @@ Functions used for rendering the scene.
 
 import bpy
 
+import os
+import time
+import numpy as np
+import output
+import profiler
+
+
+# The parts of the scene the Eevee light cache depends on.
+light_cache_components = ("lights", "world", "ground", "geometry")
+# The components which changed since the last light cache bake (everything is dirty before the first bake).
+dirty_components = set(light_cache_components)
+
+# Render times (s) of the images rendered right after the geometry changed (cold) and the others (warm).
+# With Cycles persistent data only the cold renders have to rebuild the BVH, so the difference is the time saved by it.
+render_times = {"cold": [], "warm": []}
+geometry_changed = True
+
+
+def markDirty(*components : str) -> None:
+    """Marks parts of the scene as changed, so the light cache is baked again before the next render.
+
+    Params:
+        components: The changed components (any of light_cache_components).
+    """
+
+    global geometry_changed
+
+    for component in components:
+        if component not in light_cache_components:
+            raise ValueError("Invalid light cache component: " + str(component))
+        dirty_components.add(component)
+
+    if "geometry" in components:
+        geometry_changed = True
+
+
 def setImageSettings(res_x : int = 1920,
                      res_y : int = 1080,
-                     color : bool = True) -> None:
+                     color : bool = True,
+                     compression : int = 15,
+                     view_transform : str = "Filmic") -> None:
     """Sets the properties of the rendered image.
 
     Params:
         res_x: The horizontal resolution of the output image (px).
         res_y: The vertical resolution of the output image (px).
         color: True for color image, False for black-white image.
+        compression: The compression of the PNG images (0 - 100, higher is smaller but slower to write).
+        view_transform: The color management view transform of the images ("Filmic" or "Standard").
     Returns:
         None
     """
@@ -24,15 +64,53 @@ def setImageSettings(res_x : int = 1920,
     scene.render.resolution_y = res_y
     
     scene.render.image_settings.file_format = "PNG"
+    scene.render.image_settings.compression = compression
 
     scene.render.image_settings.color_mode = ("RGB" if color else "BW")
 
+    if view_transform not in ("Filmic", "Standard"):
+        raise ValueError("Invalid view transform: " + str(view_transform))
+    scene.view_settings.view_transform = view_transform
+    scene.view_settings.look = "None"
+
+
+def setBorder(border : tuple = None) -> dict:
+    """Only renders the region of the frame inside the border, and crops the image to it.
+
+    Params:
+        border: The min x, min y, max x and max y of the region relative to the frame (see scene.projectCoords),
+                or None to render the whole frame.
+    Returns:
+        The crop of the image in the pixels of the whole (scaled) frame (x and y of the top left corner, width, height),
+        or None if the whole frame is rendered.
+    """
+
+    settings = bpy.context.scene.render
+    settings.use_border = border is not None
+    settings.use_crop_to_border = border is not None
+    if border is None:
+        return None
+
+    settings.border_min_x, settings.border_min_y, settings.border_max_x, settings.border_max_y = border
+
+    # Blender truncates the border to the pixels of the scaled resolution (the y axis of the border points up)
+    min_x, min_y, max_x, max_y = border
+    res_x = settings.resolution_x*settings.resolution_percentage//100
+    res_y = settings.resolution_y*settings.resolution_percentage//100
+
+    return {"x": int(min_x*res_x),
+            "y": res_y - int(max_y*res_y),
+            "width": int(max_x*res_x) - int(min_x*res_x),
+            "height": int(max_y*res_y) - int(min_y*res_y)}
+
 
 def setupCycles(samples : int = 64,
                 bounces : int = 32,
                 tile_size : int = 128,
                 use_adaptive_sampling : bool = True,
-                denoising : bool = False) -> None:
+                denoising : bool = False,
+                persistent_data : bool = False,
+                cpu_only : bool = False) -> None:
     """Sets up the all the settings of the cycles render engine (for the active scene only).
 
     Params:
@@ -41,6 +119,8 @@ def setupCycles(samples : int = 64,
         tile_size: The tile size used while rendering (in px).
         use_adaptive_sampling: Reduces the number of samples for less noise.
         denoising: Use a denoiser while rendering if True.
+        persistent_data: Keep the scene data (BVH, textures) between the renders, only syncing what changed, if True.
+        cpu_only: Always render on the CPU, even if a GPU is available (e.g. for comparable benchmarks).
     Returns:
         None
     """
@@ -52,6 +132,8 @@ def setupCycles(samples : int = 64,
     # Device settings (use GPU when possible)
     prefs = bpy.context.preferences.addons["cycles"].preferences
     cuda, opencl = prefs.get_devices()
+    if cpu_only:
+        cuda, opencl = [], []
 
     if cuda:
         prefs.compute_device_type = "CUDA"
@@ -61,7 +143,7 @@ def setupCycles(samples : int = 64,
         scene.cycles.device = "GPU"
     else:
         prefs.compute_device_type = "NONE"
-        scene.cylces.dive = "CPU"
+        scene.cycles.device = "CPU"
     
     scene.cycles.feature_set = "SUPPORTED"  # or EXPERIMENTAL
 
@@ -78,6 +160,7 @@ def setupCycles(samples : int = 64,
     scene.render.tile_x = tile_size
     scene.render.tile_y = tile_size
     scene.cycles.debug_use_spatial_splits = False
+    scene.render.use_persistent_data = persistent_data
 
     scene.cycles.volume_max_steps = 16  # Unused
     scene.cycles.volume_step_rate = 1.0
@@ -98,16 +181,190 @@ def setupCycles(samples : int = 64,
         scene.cycles.use_denoising = False
 
 
-def render(filepath : str) -> None:
+def render(filepath : str, image_writer : output.AsyncImageWriter = None) -> None:
     """Renders the scene and saves the image to the given filepath.
 
+    The light cache is only baked with Eevee, and only if something it depends on was marked dirty since the last bake.
+
     Params:
         filepath: The path to save the rendered image to (with the name of the image).
+        image_writer: Save the image with this writer in the background if given (see setupViewerOutput),
+                      otherwise the image is saved before returning.
     """
 
+    global geometry_changed
+
     bpy.context.scene.render.filepath = filepath
-    bpy.ops.scene.light_cache_bake()
-    bpy.ops.render.render(write_still = True)
+    if bpy.context.scene.render.engine == "BLENDER_EEVEE" and dirty_components:
+        with profiler.span("light_cache_bake"):
+            bpy.ops.scene.light_cache_bake()
+        dirty_components.clear()
+
+    start_time = time.perf_counter()
+    with profiler.span("render"):
+        bpy.ops.render.render()
+    render_times["cold" if geometry_changed else "warm"].append(time.perf_counter() - start_time)
+    geometry_changed = False
+
+    if image_writer is not None:
+        with profiler.span("read_pixels"):
+            pixels = readViewerPixels()
+        with profiler.span("png_write"):  # Only waits if too many images are pending
+            image_writer.submit(filepath, pixels, color = bpy.context.scene.render.image_settings.color_mode != "BW")
+        return
+
+    # The image is saved separately from the render (same as write_still), so the two can be timed separately
+    with profiler.span("png_write"):
+        os.makedirs(os.path.dirname(filepath), exist_ok = True)
+        bpy.data.images["Render Result"].save_render(filepath = filepath)
+
+
+def setupViewerOutput() -> None:
+    """Connects the render layers to a viewer node in the compositor, so the pixels of the render can be read.
+
+    The pixels are read without the view transform of the scene, and they are only converted to sRGB when they are saved
+    (see output.linearToSrgb). This only gives the same colors as the images written by Blender with the Standard view
+    transform (and no look), so the scene must use it.
+    """
+
+    scene = bpy.context.scene
+    if scene.view_settings.view_transform != "Standard" or scene.view_settings.look != "None":
+        raise ValueError("The viewer output requires the Standard view transform: " + str(scene.view_settings.view_transform))
+
+    scene.use_nodes = True
+    scene.render.use_compositing = True
+
+    nodes = scene.node_tree.nodes
+    layers = next((node for node in nodes if node.type == "R_LAYERS"), None) or nodes.new(type = "CompositorNodeRLayers")
+    viewer = next((node for node in nodes if node.type == "VIEWER"), None) or nodes.new(type = "CompositorNodeViewer")
+    viewer.use_alpha = False
+    scene.node_tree.links.new(layers.outputs["Image"], viewer.inputs["Image"])
+
+
+def readViewerPixels() -> np.ndarray:
+    """Returns the linear float pixels of the last render (height x width x 4, bottom row first, see setupViewerOutput)."""
+
+    viewer = bpy.data.images["Viewer Node"]
+    width, height = viewer.size
+    pixels = np.empty(width*height*4, dtype = np.float32)
+    viewer.pixels.foreach_get(pixels)
+
+    return pixels.reshape(height, width, 4)
+
+
+def renderTimeReport() -> str:
+    """Returns the average render times as a printable string (see render_times).
+
+    The cold and warm render times are only reported separately with Cycles persistent data, otherwise every render
+    rebuilds the scene data, so only the overall average is reported.
+    """
+
+    settings = bpy.context.scene.render
+    if not (settings.engine == "CYCLES" and settings.use_persistent_data):
+        times = render_times["cold"] + render_times["warm"]
+        if not times:
+            return "Render times: no images rendered."
+        return "Render times: " + "{:.2f}".format(sum(times)/len(times)) + " s/image (" + str(len(times)) + " images)."
+
+    report = []
+    for kind in ("cold", "warm"):
+        if render_times[kind]:
+            report.append(kind + ": " + "{:.2f}".format(sum(render_times[kind])/len(render_times[kind])) + " s/image (" + str(len(render_times[kind])) + " images)")
+
+    if render_times["cold"] and render_times["warm"]:
+        saved = sum(render_times["cold"])/len(render_times["cold"]) - sum(render_times["warm"])/len(render_times["warm"])
+        report.append("BVH build/sync saved on the warm renders: " + "{:.2f}".format(saved) + " s/image")
+
+    return "Render times: " + ", ".join(report) + "."
+
+
+def renderAnimation(filepaths : list, bake_frames : list = ()) -> None:
+    """Renders the frames of the scene animation (from frame 1) with as few render calls as possible, saving each frame as an image.
+
+    The frames are rendered into the frames subdirectory and then renamed to their filepaths, so the frame numbers
+    don't depend on the names of the images (and can't exceed the maximum frame number of Blender).
+    With Eevee the light cache is baked again before each of the bake frames, so the animation is rendered with one render
+    call for each of the frame ranges sharing the same light cache (the first frame is baked if anything was marked dirty).
+
+    Params:
+        filepaths: The paths to save the frames to (the first one is frame 1).
+        bake_frames: The frames whose lighting differs from the previous frame (e.g. because of keyframed lights).
+    """
+
+    scene = bpy.context.scene
+    frames_path = os.path.join(os.path.dirname(filepaths[0]), "frames")
+    scene.render.filepath = os.path.join(frames_path, "#")
+
+    # The first frame of each of the render calls
+    starts = [1]
+    if scene.render.engine == "BLENDER_EEVEE":
+        starts += sorted(set(frame for frame in bake_frames if 1 < frame <= len(filepaths)))
+
+    for start, end in zip(starts, starts[1:] + [len(filepaths) + 1]):
+        scene.frame_start = start
+        scene.frame_end = end - 1
+        scene.frame_set(start)  # The light cache is baked with the lighting of the current frame
+        if scene.render.engine == "BLENDER_EEVEE" and (dirty_components or start > 1):
+            with profiler.span("light_cache_bake"):
+                bpy.ops.scene.light_cache_bake()
+            dirty_components.clear()
+        with profiler.span("render_animation"):
+            bpy.ops.render.render(animation = True)
+
+    for frame, filepath in enumerate(filepaths, 1):
+        os.replace(os.path.join(frames_path, str(frame) + ".png"), filepath)
+
+
+def snapshotProperties(properties : list) -> list:
+    """Returns the current values of the properties, so they can be keyframed later (see keyframeSnapshots).
+
+    Params:
+        properties: The (ID datablock, data path) pairs of the properties.
+    """
+
+    snapshot = []
+    for id_data, data_path in properties:
+        value = id_data.path_resolve(data_path)
+        snapshot.append((id_data, data_path, tuple(value) if hasattr(value, "__len__") else value))
+
+    return snapshot
+
+
+def keyframeSnapshots(snapshots : list, frames : list) -> None:
+    """Inserts the values of the snapshots as constant keyframes on the given frames.
+
+    The keyframes are added to the actions directly, without changing the current values of the properties.
+
+    Params:
+        snapshots: The snapshots taken with snapshotProperties.
+        frames: The frame of each of the snapshots.
+    """
+
+    for snapshot, frame in zip(snapshots, frames):
+        for id_data, data_path, value in snapshot:
+            anim_data = id_data.animation_data or id_data.animation_data_create()
+            if anim_data.action is None:
+                anim_data.action = bpy.data.actions.new(id_data.name + "Action")
+
+            for index, component in enumerate(value if isinstance(value, tuple) else (value,)):
+                fcurve = (anim_data.action.fcurves.find(data_path, index = index) or
+                          anim_data.action.fcurves.new(data_path, index = index))
+                keyframe = fcurve.keyframe_points.insert(frame, component, options = {"FAST"})
+                keyframe.interpolation = "CONSTANT"
+
+
+def clearKeyframes(ids : list) -> None:
+    """Removes the animation of the ID datablocks (added by keyframeSnapshots).
+
+    Params:
+        ids: The ID datablocks to remove the animation of.
+    """
+
+    for id_data in ids:
+        if id_data.animation_data is not None:
+            if id_data.animation_data.action is not None:
+                bpy.data.actions.remove(id_data.animation_data.action)
+            id_data.animation_data_clear()
 
 
 def setupEevee(samples : int = 64) -> None:
@@ -135,7 +392,7 @@ def setupEevee(samples : int = 64) -> None:
         scene.cycles.device = "GPU"
     else:
         prefs.compute_device_type = "NONE"
-        scene.cylces.dive = "CPU"
+        scene.cycles.device = "CPU"
     
     scene.cycles.feature_set = "SUPPORTED"  # or EXPERIMENTAL
 
@@ -170,4 +427,4 @@ def setupEevee(samples : int = 64) -> None:
     scene.eevee.gi_diffuse_bounces = 8
     scene.eevee.gi_cubemap_resolution = "1024"
     scene.eevee.gi_visibility_resolution = "32"
-    bpy.ops.scene.light_cache_bake()
\ No newline at end of file
+    markDirty(*light_cache_components)     # The cache is baked before the first render
\ No newline at end of file
@@ -0,0 +1,119 @@
+"""Checkpoints of the generator runs, and reconciling the output directory of an interrupted run (Blender is not required).
+
+A run is defined by the slice of the manifest it generates. The checkpoint of the output directory records this slice,
+so an interrupted run can be resumed by checking which of its images are actually complete, and only generating the rest.
+"""
+
+import os
+import json
+
+import plan
+import sinks
+
+
+# The signature at the start, and the IEND chunk at the end of every complete PNG file.
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_IEND = b"\x00\x00\x00\x00IEND\xaeB`\x82"
+
+
+def isValidPng(filepath : str) -> bool:
+    """Returns True if the file is a complete PNG image (it has the PNG signature and ends with the IEND chunk)."""
+
+    try:
+        with open(filepath, "rb") as png_file:
+            if png_file.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+                return False
+            png_file.seek(0, os.SEEK_END)
+            if png_file.tell() < len(PNG_SIGNATURE) + len(PNG_IEND):
+                return False
+            png_file.seek(-len(PNG_IEND), os.SEEK_END)
+            return png_file.read() == PNG_IEND
+    except OSError:
+        return False
+
+
+def writeCheckpoint(output_path : str, checkpoint : dict, filename : str = "checkpoint.json") -> None:
+    """Writes the checkpoint of the output directory atomically (the previous checkpoint is kept if the write is interrupted).
+
+    Params:
+        output_path: The output directory of the run.
+        checkpoint: The checkpoint (manifest_path, start_index, num_imgs, first_name, completed).
+        filename: The name of the checkpoint file (e.g. merge.json for the checkpoint of a shard merge, see main.mergeShards).
+    """
+
+    filepath = os.path.join(output_path, filename)
+    tmp_filepath = filepath + "." + str(os.getpid()) + ".tmp"
+    with open(tmp_filepath, "w") as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+    os.replace(tmp_filepath, filepath)
+
+
+def readCheckpoint(output_path : str, filename : str = "checkpoint.json") -> dict:
+    """Returns the checkpoint of the output directory, or None if there is no checkpoint (see writeCheckpoint)."""
+
+    filepath = os.path.join(output_path, filename)
+    if not os.path.isfile(filepath):
+        return None
+
+    with open(filepath, "r") as checkpoint_file:
+        return json.load(checkpoint_file)
+
+
+def reconcile(output_path : str,
+              index_format : str = "csv",
+              whole_objects : bool = False,
+              rebuild_entries : bool = True,
+              archived : set = frozenset()) -> tuple:
+    """Reconciles the images and the index of an interrupted run with its plan.
+
+    Images which are missing or truncated are scheduled to be generated again. Complete images without an
+    entry in the index get their entry back (from their records), and the entries of incomplete images are removed.
+    The index is rewritten atomically.
+
+    Params:
+        output_path: The output directory of the run (it must contain a checkpoint).
+        index_format: The format of the index (see sinks.openSink).
+        whole_objects: Generate every image of an object again if any of its images is incomplete.
+        rebuild_entries: Rebuild the missing entries of the complete images from their records. If False, the complete
+                         images without an entry are generated again (e.g. if the entries depend on the render, like the crop).
+        archived: The filenames of the images which were already moved into the archive (see archive.archivedNames).
+    Returns:
+        The records of the images which still have to be generated, and their image names.
+    """
+
+    checkpoint = readCheckpoint(output_path)
+    if checkpoint is None:
+        raise ValueError("There is no run to resume in " + str(output_path))
+
+    records = plan.readManifest(checkpoint["manifest_path"], checkpoint["start_index"], checkpoint["num_imgs"])
+    names = [checkpoint["first_name"] + idx for idx in range(len(records))]
+    run_names = set(str(name) + ".png" for name in names)
+
+    # The entries of the existing index
+    index_sink = sinks.openSink(index_format, output_path, append = True)
+    entries = index_sink.read()
+
+    # Complete images of the run
+    complete = [str(name) + ".png" in archived or isValidPng(os.path.join(output_path, "imgs", str(name) + ".png")) for name in names]
+    if not rebuild_entries:
+        indexed = set(entry["Filenames"] for entry in entries)
+        complete = [done and str(name) + ".png" in indexed for name, done in zip(names, complete)]
+    if whole_objects:
+        incomplete_objects = set(record["object"] for record, done in zip(records, complete) if not done)
+        complete = [done and record["object"] not in incomplete_objects for record, done in zip(records, complete)]
+
+    # The entries of the other runs are kept as they are, the entries of the run are rebuilt from the complete images (or kept)
+    index_entries = [entry for entry in entries if entry["Filenames"] not in run_names]
+    if rebuild_entries:
+        index_entries += [plan.indexEntry(name, record) for name, record, done in zip(names, records, complete) if done]
+    else:
+        complete_names = set(str(name) + ".png" for name, done in zip(names, complete) if done)
+        index_entries += [entry for entry in entries if entry["Filenames"] in complete_names]
+    index_sink.rewrite(index_entries)
+
+    pending = [(record, name) for name, record, done in zip(names, records, complete) if not done]
+    print("Resuming: " + str(len(records) - len(pending)) + "/" + str(len(records)) + " images are complete.")
+
+    return [record for record, _ in pending], [name for _, name in pending]
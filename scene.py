@@ -4,21 +4,16 @@ Functions to set up the scene for rendering (cameras and lights including the HD
 """
 
 import bpy, mathutils
+from bpy_extras.object_utils import world_to_camera_view
 
-import math
-import random
 from typing import List
 
+import utils
+from presets import hdris, ground_plane_size
 
-# Available HDRIs for lighting and some of their properties.
-hdris = [{"name": "peppermint_powerplant.hdr",  "light_min": 0.65,  "light_max": 1.65},
-         {"name": "reinforced_concrete.hdr",    "light_min": 0.75,  "light_max": 1.85},
-         {"name": "lebombo.hdr",                "light_min": 0.65,  "light_max": 1.3},
-         {"name": "killesberg_park.hdr",        "light_min": 0.55,  "light_max": 1.05},
-         {"name": "paul_lobe_haus.hdr",         "light_min": 0.45,  "light_max": 0.95},]
-
-# The size of the ground plane in the scene.
-ground_plane_size = 20000.0
+# Names of the pooled objects (created once and reused for every image in pooled mode).
+pooled_camera_name = "PooledCamera"
+pooled_light_name = "PooledLight"
 
 
 def removeCameras() -> None:
@@ -35,6 +30,44 @@ def removeLights() -> None:
         bpy.data.lights.remove(light)
 
 
+def pooledCamera() -> bpy.types.Object:
+    """Returns the pooled camera of the scene, creating it if it doesn't exist yet."""
+
+    camera = bpy.data.objects.get(pooled_camera_name)
+    if camera is None:
+        camera = bpy.data.objects.new(pooled_camera_name, bpy.data.cameras.new(pooled_camera_name))
+        bpy.context.scene.collection.objects.link(camera)
+
+    return camera
+
+
+def pooledLights(num_lights : int) -> List[bpy.types.Object]:
+    """Returns num_lights pooled point lights, creating the missing ones and removing the extra ones.
+
+    Params:
+        num_lights: The number of lights needed.
+    """
+
+    lights = []
+    for idx in range(num_lights):
+        name = pooled_light_name + "." + str(idx)
+        light = bpy.data.objects.get(name)
+        if light is None:
+            light = bpy.data.objects.new(name, bpy.data.lights.new(name, type = "POINT"))
+            bpy.context.scene.collection.objects.link(light)
+        lights.append(light)
+
+    idx = num_lights
+    while pooled_light_name + "." + str(idx) in bpy.data.objects:
+        light = bpy.data.objects[pooled_light_name + "." + str(idx)]
+        light_data = light.data
+        bpy.data.objects.remove(light)
+        bpy.data.lights.remove(light_data)
+        idx += 1
+
+    return lights
+
+
 def pointCameraTo(cam : bpy.types.Camera, target : mathutils.Vector) -> None:
     """Points the camera cam towards the given target point.
     
@@ -50,37 +83,37 @@ def pointCameraTo(cam : bpy.types.Camera, target : mathutils.Vector) -> None:
     cam.rotation_euler = rot.to_euler()
 
 
-def placeCamera(target_coords : List[float],
-                max_view_angle_x : float = 89,
-                max_view_angle_y : float = 89,
-                max_roll_angle : float = 180) -> bpy.types.Camera:
-    """Places a camera in the scene randomly with the target_coords always being visible in frame.
+def setCamera(target_coords : List[float],
+              view_x : float,
+              view_y : float,
+              roll : float,
+              pooled : bool = False) -> bpy.types.Camera:
+    """Places a camera in the scene with the given view angles, so that the target_coords are in frame.
 
     Params:
         target_coords: The coordinates of the points that are going to be in frame.
-        max_view_angle_x: The maximum view angle along the x axis. (in degrees) [0.0, 90.0)
-        max_view_angle_y: The maximum view angle along the y axis. (in degrees) [0.0, 90.0)
-        max_roll_angle: The maximum roll angle of the camera. (in degrees)
+        view_x: The tangent of the view angle along the x axis.
+        view_y: The tangent of the view angle along the y axis.
+        roll: The roll angle of the camera. (in radians)
+        pooled: Reuse the pooled camera instead of adding a new one if True.
     Returns:
-        The created camera.
+        The placed camera.
     """
 
     cam_height = 100.0  # Irrelevant, the distance will be determined by the fit_coords function.
-    bpy.ops.object.camera_add(location = (0.0, 0.0, cam_height))
-    camera = bpy.context.object
+    if pooled:
+        camera = pooledCamera()
+        camera.matrix_world = mathutils.Matrix.Translation((0.0, 0.0, cam_height))  # Also resets the rotation
+    else:
+        bpy.ops.object.camera_add(location = (0.0, 0.0, cam_height))
+        camera = bpy.context.object
     camera.data.clip_end = 1500.0
     bpy.context.scene.camera = camera
 
-    # Random camera view angle
-    max_x = cam_height*math.tan(max_view_angle_x*math.pi/180)
-    max_y = cam_height*math.tan(max_view_angle_y*math.pi/180)
-    x = random.uniform(-max_x, max_x)
-    y = random.uniform(-max_y, max_y)
-
-    pointCameraTo(camera, mathutils.Vector((x, y, 0.0)))
+    # Camera view angle
+    pointCameraTo(camera, mathutils.Vector((cam_height*view_x, cam_height*view_y, 0.0)))
 
-    # Random camera roll
-    roll = random.uniform(-max_roll_angle*math.pi/180, max_roll_angle*math.pi/180)
+    # Camera roll
     roll_matrix = mathutils.Matrix.Rotation(roll, 4, "Z")
 
     rot_matrix_old = camera.rotation_euler.to_matrix().to_4x4()
@@ -94,30 +127,43 @@ def placeCamera(target_coords : List[float],
     return camera
 
 
-def placeLights(num_lights : int,
-                height_min : float,
-                height_max : float,
-                hdistance_min : float,
-                hdistance_max : float,
-                strength_min : float,
-                strength_max : float) -> None:
-    """ Places a number of point lights randomly in the scene within the specified bounds.
-    
+def projectCoords(camera : bpy.types.Object, coords : List[float]) -> tuple:
+    """Returns the region of the camera frame the coordinates are projected to.
+
     Params:
-        num_lights: The number of lights to place in the scene.
-        height_min: The minimum height at which the lights are placed.
-        height_max: The maximum height at which the lights are placed.
-        hdistance_min: The minimum horizontal distance from the origin at which the lights can be placed.
-        hdistance_max: The maximum horizontal distance from the origin at which the lights can be placed.
-        strength_min: The minimum energy of the light sources in megawatts.
-        strength_max: The maximum energy of the light sources in megawatts.
+        camera: The camera to project the coordinates with.
+        coords: The coordinates of the points (x, y, z for each of the points, e.g. a bounding box).
+    Returns:
+        The min x, min y, max x and max y of the region relative to the frame (from 0 to 1, from the bottom left corner).
     """
 
-    for light in range(num_lights):
-        angle = random.uniform(0.0, 2.0*math.pi)
-        hdistance = random.uniform(hdistance_min, hdistance_max)
-        loc_x = hdistance*math.cos(angle)
-        loc_y = hdistance*math.sin(angle)
-        bpy.ops.object.light_add(type = "POINT", location = (loc_x, loc_y, random.uniform(height_min, height_max)))
-        light = bpy.context.object
-        light.data.energy = random.uniform(strength_min, strength_max) * 1E6
\ No newline at end of file
+    bpy.context.view_layer.update()     # Update the matrix of the camera after it was moved
+    points = [world_to_camera_view(bpy.context.scene, camera, mathutils.Vector(coords[i:i + 3])) for i in range(0, len(coords), 3)]
+
+    return (utils.clamp(min(point.x for point in points), 0.0, 1.0),
+            utils.clamp(min(point.y for point in points), 0.0, 1.0),
+            utils.clamp(max(point.x for point in points), 0.0, 1.0),
+            utils.clamp(max(point.y for point in points), 0.0, 1.0))
+
+
+def setLights(locations : List[List[float]],
+              energies : List[float],
+              pooled : bool = False) -> None:
+    """Places point lights in the scene at the given locations.
+
+    Params:
+        locations: The locations of the lights.
+        energies: The energies of the lights (in watts).
+        pooled: Move the pooled lights instead of adding new ones if True.
+    """
+
+    lights = pooledLights(len(locations)) if pooled else None
+
+    for idx, (location, energy) in enumerate(zip(locations, energies)):
+        if pooled:
+            light = lights[idx]
+            light.location = location
+        else:
+            bpy.ops.object.light_add(type = "POINT", location = location)
+            light = bpy.context.object
+        light.data.energy = energy
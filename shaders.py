@@ -7,11 +7,9 @@ Some of the defects are also applied to the object through these shaders (discol
 import bpy
 
 from os import path
-import math
-import random
-from typing import List
 
-import scene
+import assets
+from presets import textures, hdris
 
 
 COLORS = {  "BLACK": (0.0, 0.0, 0.0, 1.0),
@@ -25,10 +23,36 @@ COLORS = {  "BLACK": (0.0, 0.0, 0.0, 1.0),
             "LIGHTGRAY": (0.5, 0.5, 0.5, 1.0),
             "ORANGE": (0.8, 0.16, 0.0, 1.0) }
 
-# Properties of the available material textures.
-textures = [ {"name": "Asphalt",    "scale": 0.035*scene.ground_plane_size, "light_correction": 0.0},
-             {"name": "Porcelain",  "scale": 0.025*scene.ground_plane_size, "light_correction": -0.1},
-             {"name": "Metal",      "scale": 0.025*scene.ground_plane_size, "light_correction": 0.2} ]
+
+# The texture maps of the ground textures (see applyTextures), and the textures of the plastic texture defects.
+texture_map_files = ("Color.png", "Displacement.png", "Normal.png", "Roughness.png", "Metalness.png")
+defect_texture_files = ("Contamination.png", "Splay.png", "cloudy1.png", "cloudy2.png")
+
+
+def usedImageFiles(textures_path : str, hdris_path : str = None) -> list:
+    """Returns the image files the materials of the scene can use (e.g. to preload them).
+
+    Params:
+        textures_path: The directory which contains the texture files (only the maps of the ground textures
+                       and the textures of the texture defects are included, the other textures aren't used).
+        hdris_path: The directory which contains the HDRIs, or None if the HDRIs aren't used.
+    """
+
+    filepaths = [path.join(textures_path, texture["name"], filename) for texture in textures for filename in texture_map_files]
+    filepaths += [path.join(textures_path, filename) for filename in defect_texture_files]
+    if hdris_path is not None:
+        filepaths += [path.join(hdris_path, hdri["name"]) for hdri in hdris]
+
+    return [filepath for filepath in filepaths if path.exists(filepath)]
+
+
+def loadImage(filepath : str, texture_manager : assets.TextureManager = None) -> bpy.types.Image:
+    """Loads an image file through the texture manager if one is given, otherwise directly."""
+
+    if texture_manager is not None:
+        return texture_manager.load(filepath)
+
+    return bpy.data.images.load(filepath, check_existing = True)
 
 
 def clearShaderNodes(mat : bpy.types.Material) -> None:
@@ -41,18 +65,21 @@ def clearShaderNodes(mat : bpy.types.Material) -> None:
 
 # Custom shaders (no texture files are used for these)
 
-def applyBase(mat : bpy.types.Material,
-              color : List[float],
-              randomize : bool = False) -> None:
-    """Apply (random) generic material shaders to the material mat (for the ground object).
-    
+def buildPlastic(mat : bpy.types.Material,
+                 textures_path : str,
+                 texture_manager : assets.TextureManager = None) -> None:
+    """Builds the shader node tree of the plastic material mat.
+
+    Every branch is created (including the texture defects, which are mixed in with a factor of 0 when they
+    aren't used), so setPlasticParams only has to change the input values and the image of the texture node.
+    This way the compiled shader can be reused between the images.
+
     Params:
-        mat: The material to apply the shaders to.
-        color: The base color of the material (R,G,B,A).
-        randomize: Slightly randomize the shaders parameters if True.
+        mat: The material to build the node tree for.
+        textures_path: The directory which contains the textures used for the texture defects.
+        texture_manager: Load the textures through this texture manager if given.
     """
 
-    # Clear nodes and links
     clearShaderNodes(mat)
     nodes = mat.node_tree.nodes
     links = mat.node_tree.links
@@ -63,211 +90,63 @@ def applyBase(mat : bpy.types.Material,
     node_bump = nodes.new(type = "ShaderNodeBump")
     node_noise = nodes.new(type = "ShaderNodeTexNoise")
 
+    # Texture defect nodes
+    node_coord = nodes.new(type = "ShaderNodeTexCoord")
+    node_mapping = nodes.new(type = "ShaderNodeMapping")
+    node_color = nodes.new(type = "ShaderNodeTexImage")
+    node_add = nodes.new(type = "ShaderNodeMath")
+    node_mix = nodes.new(type = "ShaderNodeMixRGB")
+
+    node_principled.name = "Principled"
+    node_bump.name = "Bump"
+    node_noise.name = "Noise"
+    node_mapping.name = "DefectMapping"
+    node_color.name = "DefectTexture"
+    node_add.name = "DefectAdd"
+    node_mix.name = "DefectMix"
+
     # Connect shader nodes
     links.new(node_principled.outputs["BSDF"], node_output.inputs["Surface"])
     links.new(node_bump.outputs["Normal"], node_principled.inputs["Normal"])
     links.new(node_noise.outputs["Fac"], node_bump.inputs["Height"])
 
-    # Noise texture shader params
-    node_noise.inputs["Scale"].default_value = 8000.0 + int(randomize)*random.uniform(0.0, 4000.0)
-    node_noise.inputs["Roughness"].default_value = 0.0
-    
-    # Bump shader params
-    node_bump.inputs["Strength"].default_value = 0.05 + int(randomize)*random.uniform(0.0, 0.1)
-    node_bump.inputs["Distance"].default_value = 0.03 + int(randomize)*random.uniform(0.0, 0.04)
-    
-    # Principled shader params
-    if randomize:
-        node_principled.inputs["Base Color"].default_value = (random.uniform(0.0, 1.0), random.uniform(0.0, 1.0), random.uniform(0.0, 1.0), 1.0)
-    else:
-        node_principled.inputs["Base Color"].default_value = color
-
-    node_principled.inputs["Specular"].default_value = 0.2 + random.uniform(0.0, 0.2)
-    node_principled.inputs["Roughness"].default_value = 0.3 + random.uniform(0.0, 0.2)
-    node_principled.inputs["Clearcoat"].default_value = 0.0 + random.uniform(0.0, 0.2)
-    node_principled.inputs["Clearcoat Roughness"].default_value = 0.1 + random.uniform(0.0, 0.1)
-    node_principled.inputs["Emission Strength"].default_value = 0.0
-
-
-def applyPlastic(mat : bpy.types.Material,
-                 color : List[float],
-                 surface : str,
-                 randomize : bool,
-                 textures_path : str,
-                 tex_defect : str = None,
-                 gloss_defect : bool = False,
-                 discoloration : bool = False) -> None:
-    """Applies plastic looking material shaders to the material mat with some possible defects.
-    
+    # The texture replaces the base color when the mix factor is 1
+    links.new(node_coord.outputs["Object"], node_mapping.inputs["Vector"])
+    links.new(node_mapping.outputs["Vector"], node_color.inputs["Vector"])
+    links.new(node_color.outputs["Color"], node_add.inputs[0])
+    links.new(node_add.outputs["Value"], node_mix.inputs["Color2"])
+    links.new(node_mix.outputs["Color"], node_principled.inputs["Base Color"])
+
+    node_principled.distribution = "MULTI_GGX"
+    node_add.operation = "ADD"
+    node_mix.inputs["Fac"].default_value = 0.0
+    node_color.image = loadImage(path.join(textures_path, "Contamination.png"), texture_manager)
+
+
+def setPlasticParams(mat : bpy.types.Material,
+                     params : dict,
+                     textures_path : str,
+                     texture_manager : assets.TextureManager = None) -> None:
+    """Sets the values of the plastic shader nodes to the given (planned) parameters.
+
     Params:
-        mat: The material to apply the shaders to.
-        color: The base color of the material (R, G, B, A).
-        surface: The type of the plastics surface (must be one of "rough", "matte", or "shiny").
-        randomize: Slightly randomize the shader params if True.
+        mat: The material to set the parameters of.
+        params: The plastic parameters of an image (see plan.planPlastic).
         textures_path: The directory which contains the textures used for the texture defects.
-        tex_defect: Possible texture defects (one of "contamination", "splay", or "cloudy").
-        gloss_defect: Apply gloss defect to the material if True.
-        discoloration: Apply discoloration defect to the material if True.
+        texture_manager: Load the textures through this texture manager if given.
     """
 
-    clearShaderNodes(mat)
-    nodes = mat.node_tree.nodes
-    links = mat.node_tree.links
-
-    # Create shader nodes
-    node_output = nodes.new(type = "ShaderNodeOutputMaterial")
-    node_principled = nodes.new(type = "ShaderNodeBsdfPrincipled")
-    node_bump = nodes.new(type = "ShaderNodeBump")
-    node_noise = nodes.new(type = "ShaderNodeTexNoise")
+    if not mat.use_nodes or "DefectMix" not in mat.node_tree.nodes:
+        buildPlastic(mat, textures_path, texture_manager)
 
-    # Connect shader nodes
-    links.new(node_principled.outputs["BSDF"], node_output.inputs["Surface"])
-    links.new(node_bump.outputs["Normal"], node_principled.inputs["Normal"])
-    links.new(node_noise.outputs["Fac"], node_bump.inputs["Height"])
+    nodes = mat.node_tree.nodes
+    for node_name, inputs in params["nodes"].items():
+        for input_name, value in inputs.items():
+            # Inputs with the same name (e.g. the values of a math node) are given by their index
+            nodes[node_name].inputs[int(input_name) if input_name.isdigit() else input_name].default_value = value
 
-    # Noise texture params
-    if surface == "matte":
-        node_noise.inputs["Scale"].default_value = 2000.0
-        node_noise.inputs["Roughness"].default_value = 0.0
-    elif surface == "rough":
-        node_noise.inputs["Scale"].default_value = 350.0
-        node_noise.inputs["Roughness"].default_value = 1.0
-        node_noise.inputs["Distortion"].default_value = 0.4
-    elif surface == "shiny":
-        node_noise.inputs["Scale"].default_value = 1000.0
-        node_noise.inputs["Roughness"].default_value = 0.0
-    else:
-        raise ValueError("Invalid surface type: " + str(surface))
-    
-    # Bump shader params
-    if surface == "matte":
-        node_bump.inputs["Strength"].default_value = 0.1 + int(randomize)*random.uniform(0.0, 0.05)
-        node_bump.inputs["Distance"].default_value = 0.1 + int(randomize)*random.uniform(0.0, 0.05)
-    elif surface == "rough":
-        node_bump.inputs["Strength"].default_value = 1.5 + int(randomize)*random.uniform(0.0, 1.0)
-        node_bump.inputs["Distance"].default_value = 0.2 + int(randomize)*random.uniform(0.0, 0.1)
-    elif surface == "shiny":
-        node_bump.inputs["Strength"].default_value = 0.05 + int(randomize)*random.uniform(0.0, 0.05)
-        node_bump.inputs["Distance"].default_value = 0.1 + int(randomize)*random.uniform(0.0, 0.05)
-    else:
-        raise ValueError("Invalid surface type: " + str(surface))
-   
-    # Principled shader params
-    node_principled.distribution = "MULTI_GGX"
-    node_principled.inputs["Base Color"].default_value = color
-    if surface == "matte":
-        node_principled.inputs["Specular"].default_value = 0.05 + int(randomize)*random.uniform(0.0, 0.08)
-        node_principled.inputs["Roughness"].default_value = 0.5 + int(randomize)*random.uniform(0.0, 0.15)
-        node_principled.inputs["Anisotropic"].default_value = 0.2
-        node_principled.inputs["Clearcoat"].default_value = 0.1 + int(randomize)*random.uniform(0.0, 0.15)
-        node_principled.inputs["Clearcoat Roughness"].default_value = 0.05 + int(randomize)*random.uniform(0.0, 0.05)
-        node_principled.inputs["Emission Strength"].default_value = 0.0
-    elif surface == "rough":
-        node_principled.inputs["Specular"].default_value = 0.1
-        node_principled.inputs["Roughness"].default_value = 0.5 + int(randomize)*random.uniform(0.0, 0.2)
-        node_principled.inputs["Anisotropic"].default_value = 0.0
-        node_principled.inputs["Clearcoat"].default_value = 0.05 + int(randomize)*random.uniform(0.0, 0.1)
-        node_principled.inputs["Clearcoat Roughness"].default_value = node_principled.inputs["Roughness"].default_value + 0.05
-        node_principled.inputs["Emission Strength"].default_value = 0.0
-    elif surface == "shiny":
-        node_principled.inputs["Specular"].default_value = 0.05 + int(randomize)*random.uniform(0.0, 0.1)
-        node_principled.inputs["Roughness"].default_value = 0.2 + int(randomize)*random.uniform(0.0, 0.1)
-        node_principled.inputs["Anisotropic"].default_value = 0.2
-        node_principled.inputs["Clearcoat"].default_value = 0.4 + int(randomize)*random.uniform(0.0, 0.3)
-        node_principled.inputs["Clearcoat Roughness"].default_value = node_principled.inputs["Roughness"].default_value - 0.05
-        node_principled.inputs["Emission Strength"].default_value = 0.0
-    else:
-        raise ValueError("Invalid surface type: " + str(surface))
-
-    # Adjust principled shader for the gloss defect.
-    if gloss_defect:
-        # Principled shader params
-        node_principled.inputs["Specular"].default_value = 0.025 + int(randomize)*random.uniform(0.0, 0.05)
-        node_principled.inputs["Anisotropic"].default_value = 0.0
-        node_principled.inputs["Clearcoat"].default_value = 0.05 + int(randomize)*random.uniform(0.0, 0.1)
-        node_principled.inputs["Clearcoat Roughness"].default_value = 0.5 + int(randomize)*random.uniform(0.0, 0.25)
-        node_principled.inputs["Roughness"].default_value = node_principled.inputs["Clearcoat Roughness"].default_value + 0.05
-
-        # Noise texture params
-        node_noise.inputs["Scale"].default_value = 185.0 + int(randomize)*random.uniform(0.0, 75.0)
-        node_noise.inputs["Roughness"].default_value = 1.0
-        node_noise.inputs["Distortion"].default_value = 0.5
-
-        # Bump shader params
-        node_bump.inputs["Strength"].default_value = 1.5 + int(randomize)*random.uniform(0.0, 1.0)
-        node_bump.inputs["Distance"].default_value = 0.25 + int(randomize)*random.uniform(0.0, 0.15)
-
-    # Texture defects
-    if tex_defect in ("contamination", "splay", "cloudy"):
-        # Add new nodes
-        node_coord = nodes.new(type = "ShaderNodeTexCoord")
-        node_mapping = nodes.new(type = "ShaderNodeMapping")
-        node_color = nodes.new(type = "ShaderNodeTexImage")
-        node_add = nodes.new(type = "ShaderNodeMath")
-
-        # Node default values
-        node_add.inputs[1].default_value = 0.0
-
-        # Create links
-        links.new(node_coord.outputs["Object"], node_mapping.inputs["Vector"])
-        links.new(node_mapping.outputs["Vector"], node_color.inputs["Vector"])
-        links.new(node_color.outputs["Color"], node_add.inputs[0])
-        links.new(node_add.outputs["Value"], node_principled.inputs["Base Color"])
-
-    if tex_defect == None:
-        pass
-
-    elif tex_defect == "contamination":
-        # Node params
-        node_color.image = bpy.data.images.load(path.join(textures_path, "Contamination.png"), check_existing = True)
-        node_mapping.inputs["Scale"].default_value[0] = 0.01 + int(randomize)*random.uniform(0.0, 0.005)
-        node_mapping.inputs["Scale"].default_value[1] = 0.01 + int(randomize)*random.uniform(0.0, 0.005)
-        node_mapping.inputs["Scale"].default_value[2] = 0.01 + int(randomize)*random.uniform(0.0, 0.005)
-        node_mapping.inputs["Location"].default_value[0] = 0.0 + int(randomize)*random.uniform(-2.0, 2.0)
-        node_mapping.inputs["Location"].default_value[1] = 0.0 + int(randomize)*random.uniform(-2.0, 2.0)
-        node_mapping.inputs["Rotation"].default_value[2] = 0.0 + int(randomize)*random.uniform(0.0, 2*math.pi)
-    
-    elif tex_defect == "splay":
-        # Node params
-        node_color.image = bpy.data.images.load(path.join(textures_path, "Splay.png"), check_existing = True)
-        node_mapping.inputs["Scale"].default_value[0] = 0.04 + int(randomize)*random.uniform(0.0, 0.003)
-        node_mapping.inputs["Scale"].default_value[1] = 0.08 + int(randomize)*random.uniform(0.0, 0.004)
-        node_mapping.inputs["Scale"].default_value[2] = 1.0
-        node_mapping.inputs["Location"].default_value[0] = 0.0 + int(randomize)*random.uniform(-1.0, 1.0)
-        node_mapping.inputs["Location"].default_value[1] = 0.0 + int(randomize)*random.uniform(-1.0, 1.0)
-        node_mapping.inputs["Rotation"].default_value[2] = 90.0*math.pi/180.0
-
-    elif tex_defect == "cloudy":
-        # Node params
-        node_mapping.inputs["Location"].default_value[0] = 0.0 + int(randomize)*random.uniform(0.0, 1.0)
-        node_mapping.inputs["Location"].default_value[1] = 0.0 + int(randomize)*random.uniform(0.0, 1.0)
-        node_mapping.inputs["Rotation"].default_value[2] = 0.0 + int(randomize)*random.uniform(0.0, 2*math.pi)
-        if (random.random() > 0.5):
-            node_color.image = bpy.data.images.load(path.join(textures_path, "Cloudy1.png"), check_existing = True)
-            node_mapping.inputs["Scale"].default_value[0] = 0.03 + int(randomize)*random.uniform(0.0, 0.02)
-            node_mapping.inputs["Scale"].default_value[1] = 0.03 + int(randomize)*random.uniform(0.0, 0.02)
-            node_mapping.inputs["Scale"].default_value[2] = 0.03 + int(randomize)*random.uniform(0.0, 0.02)
-        else:
-            node_color.image = bpy.data.images.load(path.join(textures_path, "Cloudy2.png"), check_existing = True)
-            node_mapping.inputs["Scale"].default_value[0] = 0.008 + int(randomize)*random.uniform(0.0, 0.017)
-            node_mapping.inputs["Scale"].default_value[1] = 0.008 + int(randomize)*random.uniform(0.0, 0.017)
-            node_mapping.inputs["Scale"].default_value[2] = 0.008 + int(randomize)*random.uniform(0.0, 0.017)
-
-    else:
-        raise ValueError("Invalid texture defect: " + str(tex_defect))
-
-    # Discoloration defect
-    if discoloration:
-        # Base color
-        color_low, color_high = 0.2, 0.8
-        clr = color_low + random.expovariate(250.0) % (color_high - color_low)
-
-        node_principled.inputs["Base Color"].default_value = (clr, clr, clr, 1.0)
-
-        # Texture color if used
-        if tex_defect != None:
-            tex_low, tex_high = 0.03, 0.5
-            node_add.inputs[1].default_value = tex_low + random.expovariate(250.0) % (tex_high - tex_low)
+    if params["image"] is not None:
+        nodes["DefectTexture"].image = loadImage(path.join(textures_path, params["image"]), texture_manager)
 
 
 # Texture based shaders
@@ -275,16 +154,25 @@ def applyPlastic(mat : bpy.types.Material,
 def applyTextures(mat : bpy.types.Material,
                   textures_path : str,
                   texture_name : str,
-                  scale : float = 500.0) -> None:
+                  scale : float = 500.0,
+                  texture_manager : assets.TextureManager = None) -> None:
     """Apply material shaders using texture files to the material mat.
+
+    Only the texture maps which exist in the texture folder are used (Color, Displacement, Normal, Roughness, Metalness).
     
     Params:
         mat: The material to apply the shaders to.
         textures_path: The filepath of the directory which contains the different texture files.
         texture_name: The name of the textures to use. Must be a valid texture folder name in the textures_path directory.
         scale: The scale parameter for the textures used.
+        texture_manager: Load the textures through this texture manager if given.
     """
 
+    # Textures
+    texture_path = path.join(textures_path, texture_name)
+    if not path.exists(texture_path):
+        raise ValueError("Invalid texture name: " + str(texture_name))
+
     # Clear links and nodes
     clearShaderNodes(mat)
     nodes = mat.node_tree.nodes
@@ -294,27 +182,14 @@ def applyTextures(mat : bpy.types.Material,
     node_output = nodes.new(type = "ShaderNodeOutputMaterial")
     node_principled = nodes.new(type = "ShaderNodeBsdfPrincipled")
 
-    node_color = nodes.new(type = "ShaderNodeTexImage")
-    node_displacement_t = nodes.new(type = "ShaderNodeTexImage")
-    node_normal = nodes.new(type = "ShaderNodeTexImage")
-    node_roughness = nodes.new(type = "ShaderNodeTexImage")
-
     node_displacement = nodes.new(type = "ShaderNodeDisplacement")
     node_coord = nodes.new(type = "ShaderNodeTexCoord")
     node_mapping = nodes.new(type = "ShaderNodeMapping")
 
     # Connect shader nodes
     links.new(node_principled.outputs["BSDF"], node_output.inputs["Surface"])
-    links.new(node_color.outputs["Color"], node_principled.inputs["Base Color"])
-    links.new(node_displacement_t.outputs["Color"], node_displacement.inputs["Height"])
     links.new(node_displacement.outputs["Displacement"], node_output.inputs["Displacement"])
-    links.new(node_normal.outputs["Color"], node_principled.inputs["Normal"])
-    links.new(node_roughness.outputs["Color"], node_principled.inputs["Roughness"])
     links.new(node_coord.outputs["UV"], node_mapping.inputs["Vector"])
-    links.new(node_mapping.outputs["Vector"], node_color.inputs["Vector"])
-    links.new(node_mapping.outputs["Vector"], node_displacement_t.inputs["Vector"])
-    links.new(node_mapping.outputs["Vector"], node_normal.inputs["Vector"])
-    links.new(node_mapping.outputs["Vector"], node_roughness.inputs["Vector"])
 
     # Inputs
     node_principled.inputs["Specular"].default_value = 0.33
@@ -323,39 +198,61 @@ def applyTextures(mat : bpy.types.Material,
     node_displacement.inputs["Scale"].default_value = 0.05
     node_mapping.inputs["Scale"].default_value = (scale, scale, scale)
 
-    # Textures
-    texture_path = path.join(textures_path, texture_name)
-    if not path.exists(texture_path):
-        raise ValueError("Invalid texture name: " + str(texture_name))
+    # Texture maps and the inputs they are connected to
+    texture_maps = [("Color.png", node_principled.inputs["Base Color"]),
+                    ("Displacement.png", node_displacement.inputs["Height"]),
+                    ("Normal.png", node_principled.inputs["Normal"]),
+                    ("Roughness.png", node_principled.inputs["Roughness"]),
+                    ("Metalness.png", node_principled.inputs["Metallic"])]
+
+    for filename, target in texture_maps:
+        texture_map_path = path.join(texture_path, filename)
+        if not path.exists(texture_map_path):
+            continue
 
-    # Basic textures
-    node_color.image = bpy.data.images.load(path.join(texture_path, "Color.png"), check_existing = True)
-    node_displacement_t.image = bpy.data.images.load(path.join(texture_path, "Displacement.png"), check_existing = True)
-    node_normal.image = bpy.data.images.load(path.join(texture_path, "Normal.png"), check_existing = True)
-    node_roughness.image = bpy.data.images.load(path.join(texture_path, "Roughness.png"), check_existing = True)
+        node_texture = nodes.new(type = "ShaderNodeTexImage")
+        node_texture.image = loadImage(texture_map_path, texture_manager)
 
-    # Metal texture if metallic
-    metal_tex_path = path.join(texture_path, "Metalness.png")
-    if path.exists(metal_tex_path):
-        node_metalness = nodes.new(type = "ShaderNodeTexImage")
-        node_metalness.image = bpy.data.images.load(metal_tex_path, check_existing = True)
+        links.new(node_mapping.outputs["Vector"], node_texture.inputs["Vector"])
+        links.new(node_texture.outputs["Color"], target)
 
-        links.new(node_metalness.outputs["Color"], node_principled.inputs["Metallic"])
-        links.new(node_mapping.outputs["Vector"], node_metalness.inputs["Vector"])
 
+def buildTextureMaterials(textures_path : str,
+                          texture_manager : assets.TextureManager = None) -> dict:
+    """Creates a material for each of the material textures in the textures list.
 
-def applyRandomTextures(mat : bpy.types.Material,
-                        textures_path : str) -> dict:
-    """Apply a random material texture to the material mat.
+    The materials are only built once, after that they can be assigned to objects without rebuilding their shaders.
 
     Params:
-        mat: The material to apply the shaders to.
         textures_path: The filepath of the directory which contains the different texture files.
+        texture_manager: Load the textures through this texture manager if given.
     Returns:
-        The selected texture entry from the textures list.
+        Dict with the texture names as keys and the materials as values.
     """
-    
-    texture = random.choice(textures)
-    applyTextures(mat, textures_path, texture["name"], texture["scale"])
 
-    return texture
\ No newline at end of file
+    materials = {}
+    for texture in textures:
+        mat = bpy.data.materials.new(name = texture["name"])
+        mat.use_fake_user = True    # Keep the materials which aren't assigned to anything
+        applyTextures(mat, textures_path, texture["name"], texture["scale"], texture_manager)
+        materials[texture["name"]] = mat
+
+    return materials
+
+
+def assignTextureMaterial(obj : bpy.types.Object,
+                          materials : dict,
+                          texture_name : str) -> dict:
+    """Assign one of the prebuilt texture materials to the object.
+
+    Params:
+        obj: The object to assign the material to (its first material slot is used).
+        materials: The materials created by buildTextureMaterials.
+        texture_name: The name of the texture to use.
+    Returns:
+        The texture entry from the textures list.
+    """
+
+    obj.material_slots[0].material = materials[texture_name]
+
+    return next(texture for texture in textures if texture["name"] == texture_name)
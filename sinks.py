@@ -0,0 +1,573 @@
+"""Index sinks of the generated images (Blender is not required).
+
+Every image has an entry in the index: its filename, its labels and every parameter it was generated with.
+The entries are buffered and written in batches, and they are only guaranteed to be on the disk after sync().
+
+Formats:
+    csv: index.csv, the labels first (same columns as the original index), then the parameters.
+    jsonl: index.jsonl, one JSON object per image.
+    columnar: index_columns/, one raw little-endian file per column and a JSON header (columns.json),
+              so the columns can be memory-mapped directly (e.g. numpy.memmap(path, dtype, "r", shape = (count,))).
+    sqlite: index.sqlite, a catalog with an indexed column for each label and the parameters as JSON
+            (it can be written by concurrent processes, and queried with catalog.py).
+"""
+
+import os
+import csv
+import json
+import shutil
+import sqlite3
+import numpy as np
+
+
+# The columns of the original index (the filename and the defect labels).
+label_columns = ["Filenames", "missing_teeth", "bent_teeth", "warped", "ejector_marks", "low_gloss", "discoloration", "contamination", "cloudy", "splay"]
+
+# The typed columns of the SQLite catalog for the scalar render params: the flattened key of the param in the entry,
+# the name of the column, its SQL type, and whether it's indexed (the columns the images are filtered by).
+# The columns are NULL for the entries without the param (e.g. hdri_name when the images are lit by point lights).
+param_columns = [("index", "image_index", "INTEGER", False),
+                 ("object", "object_index", "INTEGER", False),
+                 ("seed", "seed", "INTEGER", True),
+                 ("geometry_seed", "geometry_seed", "INTEGER", False),
+                 ("defects.ejector_marks", "num_ejector_marks", "INTEGER", True),
+                 ("defects.tex_defect", "tex_defect", "TEXT", True),
+                 ("ground", "ground", "TEXT", True),
+                 ("hdri.name", "hdri_name", "TEXT", True),
+                 ("hdri.strength", "hdri_strength", "REAL", False),
+                 ("camera.roll", "camera_roll", "REAL", False),
+                 ("crop.x", "crop_x", "INTEGER", False),
+                 ("crop.y", "crop_y", "INTEGER", False),
+                 ("crop.width", "crop_width", "INTEGER", False),
+                 ("crop.height", "crop_height", "INTEGER", False)]
+
+
+def flatten(value, prefix : str = "") -> dict:
+    """Flattens nested dicts and lists into a dict with dot separated keys (e.g. camera.view.0)."""
+
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, (list, tuple)):
+        items = enumerate(value)
+    else:
+        return {prefix: value}
+
+    flat = {}
+    for key, item in items:
+        flat.update(flatten(item, prefix + "." + str(key) if prefix else str(key)))
+
+    return flat
+
+
+class IndexSink:
+    """Base class of the index sinks."""
+
+    def __init__(self, output_path : str, append : bool = True):
+        """
+        Params:
+            output_path: The output directory containing the index.
+            append: Append to the existing index if True, otherwise start a new one.
+        """
+
+        self.output_path = output_path
+        self._buffer = []
+
+        os.makedirs(output_path, exist_ok = True)
+
+
+    def count(self) -> int:
+        """Returns the number of entries in the index (including the buffered ones)."""
+
+        raise NotImplementedError
+
+
+    def read(self) -> list:
+        """Returns every entry of the index (the buffered ones are flushed first)."""
+
+        raise NotImplementedError
+
+
+    def rewrite(self, entries : list) -> None:
+        """Replaces the entries of the index atomically."""
+
+        raise NotImplementedError
+
+
+    def write(self, entry : dict) -> None:
+        """Adds an entry to the index (it's only written to the file on the next flush)."""
+
+        self._buffer.append(entry)
+
+
+    def buffered(self) -> int:
+        """Returns the number of entries which weren't written to the file yet."""
+
+        return len(self._buffer)
+
+
+    def discard(self) -> None:
+        """Drops the buffered entries without writing them (e.g. after a failed run, their images might be incomplete)."""
+
+        self._buffer = []
+
+
+    def flush(self) -> None:
+        """Writes the buffered entries to the file."""
+
+        raise NotImplementedError
+
+
+    def sync(self) -> None:
+        """Writes the buffered entries to the file and makes sure they are on the disk."""
+
+        raise NotImplementedError
+
+
+    def close(self) -> None:
+        """Syncs and closes the index."""
+
+        self.sync()
+
+
+class CsvSink(IndexSink):
+
+    def __init__(self, output_path : str, append : bool = True):
+
+        super().__init__(output_path, append)
+
+        self.filepath = os.path.join(output_path, "index.csv")
+        self.__header = None
+        self.__count = 0
+
+        if append and os.path.isfile(self.filepath):
+            with open(self.filepath, "r", newline = "") as index_file:
+                index_reader = csv.reader(index_file)
+                self.__header = next(index_reader, None)
+                self.__count = sum(1 for row in index_reader if row)
+        elif os.path.isfile(self.filepath):
+            os.remove(self.filepath)
+
+
+    def count(self) -> int:
+        return self.__count + len(self._buffer)
+
+
+    def read(self) -> list:
+
+        self.flush()
+        if not os.path.isfile(self.filepath):
+            return []
+
+        with open(self.filepath, "r", newline = "") as index_file:
+            return [dict(row) for row in csv.DictReader(index_file)]
+
+
+    def rewrite(self, entries : list) -> None:
+
+        self._buffer = []
+        header = self.__header or self.__headerOf(entries)
+
+        tmp_filepath = self.filepath + "." + str(os.getpid()) + ".tmp"
+        with open(tmp_filepath, "w", newline = "") as index_file:
+            index_writer = csv.DictWriter(index_file, header, extrasaction = "ignore")
+            index_writer.writeheader()
+            index_writer.writerows(entries)
+            index_file.flush()
+            os.fsync(index_file.fileno())
+        os.replace(tmp_filepath, self.filepath)
+
+        self.__header = header
+        self.__count = len(entries)
+
+
+    def __headerOf(self, entries : list) -> list:
+        # The label columns first, then the rest of the columns of the first entry
+        if not entries:
+            return list(label_columns)
+        return label_columns + [key for key in entries[0] if key not in label_columns]
+
+
+    def flush(self) -> None:
+
+        if not self._buffer:
+            return
+
+        write_header = self.__header is None
+        if write_header:
+            self.__header = self.__headerOf(self._buffer)
+
+        # The columns of an existing index are kept (the extra values of the entries are left out)
+        with open(self.filepath, "a", newline = "") as index_file:
+            index_writer = csv.DictWriter(index_file, self.__header, extrasaction = "ignore")
+            if write_header:
+                index_writer.writeheader()
+            index_writer.writerows(self._buffer)
+
+        self.__count += len(self._buffer)
+        self._buffer = []
+
+
+    def sync(self) -> None:
+
+        self.flush()
+        if os.path.isfile(self.filepath):
+            with open(self.filepath, "a") as index_file:
+                os.fsync(index_file.fileno())
+
+
+class JsonlSink(IndexSink):
+
+    def __init__(self, output_path : str, append : bool = True):
+
+        super().__init__(output_path, append)
+
+        self.filepath = os.path.join(output_path, "index.jsonl")
+        self.__count = 0
+
+        if append and os.path.isfile(self.filepath):
+            with open(self.filepath, "r") as index_file:
+                self.__count = sum(1 for line in index_file if line.strip())
+        elif os.path.isfile(self.filepath):
+            os.remove(self.filepath)
+
+
+    def count(self) -> int:
+        return self.__count + len(self._buffer)
+
+
+    def read(self) -> list:
+
+        self.flush()
+        if not os.path.isfile(self.filepath):
+            return []
+
+        with open(self.filepath, "r") as index_file:
+            return [json.loads(line) for line in index_file if line.strip()]
+
+
+    def rewrite(self, entries : list) -> None:
+
+        self._buffer = []
+
+        tmp_filepath = self.filepath + "." + str(os.getpid()) + ".tmp"
+        with open(tmp_filepath, "w") as index_file:
+            index_file.writelines(json.dumps(entry) + "\n" for entry in entries)
+            index_file.flush()
+            os.fsync(index_file.fileno())
+        os.replace(tmp_filepath, self.filepath)
+
+        self.__count = len(entries)
+
+
+    def flush(self) -> None:
+
+        if not self._buffer:
+            return
+
+        with open(self.filepath, "a") as index_file:
+            index_file.writelines(json.dumps(entry) + "\n" for entry in self._buffer)
+
+        self.__count += len(self._buffer)
+        self._buffer = []
+
+
+    def sync(self) -> None:
+
+        self.flush()
+        if os.path.isfile(self.filepath):
+            with open(self.filepath, "a") as index_file:
+                os.fsync(index_file.fileno())
+
+
+class ColumnarSink(IndexSink):
+    """Index with one raw file per column.
+
+    The header (columns.json) contains the number of entries, and the dtype of each column. String columns are stored
+    as int32 codes of their categories (listed in the header), and the filenames as the int64 names of the images.
+    The header is only updated on sync, so the entries after the count of the header (e.g. after a crash) are ignored.
+    """
+
+    def __init__(self, output_path : str, append : bool = True):
+
+        super().__init__(output_path, append)
+
+        self.path = os.path.join(output_path, "index_columns")
+        self.__header = {"count": 0, "columns": {}}
+        self.__written = 0
+
+        if append and os.path.isfile(self.__headerPath(self.path)):
+            with open(self.__headerPath(self.path), "r") as header_file:
+                self.__header = json.load(header_file)
+            # Drop the entries which were written after the last sync
+            for name, column in self.__header["columns"].items():
+                with open(self.__columnPath(self.path, name), "r+b") as column_file:
+                    column_file.truncate(self.__header["count"]*np.dtype(column["dtype"]).itemsize)
+        elif os.path.isdir(self.path):
+            shutil.rmtree(self.path)
+
+        self.__written = self.__header["count"]
+        os.makedirs(self.path, exist_ok = True)
+
+
+    @staticmethod
+    def __headerPath(path : str) -> str:
+        return os.path.join(path, "columns.json")
+
+
+    @staticmethod
+    def __columnPath(path : str, name : str) -> str:
+        return os.path.join(path, name + ".bin")
+
+
+    @staticmethod
+    def __columnsOf(entry : dict) -> dict:
+        # The dtypes of the columns based on the values of the first entry
+        columns = {}
+        for name, value in entry.items():
+            if name == "Filenames":
+                columns[name] = {"dtype": "<i8"}
+            elif isinstance(value, bool):
+                columns[name] = {"dtype": "|b1"}
+            elif isinstance(value, int):
+                columns[name] = {"dtype": "<i8"}
+            elif isinstance(value, float):
+                columns[name] = {"dtype": "<f8"}
+            else:
+                columns[name] = {"dtype": "<i4", "categories": []}
+
+        return columns
+
+
+    def __encode(self, name : str, values : list) -> np.ndarray:
+        column = self.__header["columns"][name]
+        if name == "Filenames":
+            values = [int(os.path.splitext(value)[0]) for value in values]
+        elif "categories" in column:
+            categories = column["categories"]
+            codes = []
+            for value in values:
+                if value not in categories:
+                    categories.append(value)
+                codes.append(categories.index(value))
+            values = codes
+
+        return np.asarray(values, dtype = column["dtype"])
+
+
+    def __decode(self, name : str, values : np.ndarray) -> list:
+        column = self.__header["columns"][name]
+        if name == "Filenames":
+            return [str(value) + ".png" for value in values.tolist()]
+        if "categories" in column:
+            return [column["categories"][code] for code in values.tolist()]
+        return values.tolist()
+
+
+    def __writeColumns(self, path : str, entries : list, mode : str) -> None:
+        for name in self.__header["columns"]:
+            if any(name not in entry for entry in entries):
+                raise ValueError("Missing index column: " + str(name))
+            with open(self.__columnPath(path, name), mode) as column_file:
+                column_file.write(self.__encode(name, [entry[name] for entry in entries]).tobytes())
+                if mode == "wb":
+                    os.fsync(column_file.fileno())
+
+
+    def __writeHeader(self, path : str) -> None:
+        tmp_filepath = self.__headerPath(path) + "." + str(os.getpid()) + ".tmp"
+        with open(tmp_filepath, "w") as header_file:
+            json.dump(self.__header, header_file)
+            header_file.flush()
+            os.fsync(header_file.fileno())
+        os.replace(tmp_filepath, self.__headerPath(path))
+
+
+    def count(self) -> int:
+        return self.__written + len(self._buffer)
+
+
+    def read(self) -> list:
+
+        self.flush()
+        count = self.__written
+
+        columns = {}
+        for name, column in self.__header["columns"].items():
+            values = np.fromfile(self.__columnPath(self.path, name), dtype = column["dtype"], count = count)
+            columns[name] = self.__decode(name, values)
+
+        return [{name: values[idx] for name, values in columns.items()} for idx in range(count)]
+
+
+    def rewrite(self, entries : list) -> None:
+
+        self._buffer = []
+        self.__header = {"count": len(entries), "columns": self.__columnsOf(entries[0]) if entries else {}}
+
+        # The new columns are written to a new directory, which then replaces the old one
+        tmp_path = self.path + "." + str(os.getpid()) + ".tmp"
+        os.makedirs(tmp_path)
+        self.__writeColumns(tmp_path, entries, "wb")
+        self.__writeHeader(tmp_path)
+
+        old_path = self.path + "." + str(os.getpid()) + ".old"
+        os.rename(self.path, old_path)
+        os.rename(tmp_path, self.path)
+        shutil.rmtree(old_path)
+
+        self.__written = len(entries)
+
+
+    def flush(self) -> None:
+
+        if not self._buffer:
+            return
+
+        if not self.__header["columns"]:
+            self.__header["columns"] = self.__columnsOf(self._buffer[0])
+
+        self.__writeColumns(self.path, self._buffer, "ab")
+        self.__written += len(self._buffer)
+        self._buffer = []
+
+
+    def sync(self) -> None:
+
+        self.flush()
+        for name in self.__header["columns"]:
+            with open(self.__columnPath(self.path, name), "ab") as column_file:
+                os.fsync(column_file.fileno())
+
+        # The entries are only part of the index once the header counts them
+        self.__header["count"] = self.__written
+        self.__writeHeader(self.path)
+
+
+class SqliteSink(IndexSink):
+    """Index in an SQLite database (table images).
+
+    The labels and the scalar render params (see param_columns) are stored in their own typed columns,
+    and the rest of the entry in the params column as JSON (the params of the typed columns are kept in it too,
+    so the entries are read back unchanged). The database is in WAL mode, so several processes can insert into the same catalog while it's being queried.
+    """
+
+    def __init__(self, output_path : str, append : bool = True):
+
+        super().__init__(output_path, append)
+
+        self.filepath = os.path.join(output_path, "index.sqlite")
+        self.connection = connectCatalog(self.filepath)
+        if not append:
+            with self.connection:
+                self.connection.execute("DELETE FROM images")
+
+
+    @staticmethod
+    def __row(entry : dict) -> tuple:
+        params = {key: value for key, value in entry.items() if key not in label_columns}
+        return (tuple(entry[column] for column in label_columns) + tuple(entry.get(key) for key, _, _, _ in param_columns) +
+                (json.dumps(params),))
+
+
+    def __insert(self, entries : list) -> None:
+        columns = label_columns + [column for _, column, _, _ in param_columns] + ["params"]
+        self.connection.executemany("INSERT OR REPLACE INTO images (" + ", ".join(columns) + ") VALUES (" + ", ".join("?"*len(columns)) + ")",
+                                    (self.__row(entry) for entry in entries))
+
+
+    def count(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM images").fetchone()[0] + len(self._buffer)
+
+
+    def read(self) -> list:
+
+        self.flush()
+        return [catalogEntry(row) for row in self.connection.execute("SELECT * FROM images ORDER BY rowid")]
+
+
+    def rewrite(self, entries : list) -> None:
+
+        self._buffer = []
+        # A single transaction, so either every entry is replaced or none of them
+        with self.connection:
+            self.connection.execute("DELETE FROM images")
+            self.__insert(entries)
+
+
+    def flush(self) -> None:
+
+        if not self._buffer:
+            return
+
+        with self.connection:
+            self.__insert(self._buffer)
+        self._buffer = []
+
+
+    def sync(self) -> None:
+        # Committed transactions are on the disk (synchronous = FULL)
+        self.flush()
+
+
+    def close(self) -> None:
+
+        self.sync()
+        self.connection.close()
+
+
+def connectCatalog(filepath : str, timeout : float = 60.0) -> sqlite3.Connection:
+    """Opens an SQLite catalog of images, creating its table and indexes if they don't exist yet.
+
+    Params:
+        filepath: The path of the database file.
+        timeout: The number of seconds to wait for the other writers of the database.
+    """
+
+    connection = sqlite3.connect(filepath, timeout = timeout)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = FULL")
+    with connection:
+        connection.execute("CREATE TABLE IF NOT EXISTS images (Filenames TEXT PRIMARY KEY, " +
+                           ", ".join(column + " INTEGER NOT NULL" for column in label_columns[1:]) + ", " +
+                           ", ".join(column + " " + sql_type for _, column, sql_type, _ in param_columns) + ", params TEXT NOT NULL)")
+
+        # Catalogs created before the param columns existed get them filled from their params
+        existing = {row["name"] for row in connection.execute("PRAGMA table_info(images)")}
+        for key, column, sql_type, _ in param_columns:
+            if column not in existing:
+                connection.execute("ALTER TABLE images ADD COLUMN " + column + " " + sql_type)
+                connection.execute("UPDATE images SET " + column + " = json_extract(params, ?)", ('$."' + key + '"',))
+
+        for column in label_columns[1:] + [column for _, column, _, indexed in param_columns if indexed]:
+            connection.execute("CREATE INDEX IF NOT EXISTS images_" + column + " ON images (" + column + ")")
+
+    return connection
+
+
+def catalogEntry(row : sqlite3.Row) -> dict:
+    """Returns the index entry of a row of the images table of a catalog."""
+
+    entry = {column: row[column] for column in label_columns}
+    entry.update(json.loads(row["params"]))
+
+    return entry
+
+
+# The available index sinks by their format names.
+sink_types = {"csv": CsvSink, "jsonl": JsonlSink, "columnar": ColumnarSink, "sqlite": SqliteSink}
+
+
+def openSink(index_format : str, output_path : str, append : bool = True) -> IndexSink:
+    """Opens the index of the output directory.
+
+    Params:
+        index_format: The format of the index (one of "csv", "jsonl", "columnar", or "sqlite").
+        output_path: The output directory containing the index.
+        append: Append to the existing index if True, otherwise start a new one.
+    """
+
+    if index_format not in sink_types:
+        raise ValueError("Invalid index format: " + str(index_format))
+
+    return sink_types[index_format](output_path, append)
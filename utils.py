@@ -6,7 +6,6 @@ Utility functions.
 import bpy, mathutils
 
 import math
-import random
 from typing import List
 
 
@@ -38,22 +37,51 @@ def removeMeshes() -> None:
         bpy.data.meshes.remove(mesh)
 
 
-def randomExtendBoundingBox(bounding_box : List[float], max_x : float, max_y : float) -> List[float]:
-    """Randomly extends a bounding box in the x and y directions.
+# The datablock collections which are purged by purgeOrphans.
+orphan_collections = ("meshes", "materials", "textures", "images", "node_groups", "actions", "curves", "lights", "cameras")
+
+
+def purgeOrphans(collections : tuple = orphan_collections) -> int:
+    """Removes the datablocks without any users (orphans), except the ones with a fake user.
+
+    Removing a datablock can orphan the datablocks it used (e.g. the materials of a mesh), so this is repeated
+    until there are no orphans left.
+
+    Params:
+        collections: The names of the bpy.data collections to purge.
+    Returns:
+        The number of removed datablocks.
+    """
+
+    removed = 0
+    while True:
+        orphans = [(getattr(bpy.data, name), block) for name in collections for block in getattr(bpy.data, name)
+                   if block.users == 0 and not block.use_fake_user and getattr(block, "type", None) not in ("RENDER_RESULT", "COMPOSITING")]
+        if not orphans:
+            return removed
+
+        for data, block in orphans:
+            data.remove(block)
+        removed += len(orphans)
+
+
+def datablockCounts(collections : tuple = ("objects",) + orphan_collections) -> dict:
+    """Returns the number of datablocks in each of the bpy.data collections."""
+
+    return {name: len(getattr(bpy.data, name)) for name in collections}
+
+
+def extendBoundingBox(bounding_box : List[float], x_n : float, x_p : float, y_n : float, y_p : float) -> List[float]:
+    """Extends a bounding box in the x and y directions.
 
     Params:
         bounding_box: The coordinates of the bounding box to extend.
-        max_x: The maximum distance to extend the bounding box by along the x axis (on each side).
-        max_y: The maximum distance to extend the bounding box by along the y axis (on each side).
+        x_n, x_p: The distances to extend the bounding box by in the negative and positive x directions.
+        y_n, y_p: The distances to extend the bounding box by in the negative and positive y directions.
     Returns:
         The coordinates of the extended bounding box.
     """
 
-    x_p = random.uniform(0.0, max_x)
-    x_n = random.uniform(0.0, max_x)
-    y_p = random.uniform(0.0, max_y)
-    y_n = random.uniform(0.0, max_y)
-
     bb = (
           bounding_box[0] - x_n,  bounding_box[1] - y_n,  bounding_box[2],  #point1
           bounding_box[3] - x_n,  bounding_box[4] - y_n,  bounding_box[5],  #point2